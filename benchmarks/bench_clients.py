@@ -0,0 +1,122 @@
+"""
+Benchmark the per-call latency of the OpenAI and HTTP clients built on every call against
+the shared clients from `patentgpt.clients`.
+
+Every mode goes through the real client code against the fake OpenAI server from
+`fake_openai.py`:
+
+- chat: a new `ChatOpenAI` on every call with openai's default sessions, against
+  `clients.get_chat_model` with the pooled per-thread sessions of `clients.openai_session`.
+- embedding: a new `OpenAIEmbeddings` on every call against one shared instance, with the
+  same sessions as above.
+- http: `requests.post` with a fresh connection against `clients.get_http_session`, as
+  used by the USPTO downloader.
+
+The fake server answers without simulated latency by default, so the numbers only contain
+client construction, connection setup and request overhead. openai already keeps one
+session per thread, so the chat and embedding paths mostly save the construction of the
+clients; the fresh connections of the http path show what pooling saves. Against the real OpenAI and
+USPTO endpoints the gap is larger because each fresh connection also pays a TLS handshake.
+
+Usage:
+    python benchmarks/bench_clients.py --calls 200 --workers 8 --rounds 4
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HERE)
+sys.path.insert(0, os.path.join(HERE, "..", "src"))
+
+from fake_openai import FakeOpenAIServer  # noqa: E402
+
+
+def run(call, calls, workers):
+    def one_call(_):
+        start = time.perf_counter()
+        call()
+        return time.perf_counter() - start
+
+    # New threads for every run, so that no run reuses the per-thread sessions of another
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(one_call, range(calls)))
+
+
+def summarize(latencies):
+    latencies = sorted(latencies)
+    return {
+        "calls": len(latencies),
+        "mean_ms": statistics.mean(latencies) * 1000,
+        "p50_ms": latencies[len(latencies) // 2] * 1000,
+        "p95_ms": latencies[int(len(latencies) * 0.95) - 1] * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--calls", type=int, default=500)
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--rounds", type=int, default=4)
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--pool-maxsize", type=int, default=None)
+    args = parser.parse_args()
+
+    server = FakeOpenAIServer(latency_ms=args.latency_ms).start()
+    os.environ["OPENAI_API_BASE"] = server.base_url
+    os.environ.setdefault("OPENAI_API_KEY", "sk-fake-benchmark-key")
+
+    # Imported here so that the OpenAI client picks up the fake server settings
+    import openai
+    import requests
+    from langchain.chat_models import ChatOpenAI
+    from langchain.embeddings.openai import OpenAIEmbeddings
+    from patentgpt import clients
+
+    openai.api_base = server.base_url
+    clients.configure_pools(pool_maxsize=args.pool_maxsize or max(clients.DEFAULT_POOL_MAXSIZE, args.workers))
+    message = "Extract the measurements: the film is 20 nm thick."
+    payload = {"model": "gpt-3.5-turbo", "messages": [{"role": "user", "content": message}]}
+    url = f"{server.base_url}/chat/completions"
+
+    embeddings = OpenAIEmbeddings()
+    session = clients.get_http_session("bench")
+    modes = {
+        ("chat", "fresh"): lambda: ChatOpenAI(model_name="gpt-3.5-turbo", temperature=0).predict(message),
+        ("chat", "pooled"): lambda: clients.get_chat_model("gpt-3.5-turbo", temperature=0).predict(message),
+        ("embedding", "fresh"): lambda: OpenAIEmbeddings().embed_query(message),
+        ("embedding", "pooled"): lambda: embeddings.embed_query(message),
+        ("http", "fresh"): lambda: requests.post(url, json=payload).content,
+        ("http", "pooled"): lambda: session.post(url, json=payload).content,
+    }
+
+    # The modes run in alternating order over several rounds, so that neither gains
+    # from running first on a fresh server
+    latencies = {key: [] for key in modes}
+    for round_number in range(args.rounds):
+        for path in ("chat", "embedding", "http"):
+            order = ("fresh", "pooled") if round_number % 2 == 0 else ("pooled", "fresh")
+            for mode in order:
+                # openai's default per-thread sessions, or the pooled ones of `clients`
+                openai.requestssession = clients.openai_session if mode == "pooled" else None
+                latencies[path, mode] += run(modes[path, mode], args.calls, args.workers)
+    server.shutdown()
+
+    results = {key: summarize(values) for key, values in latencies.items()}
+    print(f"{'path':<10} {'mode':<8} {'mean ms':>10} {'p50 ms':>10} {'p95 ms':>10}")
+    for (path, mode), result in results.items():
+        print(
+            f"{path:<10} {mode:<8} {result['mean_ms']:>10.3f} {result['p50_ms']:>10.3f} "
+            f"{result['p95_ms']:>10.3f}"
+        )
+    for path in ("chat", "embedding", "http"):
+        reduction = 1 - results[path, "pooled"]["mean_ms"] / results[path, "fresh"]["mean_ms"]
+        print(f"Per-call latency reduction ({path}): {reduction:.1%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,186 @@
+"""
+Deterministic local stand-in for the OpenAI chat completion and embedding endpoints.
+
+Responses only depend on the request body, so repeated benchmark runs see identical
+outputs. Latency is simulated as a fixed delay per request plus a delay per generated
+token, which keeps benchmarks of the analysis stage reproducible without paid calls.
+
+Usage:
+    python benchmarks/fake_openai.py --port 8001 --latency-ms 200
+    export OPENAI_API_BASE=http://127.0.0.1:8001/v1
+"""
+
+import argparse
+import hashlib
+import json
+import math
+import re
+import struct
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+EMBEDDING_DIM = 1536
+
+MEASUREMENT_PATTERN = re.compile(
+    r"(?P<value>-?\d+(?:\.\d+)?)\s?(?P<unit>nm|μm|mm|cm|m|kg|mg|g|°C|K|%|MPa|kPa|Pa|s|min|h|mL|L|V|W|Hz)\b"
+)
+
+
+def count_tokens(text):
+    # Roughly four characters per token, like the OpenAI rule of thumb
+    return max(1, len(text) // 4)
+
+
+def fake_embedding(text, dim=EMBEDDING_DIM):
+    """
+    Return a deterministic unit vector for the text built from hashed word features.
+    """
+
+    vector = [0.0] * dim
+    for word in re.findall(r"\w+", text.lower()):
+        digest = hashlib.blake2b(word.encode("utf-8"), digest_size=8).digest()
+        bucket, sign = struct.unpack("<IxxxB", digest)
+        vector[bucket % dim] += 1.0 if sign & 1 else -1.0
+    norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+    return [v / norm for v in vector]
+
+
+def fake_completion(messages, max_measurements=20):
+    """
+    Return a deterministic measurement-extraction answer for the chat messages.
+
+    Every "<number> <unit>" found in the prompt becomes one measurement, so the answer has
+    the same JSON shape that the analysis prompt asks for.
+    """
+
+    text = " ".join(message.get("content", "") for message in messages)
+    content = []
+    for match in MEASUREMENT_PATTERN.finditer(text):
+        start = max(0, match.start() - 40)
+        substance = text[start : match.start()].split()[-3:]
+        content.append(
+            {
+                "Measurement_substance": " ".join(substance),
+                "Measured_value": match.group("value"),
+                "Measured_unit": match.group("unit"),
+                "measurement_type": "synthetic",
+            }
+        )
+        if len(content) >= max_measurements:
+            break
+    return json.dumps({"Content": content}, ensure_ascii=False)
+
+
+class FakeOpenAIHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Headers and body are written separately; without this, Nagle's algorithm and the
+    # client's delayed ACK add ~40 ms to every response on a kept-alive connection
+    disable_nagle_algorithm = True
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        body = json.loads(self.rfile.read(length) or b"{}")
+        server = self.server
+
+        if self.path.endswith("/chat/completions"):
+            messages = body.get("messages", [])
+            answer = fake_completion(messages)
+            prompt_tokens = sum(count_tokens(m.get("content", "")) for m in messages)
+            completion_tokens = count_tokens(answer)
+            server.simulate_latency(completion_tokens)
+            response = {
+                "id": "chatcmpl-fake",
+                "object": "chat.completion",
+                "created": 0,
+                "model": body.get("model", "gpt-3.5-turbo"),
+                "choices": [
+                    {
+                        "index": 0,
+                        "message": {"role": "assistant", "content": answer},
+                        "finish_reason": "stop",
+                    }
+                ],
+                "usage": {
+                    "prompt_tokens": prompt_tokens,
+                    "completion_tokens": completion_tokens,
+                    "total_tokens": prompt_tokens + completion_tokens,
+                },
+            }
+        elif self.path.endswith("/embeddings"):
+            inputs = body.get("input", [])
+            if isinstance(inputs, str) or (inputs and isinstance(inputs[0], int)):
+                inputs = [inputs]
+            # langchain may send token ids instead of text, hash them the same way
+            texts = [t if isinstance(t, str) else " ".join(map(str, t)) for t in inputs]
+            server.simulate_latency(0)
+            prompt_tokens = sum(count_tokens(t) for t in texts)
+            response = {
+                "object": "list",
+                "data": [
+                    {"object": "embedding", "index": i, "embedding": fake_embedding(t, server.dim)}
+                    for i, t in enumerate(texts)
+                ],
+                "model": body.get("model", "text-embedding-ada-002"),
+                "usage": {"prompt_tokens": prompt_tokens, "total_tokens": prompt_tokens},
+            }
+        else:
+            self.send_error(404)
+            return
+
+        payload = json.dumps(response).encode("utf-8")
+        with server.lock:
+            server.request_count += 1
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class FakeOpenAIServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, host="127.0.0.1", port=0, latency_ms=0.0, per_token_ms=0.0, dim=EMBEDDING_DIM):
+        super().__init__((host, port), FakeOpenAIHandler)
+        self.latency_ms = latency_ms
+        self.per_token_ms = per_token_ms
+        self.dim = dim
+        self.lock = threading.Lock()
+        self.request_count = 0
+
+    @property
+    def base_url(self):
+        return f"http://{self.server_address[0]}:{self.server_port}/v1"
+
+    def simulate_latency(self, tokens):
+        delay = (self.latency_ms + self.per_token_ms * tokens) / 1000
+        if delay > 0:
+            time.sleep(delay)
+
+    def start(self):
+        thread = threading.Thread(target=self.serve_forever, daemon=True)
+        thread.start()
+        return self
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--per-token-ms", type=float, default=0.0)
+    parser.add_argument("--dim", type=int, default=EMBEDDING_DIM)
+    args = parser.parse_args()
+
+    server = FakeOpenAIServer(args.host, args.port, args.latency_ms, args.per_token_ms, args.dim)
+    print(f"Fake OpenAI server listening on {server.base_url}")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
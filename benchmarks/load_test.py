@@ -0,0 +1,172 @@
+"""
+Load test of the analysis service under concurrent job submissions.
+
+The script extracts a synthetic USPTO weekly file, starts the service in-process with a
+given number of workers against the deterministic fake OpenAI server, submits jobs from
+several client threads at once and polls them until they finish. It reports the job and
+patent throughput and the submission and completion latencies.
+
+Usage:
+    python benchmarks/load_test.py --jobs 50 --concurrency 10 --workers 4
+    python benchmarks/load_test.py --latency-ms 200 --output load.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HERE)
+sys.path.insert(0, os.path.join(HERE, "..", "src"))
+
+from fake_openai import FakeOpenAIServer  # noqa: E402
+import synth_uspto  # noqa: E402
+
+
+DATE = (2023, 1, 5)
+
+
+def percentiles(values):
+    values = sorted(values)
+    if not values:
+        return {"p50": 0.0, "p95": 0.0, "max": 0.0}
+    pick = lambda q: values[min(len(values) - 1, int(q * len(values)))]
+    return {"p50": pick(0.50), "p95": pick(0.95), "max": values[-1]}
+
+
+def start_service(app, port):
+    import uvicorn
+
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.05)
+    return server, thread
+
+
+def run(args):
+    fake = FakeOpenAIServer(latency_ms=args.latency_ms, per_token_ms=args.per_token_ms).start()
+    os.environ["OPENAI_API_BASE"] = fake.base_url
+    os.environ.setdefault("OPENAI_API_KEY", "sk-fake-benchmark-key")
+
+    workdir = tempfile.mkdtemp(prefix="patentgpt-load-")
+    os.chdir(workdir)
+
+    # Imported here so that the OpenAI client picks up the fake server settings
+    import requests
+    from patentgpt import preprocess_data
+    from patentgpt.service import create_app
+
+    year, month, day = DATE
+    folder = "ipa" + str(year)[2:] + f"{month:02d}" + f"{day:02d}"
+    synth_uspto.generate(os.path.join(workdir, "data", folder + ".xml"), args.size_mb, args.seed)
+    saved = preprocess_data.extract_patents(year, month, day, False)
+    print(f"{len(saved)} patents extracted in {workdir}")
+
+    app = create_app(os.path.join(workdir, "jobs.sqlite"), workers=args.workers)
+    server, thread = start_service(app, args.port)
+    base_url = f"http://127.0.0.1:{args.port}"
+    session = requests.Session()
+
+    def submit(i):
+        body = {
+            "year": year,
+            "month": month,
+            "day": day,
+            "patent_names": [saved[(i * args.patents_per_job + j) % len(saved)] for j in range(args.patents_per_job)],
+        }
+        start = time.perf_counter()
+        response = requests.post(f"{base_url}/jobs/patents", json=body)
+        response.raise_for_status()
+        return response.json()["job_id"], time.perf_counter() - start, time.perf_counter()
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(args.concurrency) as executor:
+        submitted = list(executor.map(submit, range(args.jobs)))
+    submit_seconds = time.perf_counter() - start
+
+    pending = {job_id: submitted_at for job_id, _, submitted_at in submitted}
+    completion = []
+    failed = 0
+    while pending:
+        for job_id in list(pending):
+            status = session.get(f"{base_url}/jobs/{job_id}").json()
+            if status["status"] in ("done", "failed"):
+                completion.append(time.perf_counter() - pending.pop(job_id))
+                failed += status["status"] == "failed"
+        time.sleep(args.poll_interval)
+    seconds = time.perf_counter() - start
+
+    server.should_exit = True
+    thread.join()
+    fake.shutdown()
+
+    patents = args.jobs * args.patents_per_job
+    report = {
+        "meta": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "jobs": args.jobs,
+            "patents_per_job": args.patents_per_job,
+            "concurrency": args.concurrency,
+            "workers": args.workers,
+            "latency_ms": args.latency_ms,
+            "fake_requests": fake.request_count,
+        },
+        "results": {
+            "seconds": seconds,
+            "failed": failed,
+            "jobs_per_second": args.jobs / seconds,
+            "patents_per_second": patents / seconds,
+            "submissions_per_second": args.jobs / submit_seconds,
+            "submit_latency": percentiles([latency for _, latency, _ in submitted]),
+            "completion_latency": percentiles(completion),
+        },
+    }
+    results = report["results"]
+    print(f"{args.jobs} jobs ({patents} patents) in {seconds:.1f} s, {failed} failed")
+    print(f"Throughput: {results['jobs_per_second']:.2f} jobs/s, {results['patents_per_second']:.2f} patents/s")
+    print(
+        f"Submit latency p50 {results['submit_latency']['p50'] * 1000:.1f} ms, "
+        f"p95 {results['submit_latency']['p95'] * 1000:.1f} ms"
+    )
+    print(
+        f"Completion latency p50 {results['completion_latency']['p50']:.2f} s, "
+        f"p95 {results['completion_latency']['p95']:.2f} s"
+    )
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--jobs", type=int, default=20)
+    parser.add_argument("--patents-per-job", type=int, default=1)
+    parser.add_argument("--concurrency", type=int, default=8, help="number of client threads")
+    parser.add_argument("--workers", type=int, default=4, help="number of service workers")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--size-mb", type=float, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--latency-ms", type=float, default=50.0)
+    parser.add_argument("--per-token-ms", type=float, default=0.0)
+    parser.add_argument("--poll-interval", type=float, default=0.1)
+    parser.add_argument("--output", help="Write the results JSON to this file.")
+    args = parser.parse_args()
+    if args.output:
+        args.output = os.path.abspath(args.output)
+
+    report = run(args)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=4)
+        print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
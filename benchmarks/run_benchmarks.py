@@ -0,0 +1,207 @@
+"""
+Reproducible end-to-end benchmark of the patentgpt pipeline.
+
+The suite generates a synthetic USPTO weekly file, then times ingestion (splitting and
+parsing the concatenated XML), chunking, streaming memory-mapped chunks, embedding, retrieval and analysis. Embedding and
+chat requests go to the deterministic fake OpenAI server in `fake_openai.py`, so no API
+key or network access is needed and results are comparable between runs.
+
+Results are written as JSON. With a baseline file, every benchmark whose throughput
+dropped by more than the tolerance is reported and the script exits with status 1.
+
+Usage:
+    python benchmarks/run_benchmarks.py --size-mb 50 --output results.json
+    python benchmarks/run_benchmarks.py --baseline benchmarks/baseline.json
+    python benchmarks/run_benchmarks.py --save-baseline benchmarks/baseline.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HERE)
+sys.path.insert(0, os.path.join(HERE, "..", "src"))
+
+from fake_openai import FakeOpenAIServer  # noqa: E402
+import synth_uspto  # noqa: E402
+
+
+DATE = (2023, 1, 5)
+
+
+def timed(results, name, items, unit, function):
+    start = time.perf_counter()
+    value = function()
+    seconds = time.perf_counter() - start
+    results[name] = {
+        "seconds": seconds,
+        "items": items() if callable(items) else items,
+        "unit": unit,
+    }
+    results[name]["throughput"] = results[name]["items"] / seconds if seconds else 0.0
+    print(
+        f"{name:<12} {seconds:>9.3f} s  {results[name]['throughput']:>12.1f} {unit}/s"
+    )
+    return value
+
+
+def run(args):
+    server = FakeOpenAIServer(
+        latency_ms=args.latency_ms, per_token_ms=args.per_token_ms
+    ).start()
+    os.environ["OPENAI_API_BASE"] = server.base_url
+    os.environ.setdefault("OPENAI_API_KEY", "sk-fake-benchmark-key")
+
+    workdir = tempfile.mkdtemp(prefix="patentgpt-bench-")
+    os.chdir(workdir)
+
+    # Imported here so that the OpenAI client picks up the fake server settings
+    from patentgpt import preprocess_data, qaagent
+    from patentgpt import metrics
+    from patentgpt.metrics import METRICS
+    from patentgpt.prompts import PROMPT, RETRIEVAL_QUERY
+
+    year, month, day = DATE
+    folder = "ipa" + str(year)[2:] + f"{month:02d}" + f"{day:02d}"
+    xml_path = os.path.join(workdir, "data", folder + ".xml")
+    results = {}
+
+    timed(
+        results, "generate", args.size_mb, "MB",
+        lambda: synth_uspto.generate(xml_path, args.size_mb, args.seed),
+    )
+    saved = timed(
+        results, "ingestion", args.size_mb, "MB",
+        lambda: preprocess_data.extract_patents(year, month, day, False),
+    )
+    results["ingestion"]["patents"] = len(saved)
+
+    sample = saved[: args.patents]
+    paths = [os.path.join(workdir, "data", folder, name) for name in sample]
+
+    from langchain.document_loaders import TextLoader
+
+    documents_raw = timed(
+        results, "load", len(paths), "patents",
+        lambda: [doc for path in paths for doc in TextLoader(path).load()],
+    )
+    chunks = timed(
+        results, "chunking", len(paths), "patents",
+        lambda: qaagent.split_docs(documents_raw),
+    )
+    from patentgpt import textstore
+
+    timed(
+        results, "streaming", len(paths), "patents",
+        lambda: [sum(1 for _ in textstore.iter_chunks(path)) for path in paths],
+    )
+    texts = [chunk.page_content for chunk in chunks]
+    timed(
+        results, "embedding", len(texts), "chunks",
+        lambda: qaagent.embeddings.embed_documents(texts),
+    )
+
+    from langchain.vectorstores import Chroma
+
+    vectordb = Chroma.from_documents(documents=chunks, embedding=qaagent.embeddings)
+    timed(
+        results, "retrieval", args.queries, "queries",
+        lambda: [vectordb.similarity_search(RETRIEVAL_QUERY) for _ in range(args.queries)],
+    )
+    vectordb.delete_collection()
+
+    metrics.reset()
+    timed(
+        results, "analysis", len(sample), "patents",
+        lambda: [
+            qaagent.call_QA_to_json(
+                PROMPT, year, month, day, sample, i, False, query=RETRIEVAL_QUERY
+            )
+            for i in range(len(sample))
+        ],
+    )
+    results["analysis"]["stages"] = METRICS.stage_summary()
+    results["analysis"]["outputs_saved"] = METRICS.counters.get("outputs_saved", 0)
+    results["analysis"]["input_tokens_before"] = METRICS.counters.get("input_tokens_before", 0)
+    results["analysis"]["input_tokens_after"] = METRICS.counters.get("input_tokens_after", 0)
+    results["analysis"]["max_rss_bytes"] = METRICS.gauges.get("max_rss_bytes", 0)
+    results["analysis"]["max_patent_bytes"] = METRICS.gauges.get("max_patent_bytes", 0)
+
+    server.shutdown()
+    return {
+        "meta": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "size_mb": args.size_mb,
+            "seed": args.seed,
+            "patents": args.patents,
+            "latency_ms": args.latency_ms,
+            "per_token_ms": args.per_token_ms,
+            "fake_requests": server.request_count,
+        },
+        "results": results,
+    }
+
+
+def compare(report, baseline, tolerance):
+    """
+    Return a list of (name, baseline throughput, current throughput) for every benchmark
+    that is slower than the baseline by more than `tolerance` (a fraction).
+    """
+
+    regressions = []
+    for name, result in report["results"].items():
+        if name == "generate" or name not in baseline["results"]:
+            continue
+        before = baseline["results"][name]["throughput"]
+        after = result["throughput"]
+        change = (after - before) / before if before else 0.0
+        print(f"{name:<12} baseline {before:>12.1f}  current {after:>12.1f}  {change:+.1%}")
+        if change < -tolerance:
+            regressions.append((name, before, after))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--size-mb", type=float, default=20)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--patents", type=int, default=10)
+    parser.add_argument("--queries", type=int, default=20)
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--per-token-ms", type=float, default=0.0)
+    parser.add_argument("--output", help="Write the results JSON to this file.")
+    parser.add_argument("--baseline", help="Compare against this results JSON.")
+    parser.add_argument("--save-baseline", help="Store the results as the new baseline.")
+    parser.add_argument("--tolerance", type=float, default=0.10)
+    args = parser.parse_args()
+
+    for option in ("output", "baseline", "save_baseline"):
+        if getattr(args, option):
+            setattr(args, option, os.path.abspath(getattr(args, option)))
+
+    report = run(args)
+
+    for path in (args.output, args.save_baseline):
+        if path:
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(report, f, indent=4)
+            print(f"Results written to {path}")
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare(report, baseline, args.tolerance)
+        if regressions:
+            print(f"{len(regressions)} benchmark(s) regressed by more than {args.tolerance:.0%}.")
+            sys.exit(1)
+        print("No regressions against the baseline.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""
+Run the sharded mode locally with several worker processes simulating nodes.
+
+The script generates synthetic weekly files for a few consecutive weeks, adds them to a
+fresh ledger and starts worker processes (`python -m patentgpt.ledger work`) against the
+deterministic fake OpenAI server. One worker is killed while it works, so that its
+leased unit must expire and be taken over by another worker. At the end it checks that
+every unit is done and that every analyzed patent has exactly one output file and no
+staging file is left.
+
+Usage:
+    python benchmarks/sharded_demo.py --weeks 3 --workers 4
+"""
+
+import argparse
+import glob
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+SRC = os.path.abspath(os.path.join(HERE, "..", "src"))
+sys.path.insert(0, HERE)
+sys.path.insert(0, SRC)
+
+from fake_openai import FakeOpenAIServer  # noqa: E402
+import synth_uspto  # noqa: E402
+from patentgpt.ledger import WorkLedger  # noqa: E402
+
+
+FIRST_WEEK = date(2023, 1, 5)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--weeks", type=int, default=3)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--size-mb", type=float, default=1)
+    parser.add_argument("--lease-seconds", type=float, default=10)
+    parser.add_argument("--kill-after", type=float, default=5, help="seconds before one worker is killed")
+    parser.add_argument("--latency-ms", type=float, default=20.0)
+    args = parser.parse_args()
+
+    server = FakeOpenAIServer(latency_ms=args.latency_ms).start()
+    workdir = tempfile.mkdtemp(prefix="patentgpt-sharded-")
+    os.chdir(workdir)
+
+    weeks = [FIRST_WEEK + timedelta(days=7 * i) for i in range(args.weeks)]
+    for i, week in enumerate(weeks):
+        name = "ipa" + str(week.year)[2:] + f"{week.month:02d}" + f"{week.day:02d}"
+        synth_uspto.generate(os.path.join("data", name + ".xml"), args.size_mb, seed=i, first_number=i * 100000)
+    ledger = WorkLedger("ledger.sqlite")
+    ledger.add_weeks(weeks)
+
+    env = dict(
+        os.environ,
+        OPENAI_API_BASE=server.base_url,
+        OPENAI_API_KEY="sk-fake-benchmark-key",
+        PYTHONPATH=SRC + os.pathsep + os.environ.get("PYTHONPATH", ""),
+    )
+    command = [
+        sys.executable, "-m", "patentgpt.ledger", "--ledger", "ledger.sqlite", "work",
+        "--lease-seconds", str(args.lease_seconds), "--poll-interval", "0.5",
+    ]
+    start = time.perf_counter()
+    workers = [
+        subprocess.Popen(command + ["--worker-id", f"node-{i}"], env=env)
+        for i in range(args.workers)
+    ]
+
+    time.sleep(args.kill_after)
+    if workers[0].poll() is None:
+        print("Killing node-0 while it holds a lease...")
+        workers[0].send_signal(signal.SIGKILL)
+    for worker in workers:
+        worker.wait()
+    seconds = time.perf_counter() - start
+    server.shutdown()
+
+    counts = ledger.counts()
+    done = [
+        patent
+        for (patent,) in ledger.connection.execute(
+            "SELECT patent FROM units WHERE status = 'done' AND patent != ''"
+        )
+    ]
+    outputs = glob.glob("output/*_gpt-3.5-turbo.json")
+    staged = glob.glob("output/.*.tmp")
+    print(f"Ledger: {counts} in {seconds:.1f} s ({len(done) / seconds:.1f} patents/s)")
+    print(f"{len(outputs)} outputs for {len(done)} analyzed patents, {len(staged)} staging files left")
+
+    missing = [patent for patent in done if not os.path.exists(f"output/{patent}_gpt-3.5-turbo.json")]
+    ok = not counts["pending"] and not counts["leased"] and not staged and len(outputs) == len(done) - len(missing)
+    if missing:
+        print(f"{len(missing)} patents have no output (their answer could not be parsed).")
+    print("OK" if ok else "FAILED")
+    print(f"Work directory: {workdir}")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
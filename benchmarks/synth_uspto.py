@@ -0,0 +1,132 @@
+"""
+Generate a synthetic USPTO weekly application file: concatenated XML documents in the
+same layout as the ipaYYMMDD.xml files from bulkdata.uspto.gov.
+
+The output is seeded, so the same arguments always produce the same file. About a third
+of the documents are outside IPC section C, and a share of them are near-duplicate
+continuations of an earlier document, as in the real weekly files.
+
+Usage:
+    python benchmarks/synth_uspto.py data/ipa230105.xml --size-mb 2048
+"""
+
+import argparse
+import os
+import random
+
+
+XML_HEADER = '<?xml version="1.0" encoding="UTF-8"?>\n'
+DOCTYPE = '<!DOCTYPE us-patent-application SYSTEM "us-patent-application-v46-2022-02-17.dtd" [ ]>\n'
+
+SUBSTANCES = [
+    "the polymer film", "BaCO3 powder", "the aqueous solution", "the catalyst layer",
+    "the coating", "the alloy", "the fiber", "the slurry", "the electrolyte", "the resin",
+]
+PROPERTIES = [
+    ("thickness", ["nm", "μm", "mm"]), ("temperature", ["°C", "K"]),
+    ("pressure", ["MPa", "kPa"]), ("mass", ["g", "mg", "kg"]),
+    ("duration", ["s", "min", "h"]), ("concentration", ["%"]),
+    ("volume", ["mL", "L"]), ("frequency", ["Hz"]),
+]
+FILLER = (
+    "In some embodiments the composition further comprises additives as described with "
+    "reference to FIG. 2, and the method may be carried out in a batch or continuous mode. "
+)
+
+
+def make_paragraph(rng, number):
+    sentences = []
+    for _ in range(rng.randint(2, 5)):
+        prop, units = rng.choice(PROPERTIES)
+        value = round(rng.uniform(-80, 1000), rng.choice([0, 1, 2]))
+        sentences.append(
+            f"{rng.choice(SUBSTANCES).capitalize()} has a {prop} of about {value} {rng.choice(units)}."
+        )
+    sentences.append(FILLER * rng.randint(1, 4))
+    return f'<p id="p-{number:04d}" num="{number:04d}">[{number:04d}] ' + " ".join(sentences) + "</p>\n"
+
+
+def make_patent(rng, doc_number, paragraphs, section):
+    body = "".join(paragraphs)
+    return (
+        XML_HEADER
+        + DOCTYPE
+        + '<us-patent-application lang="EN" dtd-version="v4.6 2022-02-17" '
+        + f'file="US{doc_number}A1-20230105.XML" status="PRODUCTION" id="us-patent-application" '
+        + 'country="US" date-produced="20221221" date-publ="20230105">\n'
+        + "<us-bibliographic-data-application>\n"
+        + "<publication-reference><document-id><country>US</country>"
+        + f"<doc-number>{doc_number}</doc-number><kind>A1</kind><date>20230105</date>"
+        + "</document-id></publication-reference>\n"
+        + "<classifications-ipcr><classification-ipcr>"
+        + f"<section>{section}</section><class>08</class><subclass>L</subclass>"
+        + "</classification-ipcr></classifications-ipcr>\n"
+        + "</us-bibliographic-data-application>\n"
+        + '<description id="description">\n'
+        + '<heading id="h-0001" level="1">BACKGROUND</heading>\n'
+        + body
+        + "</description>\n"
+        + "</us-patent-application>\n"
+    )
+
+
+def generate(path, size_mb=10, seed=0, paragraphs=40, duplicate_rate=0.1, first_number=0):
+    """
+    Write a synthetic concatenated XML file of roughly `size_mb` megabytes.
+
+    Parameters:
+        path (str): The output file path.
+        size_mb (float): The target size of the file in megabytes.
+        seed (int): The random seed.
+        paragraphs (int): The average number of description paragraphs per patent.
+        duplicate_rate (float): The share of section C patents that repeat an earlier
+            description with a few edited paragraphs.
+        first_number (int): The document number of the first patent, so that files of
+            several weeks do not share patent numbers.
+
+    Returns:
+        int: The number of patent documents written.
+    """
+
+    rng = random.Random(seed)
+    target = int(size_mb * 1024 * 1024)
+    written = 0
+    count = 0
+    previous = []
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        while written < target:
+            doc_number = f"2023{first_number + count:07d}"
+            section = "C" if rng.random() < 0.66 else rng.choice("ABDEFGH")
+            if section == "C" and previous and rng.random() < duplicate_rate:
+                body = list(rng.choice(previous))
+                for _ in range(max(1, len(body) // 20)):
+                    i = rng.randrange(len(body))
+                    body[i] = make_paragraph(rng, i + 1)
+            else:
+                n = max(1, int(rng.gauss(paragraphs, paragraphs / 4)))
+                body = [make_paragraph(rng, i + 1) for i in range(n)]
+                if section == "C":
+                    previous = (previous + [body])[-50:]
+            document = make_patent(rng, doc_number, body, section)
+            f.write(document)
+            written += len(document.encode("utf-8"))
+            count += 1
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("path")
+    parser.add_argument("--size-mb", type=float, default=10)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--paragraphs", type=int, default=40)
+    parser.add_argument("--duplicate-rate", type=float, default=0.1)
+    args = parser.parse_args()
+
+    count = generate(args.path, args.size_mb, args.seed, args.paragraphs, args.duplicate_rate)
+    print(f"Wrote {count} patents to {args.path}")
+
+
+if __name__ == "__main__":
+    main()
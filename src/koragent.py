@@ -15,6 +15,8 @@ from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain.document_loaders import TextLoader
 from langchain.callbacks import get_openai_callback
+from patentgpt import clients
+from patentgpt.metrics import METRICS
 
 def split_docs(documents, chunk_size=1000, chunk_overlap=20):
     text_splitter = RecursiveCharacterTextSplitter(
@@ -48,7 +50,7 @@ async def call_extraction_to_json(schema, year, month, day, saved_patent_names,
         The output is also written to a file in the 'output' directory with the same name as the input file and a '.json' extension.
     """
 
-    llm = ChatOpenAI(model_name=model_name)
+    llm = clients.get_chat_model(model_name)
 
     if logging:
         print("Starting the extraction process...")
@@ -72,13 +74,11 @@ async def call_extraction_to_json(schema, year, month, day, saved_patent_names,
     if logging:
         print("Running extraction chain...")
 
-    with get_openai_callback() as cb:
+    with get_openai_callback() as cb, METRICS.timer("llm"):
         output = await extract_from_documents(chain, documents, max_concurrency=5, use_uid=False, return_exceptions=True)
-        print(f"Total Tokens: {cb.total_tokens}")
-        print(f"Prompt Tokens: {cb.prompt_tokens}")
-        print(f"Completion Tokens: {cb.completion_tokens}")
-        print(f"Successful Requests: {cb.successful_requests}")
-        print(f"Total Cost (USD): ${cb.total_cost}")
+    METRICS.record_llm(model_name, cb)
+    if logging:
+        print(f"Total Tokens: {cb.total_tokens}, Total Cost (USD): ${cb.total_cost}")
 
     if logging:
         print(output[0])
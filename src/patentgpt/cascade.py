@@ -0,0 +1,206 @@
+import os
+import re
+import time
+from langchain.callbacks.openai_info import get_openai_token_cost_for_model
+from . import qaagent
+from . import textstore
+from .measurements import MEASUREMENT_MENTION
+from .metrics import METRICS
+
+
+CHEAP_MODEL = "gpt-3.5-turbo"
+STRONG_MODEL = "gpt-4"
+
+# Mentions of a measurement per 1000 words above which an empty answer is suspicious
+DEFAULT_DENSITY_THRESHOLD = 2.0
+
+_WORD = re.compile(r"\S+")
+
+
+def measurement_density(text):
+    """
+    Return the number of "<number> <unit>" mentions per 1000 words of a text.
+
+    This is a cheap local pre-score of how many measurements the model should find.
+    `text` may also be an iterable of chunks, which are counted one at a time.
+    """
+
+    chunks = [text] if isinstance(text, str) else text
+    words = 0
+    mentions = 0
+    for chunk in chunks:
+        words += len(_WORD.findall(chunk))
+        mentions += len(MEASUREMENT_MENTION.findall(chunk))
+    if not words:
+        return 0.0
+    return 1000 * mentions / words
+
+
+def quality_check(output_dict, density, density_threshold=DEFAULT_DENSITY_THRESHOLD):
+    """
+    Decide locally whether an output of the cheap model can be accepted.
+
+    Parameters:
+        output_dict (dict): The output of the cheap model as parsed (and possibly
+            repaired) by `qaagent.parse_output`, or None if it was lost.
+        density (float): The measurement density of the patent text.
+        density_threshold (float): The density above which an output without any
+            measurement is rejected.
+
+    Returns:
+        tuple: A tuple containing two elements:
+            - True if the output is accepted, False if it must be escalated.
+            - The reason of the decision.
+    """
+
+    if output_dict is None:
+        return False, "invalid JSON or schema violation"
+    if not output_dict["Content"] and density >= density_threshold:
+        return False, f"no measurements despite a density of {density:.1f} per 1000 words"
+    return True, f"{len(output_dict['Content'])} measurements"
+
+
+def _estimate_cost(model_name, prompt_tokens, completion_tokens):
+    return get_openai_token_cost_for_model(model_name, prompt_tokens) + get_openai_token_cost_for_model(
+        model_name, completion_tokens, is_completion=True
+    )
+
+
+def call_QA_cascade_to_json(
+    prompt,
+    year,
+    month,
+    day,
+    saved_patent_names,
+    index=0,
+    logging=True,
+    query=None,
+    cheap_model=CHEAP_MODEL,
+    strong_model=STRONG_MODEL,
+    density_threshold=DEFAULT_DENSITY_THRESHOLD,
+    output_path=None,
+):
+    """
+    Analyze a patent with the cheap model first and escalate to the strong model only when
+    the local quality check fails.
+
+    The check rejects outputs that are not valid JSON, that violate the measurement schema,
+    or that contain no measurement although the measurement density of the patent text is
+    high. The patent is embedded once, and an escalation retrieves from the same vector
+    store. Only the accepted output is written, to 'output/{name}_cascade.json' with the
+    model that produced it. The cost the strong model would have had for the accepted
+    cheap outputs is estimated from their token counts and recorded in the metrics.
+
+    Parameters:
+        prompt (str): The input prompt for the retrieval process.
+        year (int): The year part of the data folder name.
+        month (int): The month part of the data folder name.
+        day (int): The day part of the data folder name.
+        saved_patent_names (list): A list of strings containing the names of saved patent text files.
+        index (int): The index of the saved patent text file to process. Default is 0.
+        logging (bool): The boolean to print logs
+        query (str, optional): A short retrieval query, see `qaagent.call_QA_to_json`.
+        cheap_model (str): The model that runs first.
+        strong_model (str): The model used for escalations.
+        density_threshold (float): See `quality_check`.
+        output_path (str, optional): Where to write the accepted output instead of
+            'output/{name}_cascade.json'.
+
+    Returns:
+        tuple: A tuple containing four elements:
+            - Cost of OpenAI API
+            - A JSON string representing the accepted output.
+            - The parsed accepted output that was written, or None if it was lost.
+            - The name of the model that produced it.
+    """
+
+    file_path = os.path.join(
+        os.getcwd(),
+        "data",
+        "ipa" + str(year)[2:] + f"{month:02d}" + f"{day:02d}",
+        saved_patent_names[index],
+    )
+    density = measurement_density(
+        doc.page_content for doc in textstore.iter_chunks(file_path, chunk_size=100000)
+    )
+
+    # The patent is embedded once and both models retrieve from the same store
+    start = time.perf_counter()
+    with qaagent.embed_patent(
+        year, month, day, saved_patent_names, index, logging, compact=query is not None
+    ) as store:
+        METRICS.observe("cascade_embed", time.perf_counter() - start)
+        start = time.perf_counter()
+        cost, output, output_dict, (prompt_tokens, completion_tokens) = qaagent.call_QA(
+            prompt, year, month, day, saved_patent_names, index, logging, cheap_model, query=query, store=store
+        )
+        METRICS.observe("cascade_cheap", time.perf_counter() - start)
+        strong_cost_estimate = _estimate_cost(strong_model, prompt_tokens, completion_tokens)
+
+        accepted, reason = quality_check(output_dict, density, density_threshold)
+        model_used = cheap_model
+        if accepted:
+            METRICS.increment("cascade_accepted")
+            METRICS.increment("cascade_strong_cost_estimate", strong_cost_estimate)
+        else:
+            if logging:
+                print(f"Escalating {saved_patent_names[index]} to {strong_model}: {reason}.")
+            METRICS.increment("cascade_escalated")
+            start = time.perf_counter()
+            strong_cost, output, output_dict, _ = qaagent.call_QA(
+                prompt, year, month, day, saved_patent_names, index, logging, strong_model, query=query,
+                store=store,
+            )
+            METRICS.observe("cascade_strong", time.perf_counter() - start)
+            METRICS.increment("cascade_strong_cost_estimate", strong_cost)
+            cost += strong_cost
+            model_used = strong_model
+
+    if output_dict is not None:
+        output_dict["Model"] = model_used
+        qaagent.save_output(
+            output_dict,
+            saved_patent_names[index],
+            output_path or f"output/{saved_patent_names[index]}_cascade.json",
+            logging,
+        )
+    return cost, output, output_dict, model_used
+
+
+def print_cascade_report(metrics=METRICS):
+    """
+    Print how many outputs were escalated, and the cost and latency saved compared with
+    running every patent on the strong model.
+    """
+
+    accepted = metrics.counters.get("cascade_accepted", 0)
+    escalated = metrics.counters.get("cascade_escalated", 0)
+    total = accepted + escalated
+    if not total:
+        return
+    actual_cost = metrics.total_cost()
+    strong_cost = metrics.counters.get("cascade_strong_cost_estimate", 0)
+    print(f"Cascade: {accepted:g} accepted, {escalated:g} escalated ({escalated / total:.1%})")
+    print(
+        f"Cascade cost: ${actual_cost:.4f} vs ${strong_cost:.4f} estimated on the strong model "
+        f"(saved ${strong_cost - actual_cost:.4f})"
+    )
+
+    # The embedding is shared by both models, so it takes the same time on the strong
+    # model alone
+    embed_seconds = metrics.stage_totals.get("cascade_embed", 0.0)
+    cheap_seconds = metrics.stage_totals.get("cascade_cheap", 0.0)
+    strong_count = metrics.stage_counts.get("cascade_strong", 0)
+    if not strong_count:
+        print(
+            f"Cascade latency: {embed_seconds + cheap_seconds:.1f} s, no escalations, so the "
+            f"latency of the strong model was not measured"
+        )
+        return
+    strong_seconds = metrics.stage_totals["cascade_strong"]
+    actual_seconds = embed_seconds + cheap_seconds + strong_seconds
+    estimated_seconds = embed_seconds + strong_seconds / strong_count * total
+    print(
+        f"Cascade latency: {actual_seconds:.1f} s vs {estimated_seconds:.1f} s estimated "
+        f"on the strong model (saved {estimated_seconds - actual_seconds:.1f} s)"
+    )
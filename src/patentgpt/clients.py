@@ -0,0 +1,152 @@
+import threading
+import openai
+import requests
+from openai.api_requestor import MAX_CONNECTION_RETRIES
+from requests.adapters import HTTPAdapter
+from langchain.chat_models import ChatOpenAI
+
+
+DEFAULT_POOL_CONNECTIONS = 10
+DEFAULT_POOL_MAXSIZE = 20
+
+_lock = threading.RLock()
+_pool_config = {
+    "pool_connections": DEFAULT_POOL_CONNECTIONS,
+    "pool_maxsize": DEFAULT_POOL_MAXSIZE,
+    "max_retries": 0,
+}
+_sessions = {}
+_chat_models = {}
+
+
+def configure_pools(
+    pool_connections=DEFAULT_POOL_CONNECTIONS,
+    pool_maxsize=DEFAULT_POOL_MAXSIZE,
+    max_retries=0,
+):
+    """
+    Configure the size of the keep-alive connection pools used by the shared HTTP sessions.
+
+    Existing sessions are closed so that the next call to `get_http_session` builds them
+    again with the new pool sizes. The OpenAI sessions are installed with
+    `install_openai_session`, and those of running threads pick up the new sizes when
+    openai replaces them (every few minutes). Chat model instances are kept.
+
+    Parameters:
+        pool_connections (int): The number of host pools to cache per session.
+        pool_maxsize (int): The maximum number of connections kept alive per host.
+        max_retries (int): The number of retries for failed connections of the shared
+            HTTP sessions. The OpenAI sessions keep openai's own connection retries.
+    """
+
+    with _lock:
+        _pool_config["pool_connections"] = pool_connections
+        _pool_config["pool_maxsize"] = pool_maxsize
+        _pool_config["max_retries"] = max_retries
+        _close_sessions()
+    install_openai_session()
+
+
+def get_http_session(name="default"):
+    """
+    Return a pooled `requests.Session` shared by every caller using the same name.
+
+    Parameters:
+        name (str): The name of the session. Use separate names for unrelated hosts
+            (e.g. "uspto" and "openai") so their pools do not compete.
+
+    Returns:
+        requests.Session: A session whose adapters keep connections alive between calls.
+    """
+
+    with _lock:
+        session = _sessions.get(name)
+        if session is None:
+            session = _pooled_session()
+            _sessions[name] = session
+        return session
+
+
+def _pooled_session(max_retries=None):
+    session = requests.Session()
+    adapter = HTTPAdapter(
+        pool_connections=_pool_config["pool_connections"],
+        pool_maxsize=_pool_config["pool_maxsize"],
+        max_retries=_pool_config["max_retries"] if max_retries is None else max_retries,
+    )
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def openai_session():
+    """
+    Build a pooled session for the OpenAI client.
+
+    openai keeps one session per thread, which it closes and replaces every few minutes.
+    It calls this factory to build each of them, so that no session is shared across
+    threads and none is closed while another thread still uses it. Connection errors are
+    retried as often as by openai's own sessions.
+    """
+
+    with _lock:
+        session = _pooled_session(MAX_CONNECTION_RETRIES)
+    if openai.proxy:
+        session.proxies = {"http": openai.proxy, "https": openai.proxy} if isinstance(openai.proxy, str) else dict(openai.proxy)
+    return session
+
+
+def install_openai_session():
+    """
+    Make the OpenAI client build its per-thread sessions with `openai_session`, so that
+    chat and embedding requests of a thread reuse the same keep-alive connections.
+
+    It is called once when `qaagent` configures the OpenAI client, and again by
+    `configure_pools`.
+    """
+
+    openai.requestssession = openai_session
+
+
+def get_chat_model(model_name="gpt-3.5-turbo", temperature=0.7, **kwargs):
+    """
+    Return a shared `ChatOpenAI` instance for the given model and temperature.
+
+    Instances are created once per (model_name, temperature, kwargs) and reused for
+    every later call.
+
+    Parameters:
+        model_name (str): The name of the OpenAI chat model.
+        temperature (float): The sampling temperature.
+        **kwargs: Extra keyword arguments passed to `ChatOpenAI` (e.g. cache=False).
+
+    Returns:
+        ChatOpenAI: The shared chat model instance.
+    """
+
+    key = (model_name, temperature, tuple(sorted(kwargs.items())))
+    with _lock:
+        llm = _chat_models.get(key)
+        if llm is None:
+            llm = ChatOpenAI(model_name=model_name, temperature=temperature, **kwargs)
+            _chat_models[key] = llm
+        return llm
+
+
+def reset_clients():
+    """
+    Close every pooled HTTP session and drop the cached chat model instances. The OpenAI
+    client goes back to its default sessions until `install_openai_session` is called.
+    """
+
+    with _lock:
+        _close_sessions()
+        _chat_models.clear()
+        if openai.requestssession is openai_session:
+            openai.requestssession = None
+
+
+def _close_sessions():
+    for session in _sessions.values():
+        session.close()
+    _sessions.clear()
@@ -0,0 +1,187 @@
+import os
+import re
+import json
+import pickle
+import hashlib
+import numpy as np
+from .metrics import METRICS
+
+
+MINHASH_INDEX_NAME = "minhash_index.pkl"
+DEFAULT_THRESHOLD = 0.85
+
+_MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+_MAX_HASH = np.uint64((1 << 32) - 1)
+_WORD = re.compile(r"\w+")
+# Shingles permuted at a time: 128 permutations x 2048 shingles is a 2 MB matrix
+_SHINGLE_BLOCK = 2048
+
+
+class MinHashIndex:
+    """
+    MinHash signatures with an LSH band index to find near-duplicate patent descriptions.
+
+    Continuations and divisionals in a weekly file share most of their description, so
+    their word shingles have a high Jaccard similarity. The index is banded so that a
+    lookup only compares a document with the few candidates that share a band.
+
+    Parameters:
+        num_perm (int): The number of hash permutations in a signature.
+        bands (int): The number of LSH bands. With 128 permutations and 16 bands of 8
+            rows, pairs above ~0.7 similarity are almost always candidates.
+        shingle_size (int): The number of words per shingle.
+        seed (int): The seed of the permutations.
+    """
+
+    def __init__(self, num_perm=128, bands=16, shingle_size=5, seed=1):
+        if num_perm % bands:
+            raise ValueError("num_perm must be a multiple of bands")
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.shingle_size = shingle_size
+        rng = np.random.RandomState(seed)
+        self._a = rng.randint(1, 1 << 32, size=num_perm, dtype=np.uint64)
+        self._b = rng.randint(0, 1 << 32, size=num_perm, dtype=np.uint64)
+        self.signatures = {}
+        self.buckets = [{} for _ in range(bands)]
+
+    def signature(self, text):
+        """
+        Return the MinHash signature of a text as an array of `num_perm` integers.
+        """
+
+        words = _WORD.findall(text.lower())
+        k = self.shingle_size
+        shingles = {" ".join(words[i : i + k]) for i in range(max(1, len(words) - k + 1))}
+        hashes = np.fromiter(
+            (
+                int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=4).digest(), "little")
+                for s in shingles
+            ),
+            dtype=np.uint64,
+            count=len(shingles),
+        )
+        # The shingles are permuted in blocks with a running minimum, so that a long
+        # description never needs a num_perm x n_shingles matrix
+        minimum = np.full(self.num_perm, _MAX_HASH, dtype=np.uint64)
+        for start in range(0, len(hashes), _SHINGLE_BLOCK):
+            block = hashes[start : start + _SHINGLE_BLOCK]
+            # Overflow of the uint64 product is intended, it only scrambles the hash further
+            with np.errstate(over="ignore"):
+                permuted = (np.outer(self._a, block) + self._b[:, None]) % _MERSENNE_PRIME
+            np.minimum(minimum, (permuted & _MAX_HASH).min(axis=1), out=minimum)
+        return minimum
+
+    def _band_keys(self, signature):
+        for band in range(self.bands):
+            yield band, signature[band * self.rows : (band + 1) * self.rows].tobytes()
+
+    def add(self, key, text=None, signature=None):
+        """
+        Add a document to the index by its text or precomputed signature.
+        """
+
+        if signature is None:
+            signature = self.signature(text)
+        self.signatures[key] = signature
+        for band, band_key in self._band_keys(signature):
+            self.buckets[band].setdefault(band_key, []).append(key)
+        return signature
+
+    def query(self, key=None, text=None, threshold=DEFAULT_THRESHOLD):
+        """
+        Return the indexed documents similar to a document, most similar first.
+
+        Parameters:
+            key (str, optional): The key of an indexed document.
+            text (str, optional): The text of a document that is not indexed.
+            threshold (float): The minimum estimated Jaccard similarity.
+
+        Returns:
+            list: A list of (key, similarity) tuples, excluding the document itself.
+        """
+
+        signature = self.signatures[key] if key is not None else self.signature(text)
+        candidates = set()
+        for band, band_key in self._band_keys(signature):
+            candidates.update(self.buckets[band].get(band_key, ()))
+        candidates.discard(key)
+
+        matches = []
+        for candidate in candidates:
+            similarity = float(np.mean(self.signatures[candidate] == signature))
+            if similarity >= threshold:
+                matches.append((candidate, similarity))
+        matches.sort(key=lambda match: match[1], reverse=True)
+        return matches
+
+    def save(self, path):
+        with open(path, "wb") as f:
+            pickle.dump(self, f)
+
+
+def load_index(directory):
+    """
+    Load the MinHash index saved by `extract_patents` in a weekly data directory.
+
+    Returns:
+        MinHashIndex: The index, or None if the directory has none.
+    """
+
+    path = os.path.join(directory, MINHASH_INDEX_NAME)
+    if not os.path.exists(path):
+        return None
+    with open(path, "rb") as f:
+        return pickle.load(f)
+
+
+def reuse_duplicate_output(
+    index, patent_name, model_name, threshold=DEFAULT_THRESHOLD, logging=True, output_path=None
+):
+    """
+    Reuse the analysis of a near-duplicate patent instead of querying the LLM again.
+
+    Looks for an indexed patent above the similarity threshold that already has an output
+    file for the same model. If one exists, its measurements are written as the output of
+    `patent_name`, with a note of the source patent and the similarity.
+
+    Parameters:
+        index (MinHashIndex): The near-duplicate index of the weekly file.
+        patent_name (str): The name of the saved patent text file to analyze.
+        model_name (str): The name of the model whose outputs may be reused.
+        threshold (float): The minimum estimated Jaccard similarity.
+        logging (bool): The boolean to print logs
+        output_path (str, optional): Where to write the reused output instead of
+            'output/{patent_name}_{model_name}.json', e.g. a staging file.
+
+    Returns:
+        dict: The output written for `patent_name`, with the name of the patent it was
+            reused from, or None if the patent must be analyzed.
+    """
+
+    if index is None or patent_name not in index.signatures:
+        return None
+
+    for candidate, similarity in index.query(patent_name, threshold=threshold):
+        source_path = f"output/{candidate}_{model_name}.json"
+        if not os.path.exists(source_path):
+            continue
+
+        with open(source_path, "r", encoding="utf-8") as f:
+            output_dict = json.load(f)
+        output_dict["Patent Identifier"] = patent_name.split("-")[0]
+        output_dict["Near Duplicate Of"] = candidate.split("-")[0]
+        output_dict["Similarity"] = round(similarity, 3)
+
+        with open(output_path or f"output/{patent_name}_{model_name}.json", "w", encoding="utf-8") as json_file:
+            json.dump(output_dict, json_file, indent=4, ensure_ascii=False)
+
+        METRICS.increment("llm_calls_avoided")
+        if logging:
+            print(
+                f"Patent {patent_name} is a near duplicate of {candidate} "
+                f"(similarity {similarity:.2f}). Reusing its output."
+            )
+        return output_dict
+    return None
@@ -0,0 +1,385 @@
+"""
+Compare the measurements extracted by two models, or by a model and a gold set.
+
+All outputs of a model are loaded once into columnar numpy arrays. Measurements of the
+same patent are paired as a whole array, scored with a fuzzy match on substance (hashed
+character trigram similarity), value (SI bounds within a relative tolerance, or the same
+text when the value cannot be parsed) and unit (same SI unit), and matched one to one
+with the best scoring pairs first. Precision, recall and F1 are reported per patent and
+in aggregate (micro over all measurements, macro over patents).
+
+Usage:
+    python -m patentgpt.evaluation --pred gpt-3.5-turbo --ref gpt-4
+    python -m patentgpt.evaluation --pred gpt-3.5-turbo --gold-dir gold --csv per_patent.csv
+"""
+
+import argparse
+import csv
+import glob
+import json
+import os
+import re
+import time
+import zlib
+import numpy as np
+from .measurements import normalize_measurement
+
+
+TRIGRAM_BITS = 256
+DEFAULT_SUBSTANCE_THRESHOLD = 0.5
+DEFAULT_VALUE_TOLERANCE = 0.05
+DEFAULT_MAX_PAIRS = 2_000_000
+
+_POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.int32)
+_ARTICLE = re.compile(r"^(?:the|a|an)\s+")
+# Reference numerals of the drawings, e.g. "ultrafine thread 121"
+_REFERENCE_NUMERAL = re.compile(r"\s+\d+[a-z]?\b")
+_SPACES = re.compile(r"\s+")
+
+
+def normalize_substance(text):
+    text = _SPACES.sub(" ", str(text).lower()).strip()
+    text = _REFERENCE_NUMERAL.sub("", _ARTICLE.sub("", text))
+    return text.strip()
+
+
+def _normalize_text(text):
+    return _SPACES.sub("", str(text).lower())
+
+
+def trigram_signatures(texts):
+    """
+    Return the hashed character trigrams of every text as rows of a bit matrix.
+
+    Returns:
+        ndarray: A uint8 array of shape (len(texts), TRIGRAM_BITS // 8).
+    """
+
+    rows, bits = [], []
+    for row, text in enumerate(texts):
+        padded = f"  {text} "
+        for i in range(len(padded) - 2):
+            rows.append(row)
+            bits.append(zlib.crc32(padded[i : i + 3].encode("utf-8")) % TRIGRAM_BITS)
+    signatures = np.zeros((len(texts), TRIGRAM_BITS // 8), dtype=np.uint8)
+    if rows:
+        rows = np.array(rows)
+        bits = np.array(bits)
+        np.bitwise_or.at(signatures, (rows, bits // 8), (1 << (bits % 8)).astype(np.uint8))
+    return signatures
+
+
+def load_outputs(directory, model_name=None):
+    """
+    Load the output files of a model into columnar arrays.
+
+    Parameters:
+        directory (str): The directory of the JSON outputs.
+        model_name (str, optional): Only load '*_{model_name}.json'. If None, every JSON
+            file is loaded, e.g. for a directory of gold outputs.
+
+    Returns:
+        dict: "patents" (the patent identifiers), "substances" (the distinct normalized
+            substances) with their trigram "signature", and one entry per measurement in
+            the arrays "patent_id", "substance_id", "value", "unit", "min" and "max".
+    """
+
+    pattern = f"*_{model_name}.json" if model_name else "*.json"
+    patents = {}
+    substances = {}
+    # Values and units repeat a lot across patents, so each pair is normalized once
+    normalized = {}
+    columns = {name: [] for name in ("patent_id", "substance_id", "value", "unit", "min", "max")}
+    for path in sorted(glob.glob(os.path.join(directory, pattern))):
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                output_dict = json.load(f)
+        except (OSError, ValueError):
+            continue
+        if not isinstance(output_dict, dict):
+            continue
+        patent = output_dict.get("Patent Identifier") or os.path.basename(path).split("-")[0]
+        patent_id = patents.setdefault(patent, len(patents))
+        for measurement in output_dict.get("Content", []):
+            if not isinstance(measurement, dict):
+                continue
+            key = (str(measurement.get("Measured_value", "")), str(measurement.get("Measured_unit", "")))
+            if key not in normalized:
+                record = normalize_measurement({"Measured_value": key[0], "Measured_unit": key[1]})
+                if record is None:
+                    normalized[key] = (_normalize_text(key[0]), _normalize_text(key[1]), np.nan, np.nan)
+                else:
+                    normalized[key] = (_normalize_text(key[0]), record["unit"], record["min"], record["max"])
+            value, unit, low, high = normalized[key]
+            substance = normalize_substance(measurement.get("Measurement_substance", ""))
+            columns["patent_id"].append(patent_id)
+            columns["substance_id"].append(substances.setdefault(substance, len(substances)))
+            columns["value"].append(value)
+            columns["unit"].append(unit)
+            columns["min"].append(low)
+            columns["max"].append(high)
+
+    return {
+        "patents": np.array(list(patents), dtype=str),
+        "patent_id": np.array(columns["patent_id"], dtype=np.int64),
+        "substance_id": np.array(columns["substance_id"], dtype=np.int64),
+        "value": np.array(columns["value"], dtype=str),
+        "unit": np.array(columns["unit"], dtype=str),
+        "min": np.array(columns["min"], dtype=np.float64),
+        "max": np.array(columns["max"], dtype=np.float64),
+        "substances": np.array(list(substances), dtype=str),
+        "signature": trigram_signatures(list(substances)),
+    }
+
+
+def _close(a, b, tolerance):
+    # Open bounds ("less than 5") are -inf or inf and only match the same open bound
+    with np.errstate(invalid="ignore"):
+        return (a == b) | (np.abs(a - b) <= tolerance * np.maximum(np.maximum(np.abs(a), np.abs(b)), 1e-12))
+
+
+def _align(outputs, patents):
+    # Map the patent ids of a loaded output to the positions of `patents`, -1 if absent
+    position = {patent: i for i, patent in enumerate(patents)}
+    mapping = np.array([position.get(patent, -1) for patent in outputs["patents"]], dtype=np.int64)
+    patent_id = mapping[outputs["patent_id"]]
+    keep = patent_id >= 0
+    order = np.argsort(patent_id[keep], kind="stable")
+    rows = np.flatnonzero(keep)[order]
+    return rows, patent_id[rows]
+
+
+def _match_block(pred, ref, pred_rows, pred_patent, ref_rows, ref_patent, n_patents, substance_threshold, value_tolerance):
+    n_ref = np.bincount(ref_patent, minlength=n_patents)
+    ref_start = np.cumsum(n_ref) - n_ref
+
+    # Every (prediction, reference) pair of the same patent
+    per_pred = n_ref[pred_patent]
+    pair_pred = np.repeat(np.arange(len(pred_rows)), per_pred)
+    offset = np.arange(per_pred.sum()) - np.repeat(np.cumsum(per_pred) - per_pred, per_pred)
+    pair_ref = ref_start[pred_patent[pair_pred]] + offset
+    p = pred_rows[pair_pred]
+    r = ref_rows[pair_ref]
+
+    # Cheap exact checks first, the substance similarity only for the remaining pairs
+    pred_parsed = ~np.isnan(pred["min"][p])
+    ref_parsed = ~np.isnan(ref["min"][r])
+    valid = (pred["unit"][p] == ref["unit"][r]) & np.where(
+        pred_parsed & ref_parsed,
+        _close(pred["min"][p], ref["min"][r], value_tolerance)
+        & _close(pred["max"][p], ref["max"][r], value_tolerance),
+        ~pred_parsed & ~ref_parsed & (pred["value"][p] == ref["value"][r]),
+    )
+    candidates = np.flatnonzero(valid)
+    pred_signature = pred["signature"][pred["substance_id"][p[candidates]]]
+    ref_signature = ref["signature"][ref["substance_id"][r[candidates]]]
+    common = _POPCOUNT[pred_signature & ref_signature].sum(axis=1)
+    union = _POPCOUNT[pred_signature | ref_signature].sum(axis=1)
+    similarity = np.where(union > 0, common / np.maximum(union, 1), 1.0)
+    keep = similarity >= substance_threshold
+    candidates = candidates[keep]
+    similarity = similarity[keep]
+    candidates = candidates[np.argsort(-similarity, kind="stable")]
+
+    # One to one assignment, best pairs first: in every round each prediction proposes its
+    # best remaining pair and each reference accepts the best proposal
+    pred_used = np.zeros(len(pred_rows), dtype=bool)
+    ref_used = np.zeros(len(ref_rows), dtype=bool)
+    matches = np.zeros(n_patents, dtype=np.int64)
+    while candidates.size:
+        _, first = np.unique(pair_pred[candidates], return_index=True)
+        proposals = candidates[np.sort(first)]
+        _, first = np.unique(pair_ref[proposals], return_index=True)
+        accepted = proposals[first]
+        pred_used[pair_pred[accepted]] = True
+        ref_used[pair_ref[accepted]] = True
+        matches += np.bincount(pred_patent[pair_pred[accepted]], minlength=n_patents)
+        candidates = candidates[~pred_used[pair_pred[candidates]] & ~ref_used[pair_ref[candidates]]]
+    return matches
+
+
+def match_measurements(
+    pred,
+    ref,
+    patents,
+    substance_threshold=DEFAULT_SUBSTANCE_THRESHOLD,
+    value_tolerance=DEFAULT_VALUE_TOLERANCE,
+    max_pairs=DEFAULT_MAX_PAIRS,
+):
+    """
+    Match the predicted measurements to the reference ones, patent by patent.
+
+    The candidate pairs are built for blocks of patents with at most `max_pairs` pairs,
+    which bounds the memory whatever the number of outputs.
+
+    Parameters:
+        pred (dict): The predicted outputs from `load_outputs`.
+        ref (dict): The reference outputs from `load_outputs`.
+        patents (list): The patents to compare.
+        substance_threshold (float): The minimum trigram similarity of the substances.
+        value_tolerance (float): The relative tolerance of the SI bounds.
+        max_pairs (int): The maximum number of candidate pairs held at a time.
+
+    Returns:
+        tuple: Arrays of the number of matches, predictions and references per patent.
+    """
+
+    pred_rows, pred_patent = _align(pred, patents)
+    ref_rows, ref_patent = _align(ref, patents)
+    n_patents = len(patents)
+    n_pred = np.bincount(pred_patent, minlength=n_patents)
+    n_ref = np.bincount(ref_patent, minlength=n_patents)
+
+    # Split the patents where the running number of pairs crosses a multiple of max_pairs
+    pairs = np.cumsum(n_pred * n_ref)
+    bounds = np.unique(np.searchsorted(pairs, np.arange(max_pairs, pairs[-1] if n_patents else 0, max_pairs)))
+    bounds = np.concatenate(([0], bounds + 1, [n_patents]))
+
+    matches = np.zeros(n_patents, dtype=np.int64)
+    for first, last in zip(bounds[:-1], bounds[1:]):
+        if first >= last:
+            continue
+        pred_slice = slice(*np.searchsorted(pred_patent, [first, last]))
+        ref_slice = slice(*np.searchsorted(ref_patent, [first, last]))
+        matches[first:last] = _match_block(
+            pred,
+            ref,
+            pred_rows[pred_slice],
+            pred_patent[pred_slice] - first,
+            ref_rows[ref_slice],
+            ref_patent[ref_slice] - first,
+            last - first,
+            substance_threshold,
+            value_tolerance,
+        )
+    return matches, n_pred, n_ref
+
+
+def _scores(matches, n_pred, n_ref):
+    with np.errstate(invalid="ignore", divide="ignore"):
+        precision = np.where(n_pred > 0, matches / n_pred, np.where(n_ref > 0, 0.0, 1.0))
+        recall = np.where(n_ref > 0, matches / n_ref, np.where(n_pred > 0, 0.0, 1.0))
+        f1 = np.where(precision + recall > 0, 2 * precision * recall / (precision + recall), 0.0)
+    return precision, recall, f1
+
+
+def evaluate(
+    output_dir="output",
+    pred_model="gpt-3.5-turbo",
+    ref_model="gpt-4",
+    gold_dir=None,
+    substance_threshold=DEFAULT_SUBSTANCE_THRESHOLD,
+    value_tolerance=DEFAULT_VALUE_TOLERANCE,
+    max_pairs=DEFAULT_MAX_PAIRS,
+    logging=True,
+):
+    """
+    Compute the precision, recall and F1 of a model against another model or a gold set.
+
+    Only patents with an output on both sides are compared.
+
+    Parameters:
+        output_dir (str): The directory of the analysis outputs.
+        pred_model (str): The model whose outputs are evaluated.
+        ref_model (str): The reference model, used when no gold set is given.
+        gold_dir (str, optional): A directory of gold outputs (JSON files with "Patent
+            Identifier" and "Content"), used as the reference instead of `ref_model`.
+        substance_threshold (float): See `match_measurements`.
+        value_tolerance (float): See `match_measurements`.
+        max_pairs (int): See `match_measurements`.
+        logging (bool): The boolean to print logs
+
+    Returns:
+        dict: "per_patent" with the arrays "patents", "matches", "predicted", "reference",
+            "precision", "recall" and "f1", and the aggregate "micro" and "macro" scores.
+    """
+
+    start = time.perf_counter()
+    pred = load_outputs(output_dir, pred_model)
+    ref = load_outputs(gold_dir, None) if gold_dir else load_outputs(output_dir, ref_model)
+    patents = sorted(set(pred["patents"]) & set(ref["patents"]))
+    loaded = time.perf_counter()
+
+    matches, n_pred, n_ref = match_measurements(
+        pred, ref, patents, substance_threshold, value_tolerance, max_pairs
+    )
+    precision, recall, f1 = _scores(matches, n_pred, n_ref)
+    micro = _scores(matches.sum(keepdims=True), n_pred.sum(keepdims=True), n_ref.sum(keepdims=True))
+    result = {
+        "per_patent": {
+            "patents": np.array(patents, dtype=str),
+            "matches": matches,
+            "predicted": n_pred,
+            "reference": n_ref,
+            "precision": precision,
+            "recall": recall,
+            "f1": f1,
+        },
+        "micro": {
+            name: float(values[0]) if len(patents) else 0.0
+            for name, values in zip(("precision", "recall", "f1"), micro)
+        },
+        "macro": {
+            name: float(values.mean()) if len(patents) else 0.0
+            for name, values in zip(("precision", "recall", "f1"), (precision, recall, f1))
+        },
+    }
+
+    if logging:
+        reference = gold_dir or ref_model
+        print(
+            f"Compared {len(patents)} patents of {pred_model} with {reference} "
+            f"({int(n_pred.sum())} vs {int(n_ref.sum())} measurements, {int(matches.sum())} matched); "
+            f"loaded in {loaded - start:.2f} s, matched in {time.perf_counter() - loaded:.2f} s"
+        )
+        for kind in ("micro", "macro"):
+            scores = result[kind]
+            print(
+                f"{kind}: precision {scores['precision']:.3f}, recall {scores['recall']:.3f}, "
+                f"F1 {scores['f1']:.3f}"
+            )
+    return result
+
+
+def write_csv(result, path):
+    """
+    Write the per-patent scores of `evaluate` to a CSV file.
+    """
+
+    per_patent = result["per_patent"]
+    names = ("patents", "matches", "predicted", "reference", "precision", "recall", "f1")
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["patent"] + list(names[1:]))
+        for row in zip(*(per_patent[name] for name in names)):
+            writer.writerow(row)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the measurements of two models or of a model and a gold set.")
+    parser.add_argument("--output-dir", default="output")
+    parser.add_argument("--pred", default="gpt-3.5-turbo", help="model whose outputs are evaluated")
+    parser.add_argument("--ref", default="gpt-4", help="reference model")
+    parser.add_argument("--gold-dir", help="directory of gold outputs used instead of --ref")
+    parser.add_argument("--substance-threshold", type=float, default=DEFAULT_SUBSTANCE_THRESHOLD)
+    parser.add_argument("--value-tolerance", type=float, default=DEFAULT_VALUE_TOLERANCE)
+    parser.add_argument("--max-pairs", type=int, default=DEFAULT_MAX_PAIRS, help="candidate pairs held in memory at a time")
+    parser.add_argument("--csv", help="write the per-patent scores to this file")
+    args = parser.parse_args()
+
+    result = evaluate(
+        args.output_dir,
+        args.pred,
+        args.ref,
+        args.gold_dir,
+        args.substance_threshold,
+        args.value_tolerance,
+        args.max_pairs,
+    )
+    if args.csv:
+        write_csv(result, args.csv)
+        print(f"Per-patent scores written to {args.csv}")
+
+
+if __name__ == "__main__":
+    main()
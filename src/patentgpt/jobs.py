@@ -0,0 +1,138 @@
+import json
+import sqlite3
+import threading
+import time
+import uuid
+
+
+DEFAULT_DB_PATH = "jobs.sqlite"
+
+JOB_STATUSES = ("queued", "running", "done", "failed")
+
+
+class JobQueue:
+    """
+    Persistent queue of analysis jobs in an SQLite database.
+
+    Jobs survive a restart of the service: jobs that were running when the process
+    stopped are queued again by `recover`. Claiming a job is a single transaction, so
+    several workers can share the queue without taking the same job twice.
+
+    Parameters:
+        path (str): The path of the SQLite database.
+    """
+
+    def __init__(self, path=DEFAULT_DB_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self.connection = sqlite3.connect(
+            path, timeout=30, check_same_thread=False, isolation_level=None
+        )
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "id TEXT PRIMARY KEY, kind TEXT NOT NULL, params TEXT NOT NULL, "
+            "status TEXT NOT NULL, result TEXT, error TEXT, "
+            "created_at REAL NOT NULL, started_at REAL, finished_at REAL)"
+        )
+        self.connection.execute(
+            "CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created_at)"
+        )
+
+    def submit(self, kind, params):
+        """
+        Queue a job and return its id.
+
+        Parameters:
+            kind (str): The kind of job, e.g. "patents" or "range".
+            params (dict): The JSON-serializable parameters of the job.
+        """
+
+        job_id = uuid.uuid4().hex
+        with self._lock:
+            self.connection.execute(
+                "INSERT INTO jobs (id, kind, params, status, created_at) VALUES (?, ?, ?, 'queued', ?)",
+                (job_id, kind, json.dumps(params), time.time()),
+            )
+        return job_id
+
+    def claim(self):
+        """
+        Mark the oldest queued job as running and return it, or None if there is none.
+        """
+
+        with self._lock:
+            self.connection.execute("BEGIN IMMEDIATE")
+            try:
+                row = self.connection.execute(
+                    "SELECT id FROM jobs WHERE status = 'queued' ORDER BY created_at LIMIT 1"
+                ).fetchone()
+                if row is not None:
+                    self.connection.execute(
+                        "UPDATE jobs SET status = 'running', started_at = ? WHERE id = ?",
+                        (time.time(), row[0]),
+                    )
+                self.connection.execute("COMMIT")
+            except BaseException:
+                self.connection.execute("ROLLBACK")
+                raise
+        return None if row is None else self.get(row[0])
+
+    def complete(self, job_id, result):
+        self._finish(job_id, "done", result=json.dumps(result))
+
+    def fail(self, job_id, error):
+        self._finish(job_id, "failed", error=error)
+
+    def _finish(self, job_id, status, result=None, error=None):
+        with self._lock:
+            self.connection.execute(
+                "UPDATE jobs SET status = ?, result = ?, error = ?, finished_at = ? WHERE id = ?",
+                (status, result, error, time.time(), job_id),
+            )
+
+    def recover(self):
+        """
+        Queue again the jobs left running by a stopped process. Returns their number.
+        """
+
+        with self._lock:
+            cursor = self.connection.execute(
+                "UPDATE jobs SET status = 'queued', started_at = NULL WHERE status = 'running'"
+            )
+        return cursor.rowcount
+
+    def get(self, job_id):
+        """
+        Return a job as a dictionary, or None if there is no job with this id.
+        """
+
+        with self._lock:
+            row = self.connection.execute(
+                "SELECT id, kind, params, status, result, error, created_at, started_at, finished_at "
+                "FROM jobs WHERE id = ?",
+                (job_id,),
+            ).fetchone()
+        if row is None:
+            return None
+        keys = ("id", "kind", "params", "status", "result", "error", "created_at", "started_at", "finished_at")
+        job = dict(zip(keys, row))
+        job["params"] = json.loads(job["params"])
+        job["result"] = json.loads(job["result"]) if job["result"] is not None else None
+        return job
+
+    def counts(self):
+        """
+        Return the number of jobs by status.
+        """
+
+        with self._lock:
+            rows = self.connection.execute(
+                "SELECT status, count(*) FROM jobs GROUP BY status"
+            ).fetchall()
+        counts = dict.fromkeys(JOB_STATUSES, 0)
+        counts.update(rows)
+        return counts
+
+    def close(self):
+        self.connection.close()
@@ -0,0 +1,403 @@
+"""
+Sharded processing of many weekly files by several worker processes or nodes.
+
+The work is split into units: one unit per week to download and extract the weekly file,
+and one unit per (week, patent) to analyze, which are added when the week is extracted.
+The units are kept in a shared SQLite ledger. A worker leases a unit, renews the lease
+with heartbeats while it works, and completes it. A unit whose lease expires (the worker
+died or hung) is leased again by another worker.
+
+Outputs are written exactly once: the analysis writes to a staging file, and the
+completion checks that the lease is still held, moves the staging file to the final
+output path and marks the unit done in one ledger transaction. A worker that lost its
+lease discards its staging file.
+
+All workers must run in the same working directory (e.g. on shared storage), since the
+weekly files are read from 'data' and the outputs written to 'output'.
+
+Usage:
+    python -m patentgpt.ledger --ledger ledger.sqlite init --start 2023-01-01 --end 2023-03-31
+    python -m patentgpt.ledger --ledger ledger.sqlite work --model gpt-3.5-turbo
+    python -m patentgpt.ledger --ledger ledger.sqlite status
+"""
+
+import argparse
+import glob
+import os
+import shutil
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from datetime import date
+from . import dedup
+from . import preprocess_data
+from .preprocess_data import weekly_dates
+from .metrics import METRICS
+
+
+DEFAULT_LEDGER_PATH = "ledger.sqlite"
+DEFAULT_LEASE_SECONDS = 600
+DEFAULT_MAX_ATTEMPTS = 3
+
+# The patent of the unit that extracts a weekly file
+EXTRACT = ""
+
+UNIT_STATUSES = ("pending", "leased", "done", "failed")
+
+
+class WorkLedger:
+    """
+    Shared table of work units with leases.
+
+    Every change is a short transaction that takes the write lock of the database, so
+    workers in several processes (or on several nodes sharing the file) never lease the
+    same unit at the same time. The rollback journal is used instead of WAL, which does
+    not work on network file systems.
+
+    Parameters:
+        path (str): The path of the SQLite ledger.
+        max_attempts (int): The number of leases of a unit before it is marked failed.
+    """
+
+    def __init__(self, path=DEFAULT_LEDGER_PATH, max_attempts=DEFAULT_MAX_ATTEMPTS):
+        self.path = path
+        self.max_attempts = max_attempts
+        self.connection = sqlite3.connect(path, timeout=60, isolation_level=None)
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS units ("
+            "week TEXT NOT NULL, patent TEXT NOT NULL, status TEXT NOT NULL, "
+            "owner TEXT, token TEXT, lease_expires REAL, attempts INTEGER NOT NULL DEFAULT 0, "
+            "error TEXT, updated_at REAL, PRIMARY KEY (week, patent))"
+        )
+
+    def _transaction(self):
+        self.connection.execute("BEGIN IMMEDIATE")
+
+    def add_weeks(self, weeks):
+        """
+        Add the extraction units of weekly files, given as dates. Existing units are kept.
+        """
+
+        self._transaction()
+        self.connection.executemany(
+            "INSERT OR IGNORE INTO units (week, patent, status, updated_at) VALUES (?, ?, 'pending', ?)",
+            ((week.isoformat(), EXTRACT, time.time()) for week in weeks),
+        )
+        self.connection.execute("COMMIT")
+
+    def lease(self, worker_id, lease_seconds=DEFAULT_LEASE_SECONDS):
+        """
+        Lease the next unit to work on, preferring analysis units over extractions.
+
+        Returns:
+            dict: The unit with its "week", "patent", "token" and "attempts", or None if no
+                unit is available right now.
+        """
+
+        now = time.time()
+        self._transaction()
+        try:
+            # Units whose lease expired too often are given up
+            self.connection.execute(
+                "UPDATE units SET status = 'failed', error = 'lease expired', updated_at = ? "
+                "WHERE status = 'leased' AND lease_expires < ? AND attempts >= ?",
+                (now, now, self.max_attempts),
+            )
+            row = self.connection.execute(
+                "SELECT week, patent, attempts FROM units "
+                "WHERE status = 'pending' OR (status = 'leased' AND lease_expires < ?) "
+                "ORDER BY patent = '', week, patent LIMIT 1",
+                (now,),
+            ).fetchone()
+            unit = None
+            if row is not None:
+                unit = {"week": row[0], "patent": row[1], "token": uuid.uuid4().hex, "attempts": row[2] + 1}
+                self.connection.execute(
+                    "UPDATE units SET status = 'leased', owner = ?, token = ?, lease_expires = ?, "
+                    "attempts = ?, updated_at = ? WHERE week = ? AND patent = ?",
+                    (worker_id, unit["token"], now + lease_seconds, unit["attempts"], now, row[0], row[1]),
+                )
+            self.connection.execute("COMMIT")
+        except BaseException:
+            self.connection.execute("ROLLBACK")
+            raise
+        return unit
+
+    def heartbeat(self, unit, lease_seconds=DEFAULT_LEASE_SECONDS):
+        """
+        Extend the lease of a unit. Returns False if the lease was lost to another worker.
+        """
+
+        cursor = self.connection.execute(
+            "UPDATE units SET lease_expires = ?, updated_at = ? "
+            "WHERE week = ? AND patent = ? AND token = ? AND status = 'leased'",
+            (time.time() + lease_seconds, time.time(), unit["week"], unit["patent"], unit["token"]),
+        )
+        return cursor.rowcount == 1
+
+    def complete(self, unit, staged_path=None, output_path=None, patents=()):
+        """
+        Complete a leased unit, publishing its output exactly once.
+
+        Parameters:
+            unit (dict): The unit returned by `lease`.
+            staged_path (str, optional): The staging file written by the worker. It is
+                moved to `output_path` only if the lease is still held.
+            output_path (str, optional): The final path of the output.
+            patents (iterable): For an extraction unit, the saved patents of the week,
+                which are added as analysis units.
+
+        Returns:
+            bool: True if the unit was completed, False if the lease was lost.
+        """
+
+        self._transaction()
+        try:
+            row = self.connection.execute(
+                "SELECT token, status FROM units WHERE week = ? AND patent = ?",
+                (unit["week"], unit["patent"]),
+            ).fetchone()
+            if row is None or row[0] != unit["token"] or row[1] != "leased":
+                self.connection.execute("ROLLBACK")
+                if staged_path is not None and os.path.exists(staged_path):
+                    os.remove(staged_path)
+                return False
+
+            if staged_path is not None and os.path.exists(staged_path):
+                os.replace(staged_path, output_path)
+            self.connection.executemany(
+                "INSERT OR IGNORE INTO units (week, patent, status, updated_at) VALUES (?, ?, 'pending', ?)",
+                ((unit["week"], patent, time.time()) for patent in patents),
+            )
+            self.connection.execute(
+                "UPDATE units SET status = 'done', lease_expires = NULL, error = NULL, updated_at = ? "
+                "WHERE week = ? AND patent = ?",
+                (time.time(), unit["week"], unit["patent"]),
+            )
+            self.connection.execute("COMMIT")
+        except BaseException:
+            self.connection.execute("ROLLBACK")
+            raise
+        return True
+
+    def release(self, unit, error):
+        """
+        Give a unit back after an error. It is leased again unless it has no attempts left.
+        """
+
+        status = "failed" if unit["attempts"] >= self.max_attempts else "pending"
+        self.connection.execute(
+            "UPDATE units SET status = ?, error = ?, lease_expires = NULL, updated_at = ? "
+            "WHERE week = ? AND patent = ? AND token = ?",
+            (status, error, time.time(), unit["week"], unit["patent"], unit["token"]),
+        )
+
+    def counts(self):
+        """
+        Return the number of units by status.
+        """
+
+        rows = self.connection.execute("SELECT status, count(*) FROM units GROUP BY status").fetchall()
+        counts = dict.fromkeys(UNIT_STATUSES, 0)
+        counts.update(rows)
+        return counts
+
+    def close(self):
+        self.connection.close()
+
+
+class _Heartbeat:
+    """
+    Background thread renewing the lease of a unit while it is processed.
+    """
+
+    def __init__(self, ledger_path, unit, lease_seconds, interval):
+        self.ledger_path = ledger_path
+        self.unit = unit
+        self.lease_seconds = lease_seconds
+        self.interval = interval
+        self.lost = False
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        # SQLite connections cannot be shared between threads
+        ledger = WorkLedger(self.ledger_path)
+        while not self._stop.wait(self.interval):
+            if not ledger.heartbeat(self.unit, self.lease_seconds):
+                self.lost = True
+                break
+        ledger.close()
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+
+def _week_date(unit):
+    return date.fromisoformat(unit["week"])
+
+
+def _week_directory(week):
+    return os.path.join(os.getcwd(), "data", "ipa" + str(week.year)[2:] + f"{week.month:02d}" + f"{week.day:02d}")
+
+
+def extract_week(unit, logging=False):
+    """
+    Download and extract the weekly file of an extraction unit.
+
+    Returns:
+        list: The names of the saved patent text files.
+    """
+
+    week = _week_date(unit)
+    directory = _week_directory(week)
+    # A previous worker died during the extraction
+    if os.path.exists(directory) and not os.path.exists(os.path.join(directory, "saved_patent_names.pkl")):
+        shutil.rmtree(directory)
+    saved_patent_names = preprocess_data.parse_and_save_patents(week.year, week.month, week.day, logging)
+    if saved_patent_names is None:
+        raise RuntimeError(f"The weekly file of {unit['week']} could not be downloaded.")
+    return saved_patent_names
+
+
+def run_worker(
+    ledger_path=DEFAULT_LEDGER_PATH,
+    model_name="gpt-3.5-turbo",
+    worker_id=None,
+    lease_seconds=DEFAULT_LEASE_SECONDS,
+    heartbeat_interval=None,
+    poll_interval=5,
+    max_units=None,
+    logging=False,
+):
+    """
+    Lease, process and complete units until the ledger has no work left.
+
+    Parameters:
+        ledger_path (str): The path of the shared ledger.
+        model_name (str): "gpt-3.5-turbo", "gpt-4" or "cascade".
+        worker_id (str, optional): The name of the worker, by default host and process id.
+        lease_seconds (float): The duration of a lease.
+        heartbeat_interval (float, optional): The time between heartbeats, by default a
+            third of the lease.
+        poll_interval (float): The time to wait when all remaining units are leased.
+        max_units (int, optional): Stop after this number of units.
+        logging (bool): The boolean to print logs
+
+    Returns:
+        int: The number of units completed by this worker.
+    """
+
+    # Imported here, the analysis modules need the OpenAI settings of the process
+    from .main import analyze_patent
+
+    worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}"
+    heartbeat_interval = heartbeat_interval or lease_seconds / 3
+    ledger = WorkLedger(ledger_path)
+    completed = 0
+    # Near-duplicate index of the week of the last analyzed unit
+    minhash_week, minhash_index = None, None
+
+    while max_units is None or completed < max_units:
+        unit = ledger.lease(worker_id, lease_seconds)
+        if unit is None:
+            counts = ledger.counts()
+            if not counts["pending"] and not counts["leased"]:
+                break
+            time.sleep(poll_interval)
+            continue
+
+        staged_path = output_path = None
+        patents = ()
+        try:
+            with _Heartbeat(ledger_path, unit, lease_seconds, heartbeat_interval) as heartbeat:
+                if unit["patent"] == EXTRACT:
+                    patents = extract_week(unit, logging)
+                else:
+                    week = _week_date(unit)
+                    if week != minhash_week:
+                        minhash_week, minhash_index = week, dedup.load_index(_week_directory(week))
+                    output_path = f"output/{unit['patent']}_{model_name}.json"
+                    staged_path = f"output/.{unit['patent']}_{model_name}.{unit['token']}.tmp"
+                    analyze_patent(
+                        unit["patent"], week.year, week.month, week.day, model_name, logging,
+                        minhash_index, output_path=staged_path,
+                    )
+        except Exception as e:
+            METRICS.increment("units_failed")
+            print(f"Unit {unit['week']} {unit['patent'] or 'extract'} failed: {e}")
+            ledger.release(unit, str(e))
+            if staged_path is not None and os.path.exists(staged_path):
+                os.remove(staged_path)
+            continue
+
+        if heartbeat.lost or not ledger.complete(unit, staged_path, output_path, patents):
+            if staged_path is not None and os.path.exists(staged_path):
+                os.remove(staged_path)
+            METRICS.increment("units_lease_lost")
+            print(f"Lost the lease of {unit['week']} {unit['patent'] or 'extract'}, discarding the result.")
+            continue
+        METRICS.increment("units_completed")
+        completed += 1
+        if logging:
+            print(f"{worker_id} completed {unit['week']} {unit['patent'] or 'extract'}")
+
+    # Staging files of workers that died are left behind; once no unit is leased, none of
+    # them can be published any more
+    counts = ledger.counts()
+    if not counts["pending"] and not counts["leased"]:
+        for path in glob.glob(f"output/.*_{model_name}.*.tmp"):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+    ledger.close()
+    return completed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sharded processing of weekly patent files with a shared ledger.")
+    parser.add_argument("--ledger", default=DEFAULT_LEDGER_PATH, help="path of the shared SQLite ledger")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    init = subparsers.add_parser("init", help="add the weekly files between two dates")
+    init.add_argument("--start", required=True, type=date.fromisoformat)
+    init.add_argument("--end", required=True, type=date.fromisoformat)
+    work = subparsers.add_parser("work", help="run a worker until no work is left")
+    work.add_argument("--model", default="gpt-3.5-turbo", choices=("gpt-3.5-turbo", "gpt-4", "cascade"))
+    work.add_argument("--worker-id")
+    work.add_argument("--lease-seconds", type=float, default=DEFAULT_LEASE_SECONDS)
+    work.add_argument("--poll-interval", type=float, default=5)
+    work.add_argument("--max-units", type=int)
+    work.add_argument("--logging", action="store_true")
+    subparsers.add_parser("status", help="print the number of units by status")
+    args = parser.parse_args()
+
+    if args.command == "init":
+        weeks = weekly_dates(args.start, args.end)
+        WorkLedger(args.ledger).add_weeks(weeks)
+        print(f"Added {len(weeks)} weekly files to {args.ledger}")
+    elif args.command == "work":
+        completed = run_worker(
+            args.ledger,
+            args.model,
+            args.worker_id,
+            args.lease_seconds,
+            poll_interval=args.poll_interval,
+            max_units=args.max_units,
+            logging=args.logging,
+        )
+        print(f"Completed {completed} units.")
+    else:
+        for status, count in WorkLedger(args.ledger).counts().items():
+            print(f"{status}: {count}")
+
+
+if __name__ == "__main__":
+    main()
@@ -3,55 +3,68 @@ import nltk
 nltk.download("all", quiet=True)
 from datetime import datetime
 import random
+import os
+import time
 import json
 from . import preprocess_data
 from . import qaagent
+from . import metrics
+from . import output_parser
+from . import dedup
+from . import measurements
+from . import search_index
+from . import cascade
+from . import scheduler
+from .prompts import PROMPT, RETRIEVAL_QUERY
 
 
-PROMPT = """
-Task: Carefully review the given patent text and extract as much physical measurements information such as length/distance, mass/weight, time, temperature, Volume, area, speed, pressure, energy, power, electric current 
-and voltage, frequency, force, acceleration, density, resistivity, magnetic field strength, and luminous intensity as much as possible. 
-We are particularly interested in physical measurements including substance that was measured, Value of the measurement, and Unit of the measurement, and measurement type mentioned in the text. 
-
-For each measurement, please provide the following details:
-- The substance that was measured. (substance)
-- The specific value or range that was measured. (Measured Value)
-- The unit of the measurement, if provided. (Unit)
-- The type of measurement being conducted (e.g., diameter, size, etc.) 
-
-
-Format your response in a structured JSON-like format, as follows:
-
-{"Content": [
-    {
-      "Measurement_substance": "substance",
-      "Measured_value": "value",
-      "Measured_unit": "unit",
-      "measurement_type": "type"
-    },
-    // ... additional measurements, if present
-  ]
-}
+def analyze_patent(patent_name, year, month, day, model_name, logging=True, minhash_index=None, output_path=None):
+    """
+    Analyze one saved patent with the selected model, unless the output of a near
+    duplicate can be reused.
 
-If multiple measurements are present in the text, each should be listed as a separate object within the "Content" array.
+    Parameters:
+        patent_name (str): The name of the saved patent text file.
+        year (int): The year part of the data folder name.
+        month (int): The month part of the data folder name.
+        day (int): The day part of the data folder name.
+        model_name (str): "gpt-3.5-turbo", "gpt-4" or "cascade".
+        logging (bool): The boolean to print logs
+        minhash_index (MinHashIndex, optional): The near-duplicate index of the weekly file.
+        output_path (str, optional): Where to write the output instead of the default
+            path in the 'output' directory.
 
-Example: If the text includes the sentence, "The resulting BaCO3 had a crystallite size of between about 20 and 40 nm", the output should be:
+    Returns:
+        tuple: A tuple containing two elements:
+            - Cost of OpenAI API
+            - The output written for this patent, or None if it was lost.
+    """
 
-{"Content": [
-    {
-      "Measurement_substance": "BaCO3",
-      "Measured_value": "between about 20 and 40",
-      "Measured_unit": "nm",
-      "measurement_type": "crystallite size"
-    }
-  ]
-}
+    output_dict = dedup.reuse_duplicate_output(
+        minhash_index, patent_name, model_name, logging=logging, output_path=output_path
+    )
+    if output_dict is not None:
+        return 0.0, output_dict
 
-Try to provide as complete and accurate information as possible. Print only the formatted JSON response.
-"""
+    with metrics.METRICS.timer("patent"):
+        if model_name == "cascade":
+            cost, output, output_dict, _ = cascade.call_QA_cascade_to_json(
+                PROMPT, year, month, day, [patent_name], 0, logging, query=RETRIEVAL_QUERY,
+                output_path=output_path,
+            )
+        else:
+            cost, _, output_dict, _ = qaagent.call_QA(
+                PROMPT, year, month, day, [patent_name], 0, logging, model_name, query=RETRIEVAL_QUERY,
+            )
+            if output_dict is not None:
+                qaagent.save_output(
+                    output_dict, patent_name, output_path or f"output/{patent_name}_{model_name}.json", logging
+                )
+    metrics.METRICS.increment("patents_analyzed")
+    return cost, output_dict
 
 
-def main():
+def main(metrics_path=None, budget_usd=None, deadline_s=None, state_path=scheduler.DEFAULT_STATE_PATH):
     """
     Main function to:
     - Authenticate with OpenAI
@@ -59,8 +72,21 @@ def main():
     - Extract and print year, month, day
     - Preprocess patent data
     - Analyze selected patents using GPT-3.5 Turbo
-    - Print results including cost and optionally output
+    - Print a run summary including per-stage timings, tokens and cost
+
+    Parameters:
+        metrics_path (str, optional): If given, the run metrics are exported to this file,
+            in Prometheus text format for '.prom' files and as JSON lines otherwise.
+        budget_usd (float, optional): A cost budget. If given, or if a deadline is given,
+            the number of patents is not asked: the cost of every patent of the week (or
+            of every keyword match) is estimated first and the patents are analyzed by
+            priority until a budget is reached, see `scheduler.BudgetScheduler`.
+        deadline_s (float, optional): A wall-clock budget of the estimation and analysis
+            in seconds.
+        state_path (str): The file the remaining queue is saved to when a budget is reached,
+            which `resume` continues from.
     """
+    run_metrics = metrics.reset()
     print("Starting the patent analysis process...")
     # Step 1: Input the date from the user
     user_date_input = input("Enter a date in the format 'YYYY-MM-DD': ")
@@ -83,22 +109,33 @@ def main():
     print("Month:", month)
     print("Day:", day)
 
-    # Step 4: Get random patents number from user
-    num_patents_to_analyze = int(
-        input("Enter the number of patents you want to analyze: ")
-    )
+    # Step 4: Get random patents number from user. With a budget, every patent of the
+    # week (or every keyword match) is a candidate and the budget decides how many run
+    budgeted = budget_usd is not None or deadline_s is not None
+    if budgeted:
+        num_patents_to_analyze = None
+    else:
+        num_patents_to_analyze = int(
+            input("Enter the number of patents you want to analyze: ")
+        )
+
+    keywords = input(
+        "Enter keywords to select patents (leave empty for a random selection): "
+    ).strip()
 
     logging_choice = input("Do you want to log the results? (yes/no): ").strip().lower()
     logging_enabled = logging_choice == "yes"
 
     model_choice = input(
-        "Select a model for analysis: 1. gpt-3.5-turbo 2. gpt-4"
+        "Select a model for analysis: 1. gpt-3.5-turbo 2. gpt-4 3. cascade (gpt-3.5-turbo, escalating to gpt-4)"
     ).strip()
 
     if model_choice == "1":
         model_name = "gpt-3.5-turbo"
     elif model_choice == "2":
         model_name = "gpt-4"
+    elif model_choice == "3":
+        model_name = "cascade"
     else:
         print("Invalid choice, defaulting to gpt-3.5-turbo.")
         model_name = "gpt-3.5-turbo"
@@ -107,25 +144,147 @@ def main():
     # Step 5: Parse and save patents
     saved_patent_names = preprocess_data.parse_and_save_patents(year, month, day, False)
 
-    # Step 6: Select random patents and analyze
-    random_patents = random.sample(saved_patent_names, num_patents_to_analyze)
+    directory = os.path.join(
+        os.getcwd(), "data", "ipa" + str(year)[2:] + f"{month:02d}" + f"{day:02d}"
+    )
 
-    gpt_3_results = {}
-    total_cost_gpt3 = 0
+    # Step 6: Select patents matching the keywords, or random patents, and analyze
+    text_index = search_index.load_search_index(directory) if keywords else None
+    if text_index is not None:
+        matches = text_index.search(keywords, limit=num_patents_to_analyze or len(saved_patent_names))
+        text_index.close()
+        random_patents = [name for name, _ in matches]
+        print(f"{len(random_patents)} patents match '{keywords}'.")
+        num_patents_to_analyze = len(random_patents)
+        if not random_patents:
+            return
+    elif budgeted:
+        if keywords:
+            print("No full-text index found for this date. Considering every patent.")
+        random_patents = list(saved_patent_names)
+    else:
+        if keywords:
+            print("No full-text index found for this date. Selecting random patents.")
+        random_patents = random.sample(saved_patent_names, num_patents_to_analyze)
 
-    # Step 7: Process patents with GPT-3.5 Turbo
-    for i in range(len(random_patents)):
-        cost, output = qaagent.call_QA_to_json(
-            PROMPT, year, month, day, random_patents, i, logging_enabled, model_name
+    # Near-duplicate index built while extracting, to skip continuation filings
+    minhash_index = dedup.load_index(directory)
+
+    # Step 7: Process patents with the selected model
+    if budgeted:
+        # The estimation counts against the wall-clock budget
+        started_at = time.perf_counter()
+        queue = scheduler.build_queue(
+            directory,
+            random_patents,
+            model_name,
+            logging_enabled,
+            deadline=started_at + deadline_s if deadline_s is not None else None,
+        )
+        # Patents not estimated before the deadline are saved with the queue for `resume`
+        estimated = {item["name"] for item in queue}
+        budget_scheduler = scheduler.BudgetScheduler(
+            queue,
+            budget_usd,
+            deadline_s,
+            state_path,
+            context={"year": year, "month": month, "day": day, "model_name": model_name},
+            started_at=started_at,
+            unestimated=[name for name in random_patents if name not in estimated],
         )
+        done = budget_scheduler.run(
+            lambda name: analyze_patent(
+                name, year, month, day, model_name, logging_enabled, minhash_index
+            )[0],
+            logging_enabled,
+        )
+        num_patents_to_analyze = max(len(done), 1)
+    else:
+        for patent_name in random_patents:
+            analyze_patent(
+                patent_name, year, month, day, model_name, logging_enabled, minhash_index
+            )
 
-        total_cost_gpt3 += cost
+    finish_run(run_metrics, num_patents_to_analyze, logging_enabled, metrics_path, model_name)
 
-    average_cost_gpt3 = total_cost_gpt3 / num_patents_to_analyze
+
+def resume(state_path=scheduler.DEFAULT_STATE_PATH, budget_usd=None, deadline_s=None, metrics_path=None, logging=True):
+    """
+    Continue a budgeted run from the queue saved when it stopped.
+
+    Parameters:
+        state_path (str): The queue state saved by `main`.
+        budget_usd (float, optional): A new cost budget, which replaces the saved one. The
+            cost already spent counts against it.
+        deadline_s (float, optional): A new wall-clock budget in seconds, which replaces the
+            saved one. The time already used counts against it.
+        metrics_path (str, optional): See `main`.
+        logging (bool): The boolean to print logs
+    """
+
+    run_metrics = metrics.reset()
+    budget_scheduler = scheduler.BudgetScheduler.load(state_path, budget_usd, deadline_s)
+    context = budget_scheduler.context
+    directory = os.path.join(
+        os.getcwd(),
+        "data",
+        "ipa" + str(context["year"])[2:] + f"{context['month']:02d}" + f"{context['day']:02d}",
+    )
+    minhash_index = dedup.load_index(directory)
+    analyzed_before = len(budget_scheduler.done)
+    budget_scheduler.estimate_remaining(directory, logging)
+
+    budget_scheduler.run(
+        lambda name: analyze_patent(
+            name,
+            context["year"],
+            context["month"],
+            context["day"],
+            context["model_name"],
+            logging,
+            minhash_index,
+        )[0],
+        logging,
+    )
+    finish_run(
+        run_metrics,
+        max(len(budget_scheduler.done) - analyzed_before, 1),
+        logging,
+        metrics_path,
+        context["model_name"],
+    )
+
+
+def finish_run(run_metrics, num_patents_to_analyze, logging_enabled=True, metrics_path=None, model_name=None):
+    """
+    Rebuild the measurement index from the outputs of the run's model and print the run
+    summary.
+    """
+
+    total_cost = run_metrics.total_cost()
+
+    # Post-processing: normalize the measurements of all outputs for range queries
+    if os.path.exists("output"):
+        with run_metrics.timer("measurement_index"):
+            # Other models' outputs of the same patents would count its measurements twice
+            measurements.build_index("output", model_name, logging=logging_enabled)
 
     print("Patent analysis process completed successfully.")
     # Step 8: Print results
-    print("\nResults for GPT-3.5 Turbo:")
-    print("Number of patents analyzed:", num_patents_to_analyze)
-    print("Total cost for analyzing all patents:", total_cost_gpt3)
-    print("Average cost per patent:", average_cost_gpt3)
+    run_metrics.print_summary()
+    if run_metrics.counters.get("input_tokens_before"):
+        print(
+            "Input tokens per patent: "
+            f"{run_metrics.counters['input_tokens_before'] / num_patents_to_analyze:.0f} before, "
+            f"{run_metrics.counters['input_tokens_after'] / num_patents_to_analyze:.0f} after"
+        )
+    cascade.print_cascade_report(run_metrics)
+    calls_avoided = run_metrics.counters.get("llm_calls_avoided", 0)
+    print(f"LLM calls avoided for near-duplicate patents: {calls_avoided:g}")
+    for status, rate in output_parser.parse_rates(run_metrics.counters).items():
+        print(f"Outputs {status}: {rate:.1%}")
+    print(f"Average cost per patent: ${total_cost / num_patents_to_analyze:.4f}")
+
+    if metrics_path:
+        run_metrics.export(metrics_path)
+        print(f"Metrics written to {metrics_path}")
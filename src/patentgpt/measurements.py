@@ -0,0 +1,607 @@
+"""
+Normalize the measurements in the analysis outputs and index them for range queries.
+
+Free-text values such as "between about 20 and 40" or "ca. -60" are parsed into numeric
+min/max bounds, units such as "° C" or "Ncm −1" are converted to SI, and the records are
+stored as sorted columnar numpy arrays grouped by measurement type. A range query only
+touches the arrays of the matching types, so it does not scan the JSON files.
+
+Usage:
+    python -m patentgpt.measurements build --output-dir output
+    python -m patentgpt.measurements query --type "glass transition" --low -80 --high 0 --unit "°C"
+"""
+
+import argparse
+import glob
+import json
+import math
+import os
+import re
+import numpy as np
+
+
+INDEX_NAME = "measurement_index.npz"
+
+BASE_UNITS = ("kg", "m", "s", "K", "A", "mol", "cd")
+
+# symbol: (factor to SI, exponents of the base units)
+_ATOMS = {
+    "m": (1.0, {"m": 1}),
+    "g": (1e-3, {"kg": 1}),
+    "t": (1e3, {"kg": 1}),
+    "s": (1.0, {"s": 1}),
+    "sec": (1.0, {"s": 1}),
+    "min": (60.0, {"s": 1}),
+    "h": (3600.0, {"s": 1}),
+    "hr": (3600.0, {"s": 1}),
+    "hour": (3600.0, {"s": 1}),
+    "hours": (3600.0, {"s": 1}),
+    "day": (86400.0, {"s": 1}),
+    "days": (86400.0, {"s": 1}),
+    "K": (1.0, {"K": 1}),
+    "°C": (1.0, {"K": 1}),
+    "°F": (5 / 9, {"K": 1}),
+    "A": (1.0, {"A": 1}),
+    "mol": (1.0, {"mol": 1}),
+    "cd": (1.0, {"cd": 1}),
+    "N": (1.0, {"kg": 1, "m": 1, "s": -2}),
+    "Pa": (1.0, {"kg": 1, "m": -1, "s": -2}),
+    "bar": (1e5, {"kg": 1, "m": -1, "s": -2}),
+    "atm": (101325.0, {"kg": 1, "m": -1, "s": -2}),
+    "psi": (6894.757, {"kg": 1, "m": -1, "s": -2}),
+    "Torr": (133.322, {"kg": 1, "m": -1, "s": -2}),
+    "mmHg": (133.322, {"kg": 1, "m": -1, "s": -2}),
+    "J": (1.0, {"kg": 1, "m": 2, "s": -2}),
+    "cal": (4.184, {"kg": 1, "m": 2, "s": -2}),
+    "eV": (1.602176634e-19, {"kg": 1, "m": 2, "s": -2}),
+    "W": (1.0, {"kg": 1, "m": 2, "s": -3}),
+    "V": (1.0, {"kg": 1, "m": 2, "s": -3, "A": -1}),
+    "Ω": (1.0, {"kg": 1, "m": 2, "s": -3, "A": -2}),
+    "ohm": (1.0, {"kg": 1, "m": 2, "s": -3, "A": -2}),
+    "S": (1.0, {"kg": -1, "m": -2, "s": 3, "A": 2}),
+    "C": (1.0, {"A": 1, "s": 1}),
+    "F": (1.0, {"kg": -1, "m": -2, "s": 4, "A": 2}),
+    "T": (1.0, {"kg": 1, "s": -2, "A": -1}),
+    "Hz": (1.0, {"s": -1}),
+    "rpm": (1 / 60, {"s": -1}),
+    "L": (1e-3, {"m": 3}),
+    "l": (1e-3, {"m": 3}),
+    "M": (1e3, {"mol": 1, "m": -3}),
+    "Å": (1e-10, {"m": 1}),
+    "in": (0.0254, {"m": 1}),
+    "lm": (1.0, {"cd": 1}),
+    "lx": (1.0, {"cd": 1, "m": -2}),
+    "P": (0.1, {"kg": 1, "m": -1, "s": -1}),
+    "%": (1e-2, {}),
+    "wt%": (1e-2, {}),
+    "vol%": (1e-2, {}),
+    "mol%": (1e-2, {}),
+    "at%": (1e-2, {}),
+    "ppm": (1e-6, {}),
+    "ppb": (1e-9, {}),
+}
+_PREFIXES = {
+    "G": 1e9, "M": 1e6, "k": 1e3, "c": 1e-2, "m": 1e-3, "μ": 1e-6, "u": 1e-6, "n": 1e-9, "p": 1e-12,
+}
+_PREFIXABLE = {
+    "m", "g", "s", "A", "mol", "N", "Pa", "J", "W", "V", "Ω", "S", "C", "F", "T", "Hz", "L", "l", "M", "eV", "cal", "P",
+}
+
+# Every atom and prefixed atom, longest first so that "mol" wins over "m" and "min" over "mi"
+_SYMBOLS = dict((symbol, atom) for symbol, atom in _ATOMS.items())
+for _prefix, _factor in _PREFIXES.items():
+    for _symbol in _PREFIXABLE:
+        if _prefix + _symbol not in _SYMBOLS:
+            factor, dims = _ATOMS[_symbol]
+            _SYMBOLS[_prefix + _symbol] = (factor * _factor, dims)
+_SYMBOL_PATTERN = re.compile(
+    "|".join(re.escape(symbol) for symbol in sorted(_SYMBOLS, key=len, reverse=True))
+)
+_EXPONENT = re.compile(r"\^?\(?(-?\d+)\)?")
+_SUPERSCRIPTS = str.maketrans("⁻¹²³⁴⁵⁶⁷⁸⁹⁰", "-1234567890")
+
+_NUMBER = re.compile(
+    r"(?<![\w.])-?\d+(?:,\d{3})*(?:\.\d+)?(?:\s*[x×]\s*10\^?\s*(-?\d+)|[eE](-?\d+))?"
+)
+_RANGE_DASH = re.compile(r"(?<=\d)\s*(?:-|–|—|~|to|and)\s*(?=-?\d)")
+# A two-part ratio ("1:2") is one value, the quotient; ratios of three or more parts are not
+_RATIO = re.compile(r"(?<![\w.:])(\d+(?:\.\d+)?)\s*:\s*(\d+(?:\.\d+)?)(?![\w.]|\s*:)")
+_MULTI_RATIO = re.compile(r"\d\s*:\s*\d+(?:\.\d+)?\s*:\s*\d")
+_PLUS_MINUS = re.compile(r"(-?[\d.,]+)\s*(?:±|\+/-)\s*([\d.,]+)")
+_UPPER_BOUND = re.compile(r"less than|lower than|below|up to|at most|not more than|no more than|maximum|<|≤|=<", re.IGNORECASE)
+_LOWER_BOUND = re.compile(r"greater than|more than|higher than|above|at least|not less than|no less than|exceeding|minimum|>|≥|=>", re.IGNORECASE)
+
+# A "<number> <unit>" mention in free text, used to spot measurements without parsing them
+# The units of such a mention, as a pattern to use after a number
+MEASUREMENT_UNIT = (
+    r"(?:%|°\s?[CF]|wt%|nm|μm|µm|mm|cm|m|kg|mg|g|mL|ml|L|s|min|h|K|GPa|MPa|kPa|Pa|bar|"
+    r"mV|kV|V|mW|kW|W|mA|A|Hz|kHz|MHz|mol|mmol|M|mM|ppm|rpm|N|J|kJ|eV)(?![A-Za-z])"
+)
+MEASUREMENT_MENTION = re.compile(r"\d(?:[.,]\d+)?\s?" + MEASUREMENT_UNIT)
+
+
+# Spelled-out units and common variants, rewritten to their symbols
+_UNIT_WORDS = [
+    (re.compile(r"°\s+([CF])\b"), r"°\1"),
+    (re.compile(r"\bdeg(?:rees?|\.)?\s*(?:C|Celsius|centigrade)\b", re.IGNORECASE), "°C"),
+    (re.compile(r"\bdeg(?:rees?|\.)?\s*(?:F|Fahrenheit)\b", re.IGNORECASE), "°F"),
+    (re.compile(r"%\s*(?:by\s+weight|by\s+mass|wt\.?|w/w)|\b(?:wt|weight)\.?\s*%", re.IGNORECASE), "wt%"),
+    (re.compile(r"%\s*(?:by\s+volume|vol\.?|v/v)|\bvol\.?\s*%", re.IGNORECASE), "vol%"),
+    (re.compile(r"\b(mol|at)\.?\s*%"), r"\1%"),
+    (re.compile(r"\bkelvins?\b", re.IGNORECASE), "K"),
+    (re.compile(r"\bseconds?\b", re.IGNORECASE), "s"),
+    (re.compile(r"\bminutes?\b|\bmins\b", re.IGNORECASE), "min"),
+    (re.compile(r"\b(?:hours?|hrs)\b", re.IGNORECASE), "h"),
+    (re.compile(r"\bmicrons?\b", re.IGNORECASE), "μm"),
+    (re.compile(r"\b(kilo|centi|milli|micro|nano)?(met(?:er|re)s?|grams?|lit(?:er|re)s?)\b", re.IGNORECASE), None),
+]
+_WORD_PREFIXES = {"kilo": "k", "centi": "c", "milli": "m", "micro": "μ", "nano": "n", None: ""}
+
+
+def _unit_symbol(match):
+    prefix = _WORD_PREFIXES[match.group(1).lower() if match.group(1) else None]
+    base = match.group(2).lower()
+    symbol = "m" if base.startswith("met") else "g" if base.startswith("gram") else "L"
+    return prefix + symbol
+
+
+def _normalize_text(text):
+    text = str(text).translate(_SUPERSCRIPTS)
+    text = text.replace("−", "-").replace("µ", "μ").replace("º", "°").replace("˚", "°")
+    for pattern, replacement in _UNIT_WORDS:
+        text = pattern.sub(replacement or _unit_symbol, text)
+    return text.strip()
+
+
+def parse_unit(unit):
+    """
+    Parse a unit string into its SI conversion.
+
+    Compound units are read as a product of (prefixed) unit symbols with optional integer
+    exponents, and everything after a "/" is a denominator, so "Ncm −1", "N/cm", "g/cm3"
+    and "J·g^-1·K^-1" are all understood.
+
+    Parameters:
+        unit (str): The unit as written in the output (e.g. "° C", "μm", "Ncm −1").
+
+    Returns:
+        tuple: A tuple (factor, offset, si_unit), where a value converts to SI as
+            value * factor + offset and si_unit is the canonical SI unit string ("" for
+            dimensionless). Returns None if the unit cannot be parsed.
+    """
+
+    text = _normalize_text(unit)
+    if not text:
+        return None
+    # Exponents separated by a space, as in "Ncm −1" or "mF/cm 2"
+    text = re.sub(r"(?<=[^\s\d/·*.^])\s*-\s*(?=\d)", "-", text)
+    text = re.sub(r"(?<=[A-Za-zμΩ])\s+(?=\d+(?:$|[\s/·*]))", "", text)
+
+    factor = 1.0
+    dims = {}
+    sign = 1
+    position = 0
+    atoms = 0
+    while position < len(text):
+        ch = text[position]
+        if ch in " ·*.":
+            position += 1
+            continue
+        if ch == "/":
+            sign = -1
+            position += 1
+            continue
+        match = _SYMBOL_PATTERN.match(text, position)
+        if not match:
+            return None
+        atom_factor, atom_dims = _SYMBOLS[match.group()]
+        position = match.end()
+        exponent = 1
+        exponent_match = _EXPONENT.match(text, position)
+        if exponent_match:
+            exponent = int(exponent_match.group(1))
+            position = exponent_match.end()
+        exponent *= sign
+        factor *= atom_factor ** exponent
+        for base, power in atom_dims.items():
+            dims[base] = dims.get(base, 0) + power * exponent
+        atoms += 1
+
+    offset = 0.0
+    if atoms == 1:
+        symbol = _SYMBOL_PATTERN.match(text).group()
+        if symbol == "°C":
+            offset = 273.15
+        elif symbol == "°F":
+            offset = 273.15 - 32 * 5 / 9
+    si_unit = "·".join(
+        base if dims[base] == 1 else f"{base}^{dims[base]}"
+        for base in BASE_UNITS
+        if dims.get(base)
+    )
+    return factor, offset, si_unit
+
+
+def _parse_number(match):
+    number = float(re.split(r"[x×eE]", match.group())[0].replace(",", ""))
+    exponent = match.group(1) or match.group(2)
+    if exponent:
+        number *= 10 ** int(exponent)
+    return number
+
+
+def _ratio_quotient(match):
+    return repr(float(match.group(1)) / float(match.group(2)))
+
+
+def _prepare_value(text):
+    """
+    Return a normalized value text with ratios replaced by their quotient and ranges joined
+    by " to ", or None if it holds a ratio of three or more parts or a zero denominator.
+    """
+
+    if _MULTI_RATIO.search(text):
+        return None
+    if any(not float(match.group(2)) for match in _RATIO.finditer(text)):
+        return None
+    return _RANGE_DASH.sub(" to ", _RATIO.sub(_ratio_quotient, text))
+
+
+def _numbers(text):
+    """
+    Return (number, text up to the next number) for every number of a prepared value text.
+    """
+
+    matches = list(_NUMBER.finditer(text))
+    numbers = []
+    for i, match in enumerate(matches):
+        end = matches[i + 1].start() if i + 1 < len(matches) else len(text)
+        numbers.append((_parse_number(match), text[match.end() : end]))
+    return numbers
+
+
+def _bounds(text, numbers):
+    if len(numbers) >= 2:
+        return min(numbers), max(numbers)
+    number = numbers[0]
+    if _UPPER_BOUND.search(text):
+        return -math.inf, number
+    if _LOWER_BOUND.search(text):
+        return number, math.inf
+    return number, number
+
+
+def _plus_minus(text):
+    match = _PLUS_MINUS.search(text)
+    if not match:
+        return None
+    try:
+        return float(match.group(1).replace(",", "")), float(match.group(2).replace(",", ""))
+    except ValueError:
+        return None
+
+
+def parse_value(value):
+    """
+    Parse a free-text measured value into numeric bounds.
+
+    Parameters:
+        value (str): The measured value (e.g. "between about 20 and 40", "ca. -60",
+            "less than 0.3%", "5 ± 0.5", "1.2×10^3", "1:2").
+
+    Returns:
+        tuple: A tuple (minimum, maximum) of floats, with -inf/inf for open bounds, or
+            None if the value has no number.
+    """
+
+    text = _normalize_text(value)
+    plus_minus = _plus_minus(text)
+    if plus_minus:
+        center, spread = plus_minus
+        return center - spread, center + spread
+
+    text = _prepare_value(text)
+    if text is None:
+        return None
+    numbers = [number for number, _ in _numbers(text)]
+    if not numbers:
+        return None
+    return _bounds(text, numbers)
+
+
+def _unit_of(tail):
+    # The unit written right after a number, e.g. "μm and equal to or less than about"
+    words = tail.strip(" ,;").split()
+    for end in range(len(words), 0, -1):
+        candidate = " ".join(words[:end]).rstrip(" ,;.)")
+        if candidate and parse_unit(candidate):
+            return candidate
+    return None
+
+
+def normalize_measurement(measurement):
+    """
+    Normalize one measurement of an output file.
+
+    A unit written after a number in the value (e.g. "1 μm to 1 mm") takes precedence over
+    the unit field, otherwise the first unit of the unit field is used.
+
+    Parameters:
+        measurement (dict): An item of the "Content" array.
+
+    Returns:
+        dict: The measurement type and substance in lower case, the SI bounds "min" and
+            "max" and the SI unit, or None if the value or unit cannot be parsed.
+    """
+
+    value = str(measurement.get("Measured_value", ""))
+    unit_field = _normalize_text(measurement.get("Measured_unit", ""))
+    unit_field = re.split(r",|;|\bor\b|\band\b", unit_field)[0].strip()
+    default = parse_unit(unit_field) if unit_field else (1.0, 0.0, "")
+    if default is None and not _NUMBER.search(unit_field):
+        # Counts and units outside SI (e.g. "clusters", "Mw") are kept as written
+        default = (1.0, 0.0, unit_field.lower())
+
+    text = _prepare_value(_normalize_text(value))
+    if text is None:
+        return None
+    plus_minus = _plus_minus(_normalize_text(value))
+    if plus_minus:
+        if default is None:
+            return None
+        factor, offset, si_unit = default
+        center, spread = plus_minus
+        low = (center - spread) * factor + offset
+        high = (center + spread) * factor + offset
+    else:
+        converted = []
+        si_unit = None
+        for number, tail in _numbers(text):
+            unit = _unit_of(tail)
+            conversion = parse_unit(unit) if unit else default
+            if conversion is None:
+                return None
+            factor, offset, number_unit = conversion
+            if si_unit is not None and number_unit != si_unit:
+                return None
+            si_unit = number_unit
+            converted.append(number * factor + offset)
+        if not converted:
+            return None
+        low, high = _bounds(text, converted)
+
+    return {
+        "type": str(measurement.get("measurement_type", "")).strip().lower(),
+        "substance": str(measurement.get("Measurement_substance", "")).strip().lower(),
+        "min": low,
+        "max": high,
+        "unit": si_unit,
+        "value": value,
+    }
+
+
+class MeasurementIndex:
+    """
+    Columnar index of normalized measurements sorted by (type, min).
+
+    Parameters:
+        columns (dict): The numpy arrays of the index, as built by `build_index` or loaded
+            by `load_index`.
+    """
+
+    def __init__(self, columns):
+        self.types = columns["types"]
+        self.substances = columns["substances"]
+        self.units = columns["units"]
+        self.patents = columns["patents"]
+        self.type_id = columns["type_id"]
+        self.substance_id = columns["substance_id"]
+        self.unit_id = columns["unit_id"]
+        self.patent_id = columns["patent_id"]
+        self.min = columns["min"]
+        self.max = columns["max"]
+        self.value = columns["value"]
+        self.type_start = columns["type_start"]
+
+    def __len__(self):
+        return len(self.min)
+
+    def query(self, measurement_type=None, substance=None, low=-math.inf, high=math.inf, unit=None):
+        """
+        Return the measurements whose range lies within [low, high].
+
+        Parameters:
+            measurement_type (str, optional): A case-insensitive substring of the type.
+            substance (str, optional): A case-insensitive substring of the substance.
+            low (float): The lower bound, in `unit` (SI if not given).
+            high (float): The upper bound, in `unit` (SI if not given).
+            unit (str, optional): The unit of the bounds. Only measurements with the same
+                SI dimension are returned.
+
+        Returns:
+            list: A list of dictionaries with patent, type, substance, value, min, max and
+                unit (SI), ordered by type and min.
+        """
+
+        unit_ids = None
+        if unit is not None:
+            conversion = parse_unit(unit)
+            if conversion is None:
+                raise ValueError(f"Unknown unit: {unit}")
+            factor, offset, si_unit = conversion
+            low = low * factor + offset if math.isfinite(low) else low
+            high = high * factor + offset if math.isfinite(high) else high
+            unit_ids = np.flatnonzero(self.units == si_unit)
+
+        type_ids = range(len(self.types))
+        if measurement_type is not None:
+            needle = measurement_type.lower()
+            type_ids = [i for i, name in enumerate(self.types) if needle in name]
+
+        rows = []
+        for type_id in type_ids:
+            start, end = self.type_start[type_id], self.type_start[type_id + 1]
+            mins = self.min[start:end]
+            first = start + np.searchsorted(mins, low, side="left")
+            last = start + np.searchsorted(mins, high, side="right")
+            selected = np.arange(first, last)
+            selected = selected[self.max[first:last] <= high]
+            rows.append(selected)
+        if not rows:
+            return []
+        selected = np.concatenate(rows)
+
+        if unit_ids is not None:
+            selected = selected[np.isin(self.unit_id[selected], unit_ids)]
+        if substance is not None:
+            needle = substance.lower()
+            substance_ids = [i for i, name in enumerate(self.substances) if needle in name]
+            selected = selected[np.isin(self.substance_id[selected], substance_ids)]
+
+        return [
+            {
+                "patent": str(self.patents[self.patent_id[i]]),
+                "type": str(self.types[self.type_id[i]]),
+                "substance": str(self.substances[self.substance_id[i]]),
+                "value": str(self.value[i]),
+                "min": float(self.min[i]),
+                "max": float(self.max[i]),
+                "unit": str(self.units[self.unit_id[i]]),
+            }
+            for i in selected
+        ]
+
+    def save(self, path):
+        np.savez_compressed(
+            path,
+            types=self.types,
+            substances=self.substances,
+            units=self.units,
+            patents=self.patents,
+            type_id=self.type_id,
+            substance_id=self.substance_id,
+            unit_id=self.unit_id,
+            patent_id=self.patent_id,
+            min=self.min,
+            max=self.max,
+            value=self.value,
+            type_start=self.type_start,
+        )
+
+
+def _intern(table, key):
+    index = table.get(key)
+    if index is None:
+        index = table[key] = len(table)
+    return index
+
+
+def _as_strings(table):
+    values = sorted(table, key=table.get)
+    return np.array(values if values else [""], dtype=str)
+
+
+def build_index(output_dir="output", model_name=None, logging=True):
+    """
+    Parse every output file once and build the measurement index.
+
+    Parameters:
+        output_dir (str): The directory of the analysis outputs.
+        model_name (str, optional): Only index the outputs of this model (e.g. "gpt-4").
+        logging (bool): The boolean to print logs
+
+    Returns:
+        MeasurementIndex: The index, also saved as 'measurement_index.npz' in output_dir.
+    """
+
+    pattern = f"*_{model_name}.json" if model_name else "*.json"
+    types, substances, units, patents = {}, {}, {}, {}
+    columns = {name: [] for name in ("type_id", "substance_id", "unit_id", "patent_id", "min", "max", "value")}
+    skipped = 0
+    for path in sorted(glob.glob(os.path.join(output_dir, pattern))):
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                output_dict = json.load(f)
+        except (OSError, ValueError):
+            continue
+        if not isinstance(output_dict, dict):
+            continue
+        patent = output_dict.get("Patent Identifier") or os.path.basename(path).split("-")[0]
+        for measurement in output_dict.get("Content", []):
+            record = normalize_measurement(measurement) if isinstance(measurement, dict) else None
+            if record is None:
+                skipped += 1
+                continue
+            columns["type_id"].append(_intern(types, record["type"]))
+            columns["substance_id"].append(_intern(substances, record["substance"]))
+            columns["unit_id"].append(_intern(units, record["unit"]))
+            columns["patent_id"].append(_intern(patents, patent))
+            columns["min"].append(record["min"])
+            columns["max"].append(record["max"])
+            columns["value"].append(record["value"])
+
+    type_id = np.array(columns["type_id"], dtype=np.int32)
+    minimum = np.array(columns["min"], dtype=np.float64)
+    order = np.lexsort((minimum, type_id))
+    arrays = {
+        "type_id": type_id[order],
+        "substance_id": np.array(columns["substance_id"], dtype=np.int32)[order],
+        "unit_id": np.array(columns["unit_id"], dtype=np.int32)[order],
+        "patent_id": np.array(columns["patent_id"], dtype=np.int32)[order],
+        "min": minimum[order],
+        "max": np.array(columns["max"], dtype=np.float64)[order],
+        "value": np.array(columns["value"], dtype=str)[order],
+        "types": _as_strings(types),
+        "substances": _as_strings(substances),
+        "units": _as_strings(units),
+        "patents": _as_strings(patents),
+    }
+    arrays["type_start"] = np.searchsorted(arrays["type_id"], np.arange(len(types) + 1)).astype(np.int64)
+
+    index = MeasurementIndex(arrays)
+    index.save(os.path.join(output_dir, INDEX_NAME))
+    if logging:
+        print(
+            f"Indexed {len(index)} measurements from {len(patents)} patents "
+            f"({skipped} measurements could not be normalized)."
+        )
+    return index
+
+
+def load_index(output_dir="output"):
+    """
+    Load the measurement index saved by `build_index`.
+    """
+
+    with np.load(os.path.join(output_dir, INDEX_NAME)) as data:
+        return MeasurementIndex({name: data[name] for name in data.files})
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Normalize and query measurements in the analysis outputs.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    build = subparsers.add_parser("build")
+    build.add_argument("--output-dir", default="output")
+    build.add_argument("--model-name")
+    query = subparsers.add_parser("query")
+    query.add_argument("--output-dir", default="output")
+    query.add_argument("--type")
+    query.add_argument("--substance")
+    query.add_argument("--low", type=float, default=-math.inf)
+    query.add_argument("--high", type=float, default=math.inf)
+    query.add_argument("--unit")
+    args = parser.parse_args()
+
+    if args.command == "build":
+        build_index(args.output_dir, args.model_name)
+    else:
+        index = load_index(args.output_dir)
+        for row in index.query(args.type, args.substance, args.low, args.high, args.unit):
+            print(
+                f"{row['patent']}\t{row['type']}\t{row['substance']}\t{row['value']}\t"
+                f"[{row['min']:g}, {row['max']:g}] {row['unit']}"
+            )
+
+
+if __name__ == "__main__":
+    main()
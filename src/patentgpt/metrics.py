@@ -0,0 +1,256 @@
+import json
+import os
+import random
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+
+class Metrics:
+    """
+    Collect per-stage timings, counters and token/cost usage for a patent analysis run.
+
+    Stages are free-form names such as "download", "unzip", "split", "parse", "chunk",
+    "embed", "index", "llm", "json_parse" or "write". Every timed stage keeps its exact
+    count and total, and a uniform sample (reservoir) of at most `max_samples` durations
+    for the percentiles, so that a long-running service does not grow without bound.
+
+    Parameters:
+        max_samples (int): The number of durations kept per stage. Default is 10000.
+    """
+
+    def __init__(self, max_samples=10000):
+        self._lock = threading.Lock()
+        self._random = random.Random()
+        self.max_samples = max_samples
+        self.started_at = time.time()
+        self.timings = defaultdict(list)
+        self.stage_counts = defaultdict(int)
+        self.stage_totals = defaultdict(float)
+        self.counters = defaultdict(float)
+        self.gauges = {}
+        self.llm_usage = defaultdict(
+            lambda: {
+                "requests": 0,
+                "prompt_tokens": 0,
+                "completion_tokens": 0,
+                "total_tokens": 0,
+                "cost": 0.0,
+            }
+        )
+
+    @contextmanager
+    def timer(self, stage):
+        """
+        Time the enclosed block and record the duration under the given stage name.
+        """
+
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - start)
+
+    def observe(self, stage, seconds):
+        with self._lock:
+            self.stage_counts[stage] += 1
+            self.stage_totals[stage] += seconds
+            samples = self.timings[stage]
+            if len(samples) < self.max_samples:
+                samples.append(seconds)
+            else:
+                position = self._random.randrange(self.stage_counts[stage])
+                if position < self.max_samples:
+                    samples[position] = seconds
+
+    def increment(self, name, value=1):
+        with self._lock:
+            self.counters[name] += value
+
+    def set_gauge(self, name, value):
+        with self._lock:
+            self.gauges[name] = value
+
+    def max_gauge(self, name, value):
+        with self._lock:
+            self.gauges[name] = max(self.gauges.get(name, value), value)
+
+    def record_llm(self, model_name, callback):
+        """
+        Add the usage collected by a `get_openai_callback` handler to the totals of a model.
+
+        Parameters:
+            model_name (str): The name of the model that served the requests.
+            callback (OpenAICallbackHandler): The handler returned by `get_openai_callback`.
+        """
+
+        with self._lock:
+            usage = self.llm_usage[model_name]
+            usage["requests"] += callback.successful_requests
+            usage["prompt_tokens"] += callback.prompt_tokens
+            usage["completion_tokens"] += callback.completion_tokens
+            usage["total_tokens"] += callback.total_tokens
+            usage["cost"] += callback.total_cost
+
+    def stage_summary(self):
+        """
+        Return count, total, mean and p50/p95/p99 (in seconds) for every timed stage.
+        """
+
+        with self._lock:
+            timings = {stage: sorted(values) for stage, values in self.timings.items()}
+            counts = dict(self.stage_counts)
+            totals = dict(self.stage_totals)
+        summary = {}
+        for stage, values in timings.items():
+            summary[stage] = {
+                "count": counts[stage],
+                "total": totals[stage],
+                "mean": totals[stage] / counts[stage],
+                "p50": percentile(values, 50),
+                "p95": percentile(values, 95),
+                "p99": percentile(values, 99),
+            }
+        return summary
+
+    def snapshot(self):
+        """
+        Return every collected metric as a JSON-serializable dictionary.
+        """
+
+        stages = self.stage_summary()
+        with self._lock:
+            return {
+                "timestamp": time.time(),
+                "elapsed": time.time() - self.started_at,
+                "stages": stages,
+                "counters": dict(self.counters),
+                "gauges": dict(self.gauges),
+                "llm": {model: dict(usage) for model, usage in self.llm_usage.items()},
+            }
+
+    def total_cost(self):
+        with self._lock:
+            return sum(usage["cost"] for usage in self.llm_usage.values())
+
+    def print_summary(self):
+        """
+        Print the run summary: stage timings, counters and token/cost usage by model.
+        """
+
+        snapshot = self.snapshot()
+        print(f"\nRun summary ({snapshot['elapsed']:.1f} s elapsed)")
+        if snapshot["stages"]:
+            print(
+                f"{'stage':<16}{'count':>8}{'total s':>10}{'p50 s':>10}{'p95 s':>10}{'p99 s':>10}"
+            )
+            for stage, s in snapshot["stages"].items():
+                print(
+                    f"{stage:<16}{s['count']:>8}{s['total']:>10.3f}"
+                    f"{s['p50']:>10.3f}{s['p95']:>10.3f}{s['p99']:>10.3f}"
+                )
+        for name, value in snapshot["counters"].items():
+            print(f"{name}: {value:g}")
+        for name, value in snapshot["gauges"].items():
+            print(f"{name}: {value:g}")
+        for model, usage in snapshot["llm"].items():
+            print(
+                f"{model}: {usage['requests']} requests, "
+                f"{usage['prompt_tokens']} prompt tokens, "
+                f"{usage['completion_tokens']} completion tokens, "
+                f"cost ${usage['cost']:.4f}"
+            )
+
+    def write_jsonl(self, path):
+        """
+        Append a snapshot of the metrics as one JSON line to the given file.
+        """
+
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(self.snapshot()) + "\n")
+
+    def prometheus_text(self):
+        """
+        Return the metrics in the Prometheus text exposition format.
+        """
+
+        snapshot = self.snapshot()
+        lines = [
+            "# TYPE patentgpt_stage_seconds summary",
+        ]
+        for stage, s in snapshot["stages"].items():
+            for q in ("p50", "p95", "p99"):
+                quantile = int(q[1:]) / 100
+                lines.append(
+                    f'patentgpt_stage_seconds{{stage="{stage}",quantile="{quantile}"}} {s[q]}'
+                )
+            lines.append(f'patentgpt_stage_seconds_sum{{stage="{stage}"}} {s["total"]}')
+            lines.append(f'patentgpt_stage_seconds_count{{stage="{stage}"}} {s["count"]}')
+        lines.append("# TYPE patentgpt_events_total counter")
+        for name, value in snapshot["counters"].items():
+            lines.append(f'patentgpt_events_total{{name="{name}"}} {value}')
+        lines.append("# TYPE patentgpt_gauge gauge")
+        for name, value in snapshot["gauges"].items():
+            lines.append(f'patentgpt_gauge{{name="{name}"}} {value}')
+        lines.append("# TYPE patentgpt_llm_tokens_total counter")
+        for model, usage in snapshot["llm"].items():
+            for kind in ("prompt", "completion"):
+                tokens = usage[f"{kind}_tokens"]
+                lines.append(
+                    f'patentgpt_llm_tokens_total{{model="{model}",kind="{kind}"}} {tokens}'
+                )
+        lines.append("# TYPE patentgpt_llm_cost_usd_total counter")
+        for model, usage in snapshot["llm"].items():
+            lines.append(f'patentgpt_llm_cost_usd_total{{model="{model}"}} {usage["cost"]}')
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path):
+        """
+        Write the metrics in the Prometheus text exposition format (for the node exporter
+        textfile collector).
+        """
+
+        # Write atomically so a scraper never reads a half written file
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(self.prometheus_text())
+        os.replace(tmp_path, path)
+
+    def export(self, path):
+        """
+        Export the metrics to `path`, as Prometheus text for '.prom' files and as JSON lines
+        otherwise.
+        """
+
+        if path.endswith(".prom"):
+            self.write_prometheus(path)
+        else:
+            self.write_jsonl(path)
+
+
+def percentile(sorted_values, q):
+    """
+    Return the q-th percentile of an already sorted list using linear interpolation.
+    """
+
+    if not sorted_values:
+        return 0.0
+    position = (len(sorted_values) - 1) * q / 100
+    lower = int(position)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    fraction = position - lower
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * fraction
+
+
+# Metrics of the current run, shared by the preprocessing and analysis modules
+METRICS = Metrics()
+
+
+def reset():
+    """
+    Start a new run by clearing the shared metrics collector.
+    """
+
+    METRICS.__init__()
+    return METRICS
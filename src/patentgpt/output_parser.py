@@ -0,0 +1,240 @@
+import json
+import re
+
+
+MEASUREMENT_KEYS = (
+    "Measurement_substance",
+    "Measured_value",
+    "Measured_unit",
+    "measurement_type",
+)
+
+PARSE_STATUSES = ("ok", "recovered", "retried", "lost")
+
+_CONTAINER_START = re.compile(r"[{\[]")
+_CONTENT_START = re.compile(r'\{\s*"Content"')
+_CODE_FENCE = re.compile(r"```(?:json|JSON)?\s*(.*?)(?:```|$)", re.DOTALL)
+
+
+def strip_code_fences(text):
+    """
+    Return the content of the first markdown code block, or the text itself if there is none.
+    """
+
+    match = _CODE_FENCE.search(text)
+    if match:
+        return match.group(1)
+    return text
+
+
+def repair_json(text):
+    """
+    Repair the usual defects of JSON written by an LLM.
+
+    The repair strips code fences, leading prose, `//` and `/* */` comments and trailing
+    commas, escapes raw newlines inside strings, and closes a truncated document after the
+    last complete array element or object member. Prose may contain brackets of its own
+    (e.g. "Sure [JSON below]:"), so a container that does not parse, or holds no object,
+    is skipped and the next one is tried, starting with an object that begins with
+    "Content".
+
+    Parameters:
+        text (str): The raw model output.
+
+    Returns:
+        str: The repaired JSON text, or None if no JSON container could be recovered.
+    """
+
+    text = strip_code_fences(text)
+    content = _CONTENT_START.search(text)
+    starts = [content.start()] if content else []
+    starts += [match.start() for match in _CONTAINER_START.finditer(text)]
+
+    # A container of objects is preferred over one of plain values, such as "[1]" in
+    # "see [1]", which is only returned if nothing else parses
+    fallback = None
+    scanned_to = 0
+    for start in starts:
+        # Positions inside a container that was already scanned are not tried again
+        if start < scanned_to:
+            continue
+        repaired, end = _repair_from(text, start)
+        scanned_to = max(scanned_to, end)
+        if repaired is None:
+            continue
+        try:
+            value = json.loads(repaired)
+        except ValueError:
+            continue
+        if isinstance(value, dict) or any(isinstance(item, dict) for item in value):
+            return repaired
+        if fallback is None:
+            fallback = repaired
+    return fallback
+
+
+def _repair_from(text, start):
+    """
+    Repair the container starting at `start`. Returns the repaired text (or None) and the
+    position where the scan stopped.
+    """
+
+    out = []
+    stack = []
+    in_string = False
+    escape = False
+    last_complete = None
+    i = start
+    n = len(text)
+    while i < n:
+        ch = text[i]
+        if in_string:
+            if escape:
+                escape = False
+            elif ch == "\\":
+                escape = True
+            elif ch == '"':
+                in_string = False
+            elif ch == "\n":
+                ch = "\\n"
+            out.append(ch)
+            i += 1
+            continue
+
+        if ch == '"':
+            in_string = True
+            out.append(ch)
+        elif text.startswith("//", i):
+            end = text.find("\n", i)
+            i = n if end == -1 else end
+            continue
+        elif text.startswith("/*", i):
+            end = text.find("*/", i + 2)
+            i = n if end == -1 else end + 2
+            continue
+        elif ch in "{[":
+            stack.append(ch)
+            out.append(ch)
+        elif ch in "}]":
+            if not stack:
+                break
+            _drop_trailing_comma(out)
+            opener = stack.pop()
+            out.append("}" if opener == "{" else "]")
+            if not stack:
+                return "".join(out), i + 1
+            last_complete = (len(out), list(stack))
+        else:
+            out.append(ch)
+        i += 1
+
+    # The document was truncated: keep everything up to the last complete element
+    if last_complete is None:
+        return None, i
+    length, stack = last_complete
+    out = out[:length]
+    _drop_trailing_comma(out)
+    closers = "".join("}" if opener == "{" else "]" for opener in reversed(stack))
+    return "".join(out) + closers, i
+
+
+def _drop_trailing_comma(out):
+    end = len(out)
+    while end and out[end - 1].isspace():
+        end -= 1
+    if end and out[end - 1] == ",":
+        del out[end - 1 :]
+
+
+def validate_measurements(output_dict):
+    """
+    Check a parsed output against the measurement schema and normalize it in place.
+
+    Items that are not objects, or that have neither a substance nor a value, are dropped.
+    Missing keys are filled with an empty string and numbers are converted to strings.
+
+    Parameters:
+        output_dict (dict): The parsed model output.
+
+    Returns:
+        list: A list of strings describing the schema violations that could not be fixed.
+            An empty list means the output is valid.
+    """
+
+    if not isinstance(output_dict, dict):
+        return ["Output is not a JSON object."]
+    content = output_dict.get("Content")
+    if not isinstance(content, list):
+        return ["Output has no 'Content' array."]
+
+    measurements = []
+    for item in content:
+        if not isinstance(item, dict):
+            continue
+        if not item.get("Measurement_substance") and not item.get("Measured_value"):
+            continue
+        for key in MEASUREMENT_KEYS:
+            value = item.get(key, "")
+            if value is None:
+                value = ""
+            elif isinstance(value, (int, float)):
+                value = str(value)
+            elif isinstance(value, list):
+                value = ", ".join(str(v) for v in value)
+            item[key] = value
+        if all(isinstance(item[key], str) for key in MEASUREMENT_KEYS):
+            measurements.append(item)
+    output_dict["Content"] = measurements
+
+    if content and not measurements:
+        return ["No item of 'Content' matches the measurement schema."]
+    return []
+
+
+def parse_llm_json(output):
+    """
+    Parse a model output into a measurement dictionary, repairing it if needed.
+
+    Parameters:
+        output (str): The raw model output.
+
+    Returns:
+        tuple: A tuple containing two elements:
+            - The parsed and validated dictionary, or None if it could not be recovered.
+            - The status: "ok" if the output was valid as is, "recovered" if it had to be
+              repaired, or "lost" if it could not be recovered.
+    """
+
+    status = "ok"
+    try:
+        output_dict = json.loads(output)
+    except (TypeError, ValueError):
+        status = "recovered"
+        repaired = repair_json(output or "")
+        if repaired is None:
+            return None, "lost"
+        try:
+            output_dict = json.loads(repaired)
+        except ValueError:
+            return None, "lost"
+
+    if isinstance(output_dict, list):
+        output_dict = {"Content": output_dict}
+        status = "recovered"
+
+    if validate_measurements(output_dict):
+        return None, "lost"
+    return output_dict, status
+
+
+def parse_rates(counters):
+    """
+    Return the share of outputs that were parsed as is, recovered locally, recovered by a
+    retry, or lost, from the "json_<status>" counters of a metrics collector.
+    """
+
+    totals = {status: counters.get(f"json_{status}", 0) for status in PARSE_STATUSES}
+    count = sum(totals.values())
+    if not count:
+        return {}
+    return {status: value / count for status, value in totals.items()}
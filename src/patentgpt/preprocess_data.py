@@ -1,8 +1,13 @@
 import os
-import requests
+import shutil
 import zipfile
 import xml.etree.ElementTree as ET
 import pickle
+from datetime import timedelta
+from . import clients
+from .metrics import METRICS
+from . import dedup
+from . import search_index
 
 
 def download_weekly_patents(year, month, day, logging):
@@ -33,6 +38,9 @@ def download_weekly_patents(year, month, day, logging):
     if os.path.exists(directory):
         print(f"File {directory} already exists. Skipping download.")
         return True
+    if os.path.exists(directory + ".xml"):
+        print(f"File {directory}.xml already exists. Skipping download.")
+        return True
 
     if logging:
         print("Building the URL...")
@@ -50,23 +58,35 @@ def download_weekly_patents(year, month, day, logging):
 
     if logging:
         print(f"URL constructed: {file_url}")
-    r = requests.get(file_url, stream=True)
+    r = clients.get_http_session("uspto").get(file_url, stream=True)
 
     if logging:
         print("Requesting the file...")
     if r.status_code == 200:
         if logging:
             print("File retrieved successfully. Starting download...")
-        local_path = os.path.join(os.getcwd(), "data", "patents.zip")
+        # One name per week, so that workers downloading different weeks never collide
+        local_path = directory + ".zip"
 
-        with open(local_path, "wb") as f:
+        with METRICS.timer("download"), open(local_path, "wb") as f:
             for chunk in r.iter_content(chunk_size=1024):
                 if chunk:
                     f.write(chunk)
+                    METRICS.increment("download_bytes", len(chunk))
         if logging:
             print("File downloaded successfully. Starting extraction...")
-        with zipfile.ZipFile(local_path, "r") as zip_ref:
-            zip_ref.extractall(os.path.join(os.getcwd(), "data"))
+        # Each file is extracted under a temporary name and renamed once complete, so
+        # that a process killed while unzipping never leaves a truncated XML file that a
+        # later call would take for a finished download
+        with METRICS.timer("unzip"), zipfile.ZipFile(local_path, "r") as zip_ref:
+            for member in zip_ref.infolist():
+                if member.is_dir():
+                    continue
+                target = os.path.join(data_folder, os.path.basename(member.filename))
+                partial_path = f"{target}.{os.getpid()}.part"
+                with zip_ref.open(member) as source, open(partial_path, "wb") as f:
+                    shutil.copyfileobj(source, f, 1024 * 1024)
+                os.replace(partial_path, target)
 
         if logging:
             print("File extracted successfully.")
@@ -77,6 +97,7 @@ def download_weekly_patents(year, month, day, logging):
 
         return True
     else:
+        r.close()
         print(
             "File could not be downloaded. Please make sure the year, month, and day are correct."
         )
@@ -100,7 +121,9 @@ def extract_patents(year, month, day, logging):
     The function creates a separate XML file for each patent and stores these files in
     a directory. The directory is named based on the year, month and day provided.
     If the directory does not exist, the function creates it. The function also prints
-    the total number of patents found.
+    the total number of patents found. A MinHash index of the descriptions is saved next
+    to the txt files so that the analysis can skip near-duplicate filings, together with a
+    full-text index to select the patents to analyze.
 
     """
 
@@ -131,66 +154,88 @@ def extract_patents(year, month, day, logging):
 
     if logging:
         print("Reading the patent file...")
-    with open(file_path, "r") as f:
+    with METRICS.timer("read"), open(file_path, "r") as f:
         contents = f.read()
 
     if logging:
         print("Splitting the XMl file into individual XMLs...")
-    temp = contents.split('<?xml version="1.0" encoding="UTF-8"?>')
-    allXmls = [
-        '<?xml version="1.0" encoding="UTF-8"?>' + s.replace("\n", "") for s in temp
-    ]
-
-    # saving only the XMLs that contain a patent
-    patents = []
-    for xml_string in allXmls:
-        start_index = xml_string.find("<!DOCTYPE")
-        end_index = xml_string.find(">", start_index)
-
-        if start_index != -1 and end_index != -1:
-            doctype_declaration = xml_string[start_index : end_index + 1]
-            # Extract only the name of the DOCTYPE
-            doctype_name = doctype_declaration.split()[1]
-            if doctype_name == "us-patent-application":
-                patents.append(xml_string)
-
+    with METRICS.timer("split"):
+        temp = contents.split('<?xml version="1.0" encoding="UTF-8"?>')
+        allXmls = [
+            '<?xml version="1.0" encoding="UTF-8"?>' + s.replace("\n", "") for s in temp
+        ]
+
+        # saving only the XMLs that contain a patent
+        patents = []
+        for xml_string in allXmls:
+            start_index = xml_string.find("<!DOCTYPE")
+            end_index = xml_string.find(">", start_index)
+
+            if start_index != -1 and end_index != -1:
+                doctype_declaration = xml_string[start_index : end_index + 1]
+                # Extract only the name of the DOCTYPE
+                doctype_name = doctype_declaration.split()[1]
+                if doctype_name == "us-patent-application":
+                    patents.append(xml_string)
+
+    METRICS.increment("patents_found", len(patents))
     if logging:
         print(f"Total patents found: {len(patents)}")
         print("Writing individual patents to separate txt files...")
     
     saved_patent_names = []
+    minhash_index = dedup.MinHashIndex()
+    text_index = search_index.PatentSearchIndex(
+        os.path.join(directory, search_index.SEARCH_INDEX_NAME)
+    )
     for patent in patents:
         try:
-            root = ET.fromstring(patent)
+            with METRICS.timer("parse"):
+                root = ET.fromstring(patent)
 
-            patent_id = root.find(
-                ".//publication-reference/document-id/doc-number"
-            ).text
-            file_id = root.attrib["file"]
+                patent_id = root.find(
+                    ".//publication-reference/document-id/doc-number"
+                ).text
+                file_id = root.attrib["file"]
 
-            ipcr_classifications = root.findall(".//classification-ipcr")
+                ipcr_classifications = root.findall(".//classification-ipcr")
+                is_section_c = any(
+                    ipcr.find("./section").text == "C" for ipcr in ipcr_classifications
+                )
 
-            if any(ipcr.find("./section").text == "C" for ipcr in ipcr_classifications):
-                description_element = root.find(".//description")
-                description_text = get_full_text(description_element)
-                description_string = " ".join(description_text)
+            if is_section_c:
+                with METRICS.timer("text"):
+                    description_element = root.find(".//description")
+                    description_text = get_full_text(description_element)
+                    description_string = " ".join(description_text)
 
                 output_file_path = os.path.join(directory, f"{file_id}.txt")
-                with open(output_file_path, "w") as f:
+                with METRICS.timer("write"), open(output_file_path, "w") as f:
                     f.write(description_string)
                 saved_patent_names.append(f"{file_id}.txt")
+                METRICS.increment("patents_saved")
+
+                with METRICS.timer("minhash"):
+                    minhash_index.add(f"{file_id}.txt", description_string)
+                with METRICS.timer("fts_index"):
+                    text_index.add(f"{file_id}.txt", description_string)
 
             elif logging:
                 print(
                     f"Patent {patent_id} does not belong to section 'C'. Skipping this patent."
                 )
         except ET.ParseError as e:
+            METRICS.increment("patents_parse_errors")
             print(f"Error while parsing patent: {patent_id}. Skipping this patent.")
             print(f"Error message: {e}")
 
     # Save saved_patent_names to file
     with open(saved_patent_names_path, 'wb') as f:
         pickle.dump(saved_patent_names, f)
+    minhash_index.save(os.path.join(directory, dedup.MINHASH_INDEX_NAME))
+    with METRICS.timer("fts_index"):
+        text_index.optimize()
+    text_index.close()
 
     if logging:
         print("Patent extraction complete.")
@@ -258,3 +303,16 @@ def parse_and_save_patents(year, month, day, logging=False):
     saved_patent_names = extract_patents(year, month, day, logging)
 
     return saved_patent_names
+
+
+def weekly_dates(start_date, end_date):
+    """
+    Return the publication dates of the weekly files (Thursdays) between two dates.
+    """
+
+    current = start_date + timedelta(days=(3 - start_date.weekday()) % 7)
+    dates = []
+    while current <= end_date:
+        dates.append(current)
+        current += timedelta(days=7)
+    return dates
@@ -0,0 +1,49 @@
+PROMPT = """
+Task: Carefully review the given patent text and extract as much physical measurements information such as length/distance, mass/weight, time, temperature, Volume, area, speed, pressure, energy, power, electric current 
+and voltage, frequency, force, acceleration, density, resistivity, magnetic field strength, and luminous intensity as much as possible. 
+We are particularly interested in physical measurements including substance that was measured, Value of the measurement, and Unit of the measurement, and measurement type mentioned in the text. 
+
+For each measurement, please provide the following details:
+- The substance that was measured. (substance)
+- The specific value or range that was measured. (Measured Value)
+- The unit of the measurement, if provided. (Unit)
+- The type of measurement being conducted (e.g., diameter, size, etc.) 
+
+
+Format your response in a structured JSON-like format, as follows:
+
+{"Content": [
+    {
+      "Measurement_substance": "substance",
+      "Measured_value": "value",
+      "Measured_unit": "unit",
+      "measurement_type": "type"
+    },
+    // ... additional measurements, if present
+  ]
+}
+
+If multiple measurements are present in the text, each should be listed as a separate object within the "Content" array.
+
+Example: If the text includes the sentence, "The resulting BaCO3 had a crystallite size of between about 20 and 40 nm", the output should be:
+
+{"Content": [
+    {
+      "Measurement_substance": "BaCO3",
+      "Measured_value": "between about 20 and 40",
+      "Measured_unit": "nm",
+      "measurement_type": "crystallite size"
+    }
+  ]
+}
+
+Try to provide as complete and accurate information as possible. Print only the formatted JSON response.
+"""
+
+# Short query used to embed and retrieve the relevant chunks, while PROMPT is sent once
+# as the static instructions of the chat request
+RETRIEVAL_QUERY = (
+    "Measured values with units of physical properties such as length, thickness, size, "
+    "mass, time, temperature, volume, area, speed, pressure, energy, power, current, "
+    "voltage, frequency, force, density and concentration."
+)
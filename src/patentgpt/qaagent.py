@@ -1,21 +1,28 @@
 import os
 import json
+import shutil
+import tempfile
+import uuid
+from contextlib import contextmanager
 import nltk
 import openai
 from langchain.document_loaders import UnstructuredXMLLoader
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain.embeddings.openai import OpenAIEmbeddings
 from langchain.vectorstores import Chroma
-from langchain.chat_models import ChatOpenAI
 from langchain.chains import RetrievalQA
-from langchain.document_loaders import TextLoader
-from langchain.prompts import PromptTemplate
-from langchain.chains import AnalyzeDocumentChain
 from langchain.chains.question_answering import load_qa_chain
 from langchain.callbacks import get_openai_callback
 from langchain.llms import OpenAI
 from langchain.vectorstores import FAISS
-from langchain.text_splitter import CharacterTextSplitter
+from langchain.embeddings.base import Embeddings
+from langchain.schema import Document
+from . import clients
+from .metrics import METRICS
+from .output_parser import parse_llm_json
+from . import request_builder
+from .search_index import HybridRetriever
+from . import textstore
 
 # Move variables and functions that don't need to be in the main function outside
 nltk.download("punkt", quiet=True)
@@ -26,8 +33,27 @@ from nltk import word_tokenize, sent_tokenize
 openai.api_key = os.getenv("OPENAI_API_KEY")
 if openai.api_key is None:
     raise Exception("OPENAI_KEY not found in environment variables")
+clients.install_openai_session()
 
-embeddings = OpenAIEmbeddings()
+class TimedEmbeddings(Embeddings):
+    """
+    Embeddings wrapper that records the time spent embedding under the "embed" stage.
+    """
+
+    def __init__(self, embeddings):
+        self.embeddings = embeddings
+
+    def embed_documents(self, texts):
+        with METRICS.timer("embed"):
+            METRICS.increment("embedded_chunks", len(texts))
+            return self.embeddings.embed_documents(texts)
+
+    def embed_query(self, text):
+        with METRICS.timer("embed"):
+            return self.embeddings.embed_query(text)
+
+
+embeddings = TimedEmbeddings(OpenAIEmbeddings())
 
 
 import gc
@@ -40,120 +66,332 @@ def split_docs(documents, chunk_size=1000, chunk_overlap=0):
     return text_splitter.split_documents(documents)
 
 
-def call_QA_to_json(
-    prompt, year, month, day, saved_patent_names, index=0, logging=True, model_name="gpt-3.5-turbo"
-):
+# Number of chunks of `call_TA_to_json` held at a time by the map step
+MAP_BATCH_SIZE = 8
+
+
+REPAIR_PROMPT = """
+The text below was meant to be a JSON object listing physical measurements, but it could not be parsed.
+Rewrite it as valid JSON with exactly this structure and no comments or extra text:
+
+{{"Content": [{{"Measurement_substance": "substance", "Measured_value": "value", "Measured_unit": "unit", "measurement_type": "type"}}]}}
+
+Text:
+{output}
+"""
+
+
+def parse_output(output, logging=True, retry_model="gpt-3.5-turbo"):
     """
-    Generate embeddings from txt documents, retrieve data based on the provided prompt, and return the result as a JSON object.
+    Parse the output of a chain into a measurement dictionary without losing paid results.
+
+    The output is first repaired locally (code fences, comments, trailing commas, truncated
+    arrays). Only if that fails is the broken text sent once to a cheap model to be rewritten
+    as valid JSON, which costs far less than running the retrieval chain again.
 
     Parameters:
-        prompt (str): The input prompt for the retrieval process.
-        year (int): The year part of the data folder name.
-        month (int): The month part of the data folder name.
-        day (int): The day part of the data folder name.
-        saved_patent_names (list): A list of strings containing the names of saved patent text files.
-        index (int): The index of the saved patent text file to process. Default is 0.
+        output (str): The raw output of the chain.
         logging (bool): The boolean to print logs
+        retry_model (str): The model used for the repair retry.
 
     Returns:
         tuple: A tuple containing two elements:
-            - Cost of OpenAI API
-            - A JSON string representing the output from the retrieval chain.
+            - The parsed dictionary, or None if the output was lost.
+            - Cost of the OpenAI API for the retry (0 if there was none).
+    """
 
-    This function loads the specified txt file, generates embeddings from its content,
-    and uses a retrieval chain to retrieve data based on the provided prompt.
-    The retrieved data is returned as a JSON object, and the raw documents are returned as a list of strings.
-    The output is also written to a file in the 'output' directory with the name '{index}.json'.
+    with METRICS.timer("json_parse"):
+        output_dict, status = parse_llm_json(output)
+
+    retry_cost = 0
+    if status == "lost" and output:
+        if logging:
+            print("Output is not valid JSON, asking the model to repair it...")
+        llm = clients.get_chat_model(retry_model, temperature=0, cache=False)
+        try:
+            with get_openai_callback() as cb, METRICS.timer("llm_retry"):
+                repaired = llm.predict(REPAIR_PROMPT.format(output=output))
+            METRICS.record_llm(retry_model, cb)
+            retry_cost = cb.total_cost
+            output_dict, status = parse_llm_json(repaired)
+        except Exception as e:
+            print("Error message:", str(e))
+        if status != "lost":
+            status = "retried"
+
+    METRICS.increment(f"json_{status}")
+    if status == "lost":
+        print("An error occurred while processing the output.")
+        print("Error message: the output could not be parsed as measurement JSON.")
+    return output_dict, retry_cost
+
+
+def save_output(output_dict, patent_name, output_path, logging=True):
     """
+    Write a parsed output to the 'output' directory with its Patent Identifier.
 
-    llm = ChatOpenAI(model_name=model_name, temperature=0, cache=False)
-    file_path = os.path.join(
+    Parameters:
+        output_dict (dict): The parsed output.
+        patent_name (str): The name of the saved patent text file.
+        output_path (str): The path of the JSON file to write.
+        logging (bool): The boolean to print logs
+    """
+
+    # Manually assign the Patent Identifier
+    output_dict["Patent Identifier"] = patent_name.split("-")[0]
+
+    # Check if the directory 'output' exists, if not create it
+    if not os.path.exists("output"):
+        os.makedirs("output", exist_ok=True)
+
+    if logging:
+        print("Writing the output to a file...")
+
+    with METRICS.timer("write"), open(output_path, "w", encoding="utf-8") as json_file:
+        json.dump(output_dict, json_file, indent=4, ensure_ascii=False)
+    METRICS.increment("outputs_saved")
+
+
+def _patent_path(year, month, day, patent_name):
+    return os.path.join(
         os.getcwd(),
         "data",
         "ipa" + str(year)[2:] + f"{month:02d}" + f"{day:02d}",
-        saved_patent_names[index],
+        patent_name,
     )
 
-    if logging:
-        print(f"Loading documents from: {file_path}")
-    loader = TextLoader(file_path)
-    documents_raw = loader.load()
 
-    documents = split_docs(documents_raw)
+@contextmanager
+def embed_patent(
+    year, month, day, saved_patent_names, index=0, logging=True, compact=False, hybrid=False,
+    embed_batch_size=32, memory_limit=None
+):
+    """
+    Embed the chunks of a patent into a temporary vector store, which is deleted on exit.
+
+    The store can be passed to several `call_QA` calls on the same patent, e.g. the cheap
+    and the strong model of the cascade, so that the patent is embedded only once.
 
+    Parameters:
+        year (int): The year part of the data folder name.
+        month (int): The month part of the data folder name.
+        day (int): The day part of the data folder name.
+        saved_patent_names (list): A list of strings containing the names of saved patent text files.
+        index (int): The index of the saved patent text file to process. Default is 0.
+        logging (bool): The boolean to print logs
+        compact (bool): If True, the chunks are compacted with `request_builder.compact_text`
+            before they are embedded, as `call_QA` does with a retrieval query.
+        hybrid (bool): If True, the chunks are also kept for BM25 ranking, see `call_QA`.
+        embed_batch_size (int): See `call_QA`.
+        memory_limit (int, optional): See `call_QA`.
+
+    Yields:
+        dict: The store, with the "vectordb", the "documents" kept for BM25 ranking (or None),
+            and the "raw_tokens" and "compact_tokens" of the embedded text.
+    """
 
+    file_path = _patent_path(year, month, day, saved_patent_names[index])
     if logging:
+        print(f"Loading documents from: {file_path}")
         print("Generating embeddings and persisting...")
-    
-    vectordb = Chroma.from_documents(
-        documents=documents, embedding=embeddings,
-    )
 
-    # vectordb.persist()
-    PROMPT_FORMAT = """
-    Task: Use the following pieces of context to answer the question at the end.
+    # The text is streamed from a memory-mapped file in chunks and embedded in batches,
+    # so only one batch of chunks is held at a time. The chunks are kept only for the
+    # BM25 ranking of the hybrid retriever. Every store has its own collection in its own
+    # temporary database: concurrent workers of the service never mix chunks of different
+    # patents, and do not lock each other out of the process-wide in-memory database.
+    persist_directory = tempfile.mkdtemp(prefix="patentgpt-chroma-")
+    vectordb = Chroma(
+        collection_name=f"patent-{uuid.uuid4().hex}",
+        embedding_function=embeddings,
+        persist_directory=persist_directory,
+    )
+    try:
+        store = {"vectordb": vectordb, "documents": [] if hybrid else None, "raw_tokens": 0, "compact_tokens": 0}
+        with textstore.track_memory(memory_limit, embed_batch_size, logging) as memory_guard:
+            chunks = textstore.iter_chunks(file_path, chunk_size=1000, chunk_overlap=0)
+            for batch in textstore.batched(chunks, memory_guard.next_batch_size):
+                held = memory_guard.hold(batch)
+                if compact:
+                    with METRICS.timer("compact"):
+                        for doc in batch:
+                            store["raw_tokens"] += request_builder.count_tokens(doc.page_content, "text-embedding-ada-002")
+                            doc.page_content = request_builder.compact_text(doc.page_content)
+                            store["compact_tokens"] += request_builder.count_tokens(doc.page_content, "text-embedding-ada-002")
+                    batch = [doc for doc in batch if doc.page_content]
+                if batch:
+                    with METRICS.timer("index"):
+                        vectordb.add_documents(batch)
+                # Only the chunks kept for the BM25 ranking stay in memory
+                memory_guard.release(held)
+                if hybrid:
+                    store["documents"].extend(batch)
+                    memory_guard.hold(batch)
+        yield store
+    finally:
+        # Also on errors, so that a failed job does not leak its collection
+        vectordb.delete_collection()
+        shutil.rmtree(persist_directory, ignore_errors=True)
+
+
+def call_QA(
+    prompt, year, month, day, saved_patent_names, index=0, logging=True, model_name="gpt-3.5-turbo", query=None, hybrid=False,
+    embed_batch_size=32, memory_limit=None, store=None
+):
+    """
+    Generate embeddings from txt documents, retrieve data based on the provided prompt, and
+    parse the result, without writing it to the 'output' directory.
 
-    {context}
+    Parameters:
+        prompt (str): The input prompt for the retrieval process.
+        year (int): The year part of the data folder name.
+        month (int): The month part of the data folder name.
+        day (int): The day part of the data folder name.
+        saved_patent_names (list): A list of strings containing the names of saved patent text files.
+        index (int): The index of the saved patent text file to process. Default is 0.
+        logging (bool): The boolean to print logs
+        query (str, optional): A short retrieval query. If given, the prompt is sent once as
+            static system instructions, the query is used for the similarity search, and the
+            patent text is compacted before it is embedded. Input tokens before and after
+            are recorded in the metrics.
+        hybrid (bool): If True, chunks are retrieved by fusing the vector search with a
+            BM25 keyword ranking of the same chunks. Default is False.
+        embed_batch_size (int): The number of chunks read and embedded at a time. Default is 32.
+        memory_limit (int, optional): A bound in bytes on the memory of the patents loaded
+            and embedded at the same time, see `textstore.track_memory`.
+        store (dict, optional): A vector store of the patent from `embed_patent`, built with
+            the same query and hybrid settings. If not given, the patent is embedded into a
+            store of its own for this call.
 
-    Question: {question}
+    Returns:
+        tuple: A tuple containing four elements:
+            - Cost of OpenAI API
+            - A JSON string representing the output from the retrieval chain.
+            - The parsed (and possibly repaired) output, or None if it was lost.
+            - The prompt and completion tokens of the retrieval chain call, without the
+              tokens of a repair retry.
     """
 
-    PROMPT = PromptTemplate(
-        template=PROMPT_FORMAT, input_variables=["context", "question"]
-    )
+    if store is None:
+        with embed_patent(
+            year, month, day, saved_patent_names, index, logging, query is not None, hybrid,
+            embed_batch_size, memory_limit,
+        ) as store:
+            return call_QA(
+                prompt, year, month, day, saved_patent_names, index, logging, model_name, query, hybrid,
+                store=store,
+            )
+
+    llm = clients.get_chat_model(model_name, temperature=0, cache=False)
+
+    # vectordb.persist()
+    if query is None:
+        chain_prompt = request_builder.build_legacy_prompt()
+        question = prompt
+    else:
+        chain_prompt = request_builder.build_chat_prompt(prompt)
+        question = query
 
-    chain_type_kwargs = {"prompt": PROMPT}
+    chain_type_kwargs = {"prompt": chain_prompt}
 
 
 
+    retriever = store["vectordb"].as_retriever()
+    if hybrid:
+        retriever = HybridRetriever(vector_retriever=retriever, documents=store["documents"])
+
     retrieval_chain = RetrievalQA.from_chain_type(
         llm, chain_type="stuff", 
-        retriever=vectordb.as_retriever(), 
+        retriever=retriever, 
         chain_type_kwargs=chain_type_kwargs, 
-        # return_source_documents=True
+        return_source_documents=True
 
     )
 
     if logging:
         print("Running retrieval chain...")
 
-    with get_openai_callback() as cb:
-        output = retrieval_chain.run(prompt)
+    with get_openai_callback() as cb, METRICS.timer("llm"):
+        result = retrieval_chain({"query": question})
+    output = result["result"]
+    METRICS.record_llm(model_name, cb)
+
+    if query is not None:
+        # Before: the whole text and the instructions embedded, and the instructions sent
+        # as the question of the legacy template. After: what this call actually sent.
+        # The text of a shared store is only counted by the first call that uses it.
+        raw_tokens, compact_tokens = store.pop("raw_tokens", 0), store.pop("compact_tokens", 0)
+        context = "\n\n".join(doc.page_content for doc in result["source_documents"])
+        legacy_request = request_builder.LEGACY_PROMPT_FORMAT.format(
+            context=context, question=prompt
+        )
+        tokens_before = (
+            raw_tokens
+            + request_builder.count_tokens(prompt, "text-embedding-ada-002")
+            + request_builder.count_tokens(legacy_request, model_name)
+        )
+        tokens_after = (
+            compact_tokens
+            + request_builder.count_tokens(query, "text-embedding-ada-002")
+            + cb.prompt_tokens
+        )
+        METRICS.increment("input_tokens_before", tokens_before)
+        METRICS.increment("input_tokens_after", tokens_after)
         if logging:
-            print(f"Total Tokens: {cb.total_tokens}")
-            print(f"Prompt Tokens: {cb.prompt_tokens}")
-            print(f"Completion Tokens: {cb.completion_tokens}")
-            print(f"Successful Requests: {cb.successful_requests}")
-            print(f"Total Cost (USD): ${cb.total_cost}")
-        cost = cb.total_cost
-    
+            print(f"Input tokens: {tokens_before} before, {tokens_after} after compaction")
+    if logging:
+        print(f"Total Tokens: {cb.total_tokens}, Total Cost (USD): ${cb.total_cost}")
+    cost = cb.total_cost
 
-    try:
-        # Convert output to dictionary
-        output_dict = json.loads(output)
 
-        # Manually assign the Patent Identifier
-        output_dict["Patent Identifier"] = saved_patent_names[index].split("-")[0]
+    output_dict, retry_cost = parse_output(output, logging)
+    cost += retry_cost
+    return cost, output, output_dict, (cb.prompt_tokens, cb.completion_tokens)
 
 
-        # Check if the directory 'output' exists, if not create it
-        if not os.path.exists("output"):
-            os.makedirs("output")
+def call_QA_to_json(
+    prompt, year, month, day, saved_patent_names, index=0, logging=True, model_name="gpt-3.5-turbo", query=None, hybrid=False,
+    embed_batch_size=32, memory_limit=None, output_path=None
+):
+    """
+    Generate embeddings from txt documents, retrieve data based on the provided prompt, and return the result as a JSON object.
 
-        if logging:
-            print("Writing the output to a file...")
+    Parameters:
+        prompt (str): The input prompt for the retrieval process.
+        year (int): The year part of the data folder name.
+        month (int): The month part of the data folder name.
+        day (int): The day part of the data folder name.
+        saved_patent_names (list): A list of strings containing the names of saved patent text files.
+        index (int): The index of the saved patent text file to process. Default is 0.
+        logging (bool): The boolean to print logs
+        query (str, optional): A short retrieval query, see `call_QA`.
+        hybrid (bool): See `call_QA`.
+        embed_batch_size (int): See `call_QA`.
+        memory_limit (int, optional): See `call_QA`.
+        output_path (str, optional): Where to write the parsed output instead of
+            'output/{name}_{model_name}.json'.
 
-        with open(f"output/{saved_patent_names[index]}_{model_name}.json", "w", encoding="utf-8") as json_file:
-            json.dump(output_dict, json_file, indent=4, ensure_ascii=False)
+    Returns:
+        tuple: A tuple containing two elements:
+            - Cost of OpenAI API
+            - A JSON string representing the output from the retrieval chain.
 
+    This function loads the specified txt file, generates embeddings from its content,
+    and uses a retrieval chain to retrieve data based on the provided prompt.
+    The retrieved data is returned as a JSON object, and the raw documents are returned as a list of strings.
+    The output is also written to a file in the 'output' directory with the name '{index}.json'.
+    """
+
+    cost, output, output_dict, _ = call_QA(
+        prompt, year, month, day, saved_patent_names, index, logging, model_name, query, hybrid,
+        embed_batch_size, memory_limit,
+    )
+    if output_dict is not None:
+        if output_path is None:
+            output_path = f"output/{saved_patent_names[index]}_{model_name}.json"
+        save_output(output_dict, saved_patent_names[index], output_path, logging)
         if logging:
             print("Call to 'call_QA_to_json' completed.")
-
-    except Exception as e:
-        print("An error occurred while processing the output.")
-        print("Error message:", str(e))
-
-    vectordb.delete()
     return cost, output
 
 
@@ -182,11 +420,15 @@ def call_TA_to_json(
             - documents_raw (str): The raw document content loaded from the specified patent file.
             - output (str): A JSON string representing the output from the TA retrieval process.
 
+    The chunks are streamed from a memory-mapped file through the map step of the chain a
+    batch at a time, so only the short answers of the map step are held until the reduce
+    step. The raw content is read once the chain is done.
+
     Note:
         The output is also written to a file in the 'output' directory with the same name as the input file and a '.json' extension.
     """
 
-    llm = ChatOpenAI(model_name='gpt-3.5-turbo', cache=False)
+    llm = clients.get_chat_model("gpt-3.5-turbo", cache=False)
 
     file_path = os.path.join(
         os.getcwd(),
@@ -198,10 +440,6 @@ def call_TA_to_json(
     if logging:
         print(f"Loading documents from: {file_path}")
 
-    with open(file_path, 'r') as f:
-        documents_raw = f.read()
-
-
     PROMPT_FORMAT = """
     Task: Use the following pieces of context to answer the question at the end.
     Question: 
@@ -211,39 +449,34 @@ def call_TA_to_json(
 
     qa_chain = load_qa_chain(llm, chain_type="map_reduce")
 
-    qa_document_chain = AnalyzeDocumentChain(combine_docs_chain=qa_chain)
-
 
     if logging:
-        print("Running Analyze Document chain...")
-
-    output = qa_document_chain.run(input_document=documents_raw, question=prompt)
+        print("Running map reduce chain...")
+
+    # The map step of `qa_chain.run`, one batch of chunks at a time
+    map_chain = qa_chain.llm_chain
+    mapped = []
+    with get_openai_callback() as cb, METRICS.timer("llm"):
+        for batch in textstore.batched(textstore.iter_chunks(file_path, chunk_size=4000), MAP_BATCH_SIZE):
+            results = map_chain.apply(
+                [{qa_chain.document_variable_name: doc.page_content, "question": prompt} for doc in batch]
+            )
+            mapped.extend(
+                Document(page_content=result[map_chain.output_key], metadata=doc.metadata)
+                for doc, result in zip(batch, results)
+            )
+        output, _ = qa_chain.reduce_documents_chain.combine_docs(mapped, question=prompt)
+    METRICS.record_llm("gpt-3.5-turbo", cb)
+
+    with METRICS.timer("load"), open(file_path, "r", encoding="utf-8", errors="ignore") as f:
+        documents_raw = f.read()
 
     
-    try:
-        # Convert output to dictionary
-        output_dict = json.loads(output)
-
-        # Manually assign the Patent Identifier
-        output_dict["Patent Identifier"] = saved_patent_names[index].split("-")[0]
-
-
-        # Check if the directory 'output' exists, if not create it
-        if not os.path.exists("output"):
-            os.makedirs("output")
-
+    output_dict, _ = parse_output(output, logging)
+    if output_dict is not None:
+        save_output(output_dict, saved_patent_names[index], f"output/{saved_patent_names[index]}.json", logging)
         if logging:
-            print("Writing the output to a file...")
-
-        # Write the output to a file in the 'output' directory
-        with open(f"output/{saved_patent_names[index]}.json", "w", encoding="utf-8") as json_file:
-            json.dump(output_dict, json_file, indent=4, ensure_ascii=False)
-
-        if logging:
-            print("Call to 'call_QA_to_json' completed.")
-    except Exception as e:
-        print("An error occurred while processing the output.")
-        print("Error message:", str(e))
+            print("Call to 'call_TA_to_json' completed.")
     return documents_raw, output
 
 
@@ -274,7 +507,7 @@ def call_QA_faiss_to_json(
     The output is also written to a file in the 'output' directory with the name '{count}.json'.
     """
 
-    llm = ChatOpenAI(model_name=model_name, cache=False)
+    llm = clients.get_chat_model(model_name, cache=False)
     chain = load_qa_chain(llm, chain_type="stuff")
 
     file_path = os.path.join(
@@ -286,56 +519,32 @@ def call_QA_faiss_to_json(
 
     if logging:
         print(f"Loading documents from: {file_path}")
-    loader = TextLoader(file_path)
-    documents_raw = loader.load()
-
-    text_splitter = CharacterTextSplitter(chunk_size=500, chunk_overlap=0)
-
-    documents = text_splitter.split_documents(documents_raw)
-
-
+    with METRICS.timer("index"):
+        docsearch = None
+        for batch in textstore.batched(textstore.iter_chunks(file_path, chunk_size=500), 32):
+            if docsearch is None:
+                docsearch = FAISS.from_documents(batch, embeddings)
+            else:
+                docsearch.add_documents(batch)
 
-    docsearch = FAISS.from_documents(documents, embeddings)
-
-
-    docs = docsearch.similarity_search(prompt)
+    with METRICS.timer("retrieve"):
+        docs = docsearch.similarity_search(prompt)
 
 
     if logging:
         print("Running chain...")
 
-    with get_openai_callback() as cb:
+    with get_openai_callback() as cb, METRICS.timer("llm"):
         output = chain.run(input_documents=docs, question=prompt)
-        print(f"Total Tokens: {cb.total_tokens}")
-        print(f"Prompt Tokens: {cb.prompt_tokens}")
-        print(f"Completion Tokens: {cb.completion_tokens}")
-        print(f"Successful Requests: {cb.successful_requests}")
-        print(f"Total Cost (USD): ${cb.total_cost}")       
-
-    try:
-        # Convert output to dictionary
-        output_dict = json.loads(output)
-
-        # Manually assign the Patent Identifier
-        output_dict["Patent Identifier"] = saved_patent_names[index].split("-")[0]
-
-        # Check if the directory 'output' exists, if not create it
-        if not os.path.exists("output"):
-            os.makedirs("output")
-
-        if logging:
-            print("Writing the output to a file...")
-
-        # Write the output to a file in the 'output' directory
-        with open(f"output/{saved_patent_names[index]}_{model_name}.json", "w", encoding="utf-8") as json_file:
-            json.dump(output_dict, json_file, indent=4, ensure_ascii=False)
+    METRICS.record_llm(model_name, cb)
+    if logging:
+        print(f"Total Tokens: {cb.total_tokens}, Total Cost (USD): ${cb.total_cost}")
 
+    output_dict, _ = parse_output(output, logging)
+    if output_dict is not None:
+        save_output(output_dict, saved_patent_names[index], f"output/{saved_patent_names[index]}_{model_name}.json", logging)
         if logging:
-            print("Call to 'call_QA_to_json' completed.")
-
-    except Exception as e:
-        print("An error occurred while processing the output.")
-        print("Error message:", str(e))
+            print("Call to 'call_QA_faiss_to_json' completed.")
 
     docsearch.delete
     return output
@@ -0,0 +1,149 @@
+import re
+import tiktoken
+from langchain.prompts import PromptTemplate
+from langchain.prompts.chat import (
+    ChatPromptTemplate,
+    HumanMessagePromptTemplate,
+    SystemMessagePromptTemplate,
+)
+from .measurements import MEASUREMENT_MENTION, MEASUREMENT_UNIT
+
+
+# Template used before the request builder: the instructions were sent as the question
+LEGACY_PROMPT_FORMAT = """
+    Task: Use the following pieces of context to answer the question at the end.
+
+    {context}
+
+    Question: {question}
+    """
+
+HUMAN_FORMAT = """Context:
+{context}
+
+Question: {question}"""
+
+_BOILERPLATE_PATTERNS = [
+    # Paragraph numbers such as [0012]
+    re.compile(r"\[\d{4,5}\]\s*"),
+    # Figure reference lists such as (see FIG. 1A) and (FIGS. 2-3 and 5)
+    re.compile(r"\(\s*(?:[Ss]ee\s+)?(?:FIGS?|Figs?)\.\s*\d+[A-Z]?(?:\s*(?:-|–|,|and)\s*\d+[A-Z]?)*\s*\)"),
+    # Figure references in the text such as "as shown in FIGS. 2 and 3". The list does not
+    # continue to a number with a unit, as in "FIG. 2, 20 nm films"
+    re.compile(
+        r"\b(?:(?i:as\s+(?:shown|illustrated|depicted)\s+in)\s+)?(?:FIGS?|Figs?)\.\s*\d+[A-Z]?"
+        r"(?:\s*(?:-|–|to|and|,)\s*\d+[A-Z]?(?!\d|[.,]\d|\s?" + MEASUREMENT_UNIT + r"))*\s*"
+    ),
+    # References to claims such as "according to claim 1 or 2"
+    re.compile(r"\b(?:according to|as (?:recited|claimed|defined) in)\s+claims?\s+\d+(?:\s*(?:-|to|or|and)\s*\d+)*,?\s*", re.IGNORECASE),
+]
+
+# Sentences of incorporation by reference and priority claims
+_BOILERPLATE_SENTENCES = [
+    re.compile(r"\bincorporated\s+(?:herein\s+)?by\s+reference\b", re.IGNORECASE),
+    re.compile(r"\bclaims\s+(?:the\s+)?(?:benefit|priority)\b", re.IGNORECASE),
+]
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+# Abbreviations of priority claims, citations and dates that do not end a sentence
+_ABBREVIATION = re.compile(
+    r"(?:\b(?:U\.S|Ser|Nos?|Pat|Appl|Pub|PCT|Prov|FIGS?|Figs?|Jan|Feb|Mar|Apr|Jun|Jul|Aug|Sept?|Oct|Nov|Dec"
+    r"|e\.g|i\.e|al|approx|ca|vs|[A-Z])\.)$"
+)
+_WHITESPACE = re.compile(r"\s+")
+
+
+def split_sentences(text):
+    """
+    Split a text into sentences at '.', '!' or '?' followed by whitespace, except after
+    abbreviations such as "U.S.", "No." or "Jan.".
+
+    Returns:
+        list: The sentences, with their trailing whitespace.
+    """
+
+    sentences = []
+    start = 0
+    for match in _SENTENCE_END.finditer(text):
+        # Only the last word before the break can be an abbreviation
+        if _ABBREVIATION.search(text, max(start, match.start() - 8), match.start()):
+            continue
+        sentences.append(text[start : match.end()])
+        start = match.end()
+    if start < len(text):
+        sentences.append(text[start:])
+    return sentences
+
+
+def _is_boilerplate_sentence(sentence):
+    if not any(pattern.search(sentence) for pattern in _BOILERPLATE_SENTENCES):
+        return False
+    # A sentence that also reports a measurement is kept
+    return MEASUREMENT_MENTION.search(sentence) is None
+
+
+def compact_text(text):
+    """
+    Remove boilerplate that carries no measurements from a patent description: paragraph
+    and claims numbering, figure references, and the sentences of priority claims and
+    incorporation by reference that contain no "<number> <unit>" mention.
+
+    Parameters:
+        text (str): The patent description.
+
+    Returns:
+        str: The compacted text with whitespace collapsed.
+    """
+
+    for pattern in _BOILERPLATE_PATTERNS:
+        text = pattern.sub(" ", text)
+    lowered = text.lower()
+    if "by reference" in lowered or "benefit" in lowered or "priority" in lowered:
+        text = "".join(sentence for sentence in split_sentences(text) if not _is_boilerplate_sentence(sentence))
+    return _WHITESPACE.sub(" ", text).strip()
+
+
+def build_chat_prompt(instructions):
+    """
+    Build the prompt of the "stuff" QA chain with the static instructions first.
+
+    The instructions are sent as the system message and never change between patents, so
+    the provider can cache the shared prefix. The retrieved context and the short query
+    follow in the human message.
+
+    Parameters:
+        instructions (str): The static task instructions (e.g. `prompts.PROMPT`).
+
+    Returns:
+        ChatPromptTemplate: A prompt with "context" and "question" input variables.
+    """
+
+    # Braces in the instructions (the JSON example) must not be read as variables
+    escaped = instructions.replace("{", "{{").replace("}", "}}")
+    return ChatPromptTemplate.from_messages(
+        [
+            SystemMessagePromptTemplate.from_template(escaped),
+            HumanMessagePromptTemplate.from_template(HUMAN_FORMAT),
+        ]
+    )
+
+
+def build_legacy_prompt():
+    """
+    Return the prompt that sends the whole task as the question of a single message.
+    """
+
+    return PromptTemplate(
+        template=LEGACY_PROMPT_FORMAT, input_variables=["context", "question"]
+    )
+
+
+def count_tokens(text, model_name="gpt-3.5-turbo"):
+    """
+    Count the tokens of a text with the tokenizer of the given model.
+    """
+
+    try:
+        encoding = tiktoken.encoding_for_model(model_name)
+    except KeyError:
+        encoding = tiktoken.get_encoding("cl100k_base")
+    return len(encoding.encode(text, disallowed_special=()))
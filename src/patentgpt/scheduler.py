@@ -0,0 +1,343 @@
+import json
+import os
+import time
+from langchain.callbacks.openai_info import get_openai_token_cost_for_model
+from . import request_builder
+from . import textstore
+from .cascade import CHEAP_MODEL, STRONG_MODEL, measurement_density
+from .metrics import METRICS
+from .prompts import PROMPT, RETRIEVAL_QUERY
+from .search_index import lexical_search
+
+
+DEFAULT_STATE_PATH = "scheduler_state.json"
+
+# Price of text-embedding-ada-002 per 1000 tokens, which the cost table of langchain lacks
+EMBEDDING_COST_PER_1K_TOKENS = 0.0001
+
+# Completion tokens of an answer: the JSON frame and one entry per expected measurement
+COMPLETION_BASE_TOKENS = 30
+COMPLETION_TOKENS_PER_MEASUREMENT = 40
+
+# Share of patents the cascade sends to the strong model when no run has been observed
+DEFAULT_ESCALATION_RATE = 0.25
+
+
+def _llm_cost(model_name, prompt_tokens, completion_tokens):
+    return get_openai_token_cost_for_model(model_name, prompt_tokens) + get_openai_token_cost_for_model(
+        model_name, completion_tokens, is_completion=True
+    )
+
+
+def estimate_patent(
+    file_path,
+    model_name="gpt-3.5-turbo",
+    instructions=PROMPT,
+    query=RETRIEVAL_QUERY,
+    k=4,
+    escalation_rate=DEFAULT_ESCALATION_RATE,
+):
+    """
+    Estimate the tokens and cost of analyzing one patent with `call_QA_to_json` before
+    any API call is made.
+
+    The text is streamed and compacted as in the analysis. The k chunks the retriever is
+    likely to select are chosen locally by BM25 against the query (padded with the largest
+    chunks), and the request built from them is counted with tiktoken. The completion is
+    estimated from the measurement density of the selected chunks.
+
+    Parameters:
+        file_path (str): The path of the saved patent text file.
+        model_name (str): The model of the analysis, or "cascade".
+        instructions (str): The static task instructions.
+        query (str): The retrieval query.
+        k (int): The number of chunks sent to the model.
+        escalation_rate (float): For the cascade, the expected share of patents that are
+            analyzed again by the strong model.
+
+    Returns:
+        dict: The estimate with the keys "embedding_tokens", "prompt_tokens",
+            "completion_tokens", "cost" and "measurements" (the expected number of
+            measurements).
+    """
+
+    chunks = list(textstore.iter_chunks(file_path, transform=request_builder.compact_text))
+    embedding_tokens = sum(
+        request_builder.count_tokens(doc.page_content, "text-embedding-ada-002") for doc in chunks
+    )
+
+    selected = lexical_search(chunks, query, k) if chunks else []
+    if len(selected) < k:
+        remaining = sorted(
+            (doc for doc in chunks if doc not in selected),
+            key=lambda doc: len(doc.page_content),
+            reverse=True,
+        )
+        selected += remaining[: k - len(selected)]
+    context = "\n\n".join(doc.page_content for doc in selected)
+
+    request_model = CHEAP_MODEL if model_name == "cascade" else model_name
+    prompt_tokens = request_builder.count_tokens(
+        instructions, request_model
+    ) + request_builder.count_tokens(
+        request_builder.HUMAN_FORMAT.format(context=context, question=query), request_model
+    )
+    measurements = measurement_density(context) * len(context.split()) / 1000
+    completion_tokens = int(COMPLETION_BASE_TOKENS + COMPLETION_TOKENS_PER_MEASUREMENT * measurements)
+
+    cost = embedding_tokens * EMBEDDING_COST_PER_1K_TOKENS / 1000
+    if model_name == "cascade":
+        cost += _llm_cost(CHEAP_MODEL, prompt_tokens, completion_tokens)
+        # An escalation reuses the embeddings of the cheap call
+        cost += escalation_rate * _llm_cost(STRONG_MODEL, prompt_tokens, completion_tokens)
+    else:
+        cost += _llm_cost(model_name, prompt_tokens, completion_tokens)
+
+    return {
+        "embedding_tokens": embedding_tokens,
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "cost": cost,
+        "measurements": measurements,
+    }
+
+
+def build_queue(directory, patent_names, model_name="gpt-3.5-turbo", logging=True, deadline=None, **kwargs):
+    """
+    Estimate every candidate patent and order them by priority.
+
+    The priority is the expected number of measurements per estimated dollar, so that a
+    limited budget is spent on the patents that should yield the most results.
+
+    Parameters:
+        directory (str): The weekly data directory of the saved patent text files.
+        patent_names (list): The names of the candidate patents.
+        model_name (str): The model of the analysis, or "cascade".
+        logging (bool): The boolean to print logs
+        deadline (float, optional): A `time.perf_counter()` value after which no more
+            patents are estimated, so that estimating a large week cannot use up the
+            wall-clock budget of the run. The patents left out are not in the queue; pass
+            them to `BudgetScheduler` as `unestimated` to keep them for a resumed run.
+        **kwargs: Passed to `estimate_patent`.
+
+    Returns:
+        list: The work items as dictionaries, highest priority first.
+    """
+
+    queue = []
+    with METRICS.timer("estimate"):
+        for name in patent_names:
+            if deadline is not None and time.perf_counter() >= deadline:
+                if logging:
+                    print(f"Stopped estimating at the deadline, after {len(queue)} of {len(patent_names)} patents.")
+                break
+            estimate = estimate_patent(os.path.join(directory, name), model_name, **kwargs)
+            estimate["name"] = name
+            estimate["priority"] = (1 + estimate["measurements"]) / max(estimate["cost"], 1e-9)
+            queue.append(estimate)
+    queue.sort(key=lambda item: item["priority"], reverse=True)
+
+    if logging:
+        total = sum(item["cost"] for item in queue)
+        print(f"Estimated cost of {len(queue)} patents: ${total:.4f}")
+    return queue
+
+
+class BudgetScheduler:
+    """
+    Admit queued patents in priority order while the cost and wall-clock budgets allow.
+
+    A patent is admitted only if its estimated cost fits in the remaining cost budget and
+    the expected duration of one patent (the mean of the patents analyzed so far) fits
+    before the deadline. Patents that are too expensive for the remaining budget are
+    skipped in favour of cheaper ones. When nothing more can be admitted, or the run is
+    interrupted, the scheduler stops and saves the remaining queue, so that the run can be
+    resumed later with `load`.
+
+    Parameters:
+        queue (list): The work items from `build_queue`.
+        budget_usd (float, optional): The cost budget of the run.
+        deadline_s (float, optional): The wall-clock budget of the run in seconds.
+        state_path (str): The JSON file the queue state is saved to.
+        context (dict, optional): Information needed to resume, e.g. the date and model.
+        started_at (float, optional): The `time.perf_counter()` value at which the run
+            started, e.g. before `build_queue`, so that the estimation counts against the
+            deadline. Defaults to now.
+        unestimated (list, optional): The names of the patents `build_queue` could not
+            estimate before the deadline. They are saved with the queue and estimated by
+            `estimate_remaining` when the run is resumed.
+    """
+
+    def __init__(
+        self,
+        queue,
+        budget_usd=None,
+        deadline_s=None,
+        state_path=DEFAULT_STATE_PATH,
+        context=None,
+        started_at=None,
+        unestimated=None,
+    ):
+        self.pending = list(queue)
+        self.unestimated = list(unestimated or [])
+        self.done = []
+        self.budget_usd = budget_usd
+        self.deadline_s = deadline_s
+        self.state_path = state_path
+        self.context = context or {}
+        self.spent_usd = 0.0
+        self.estimated_usd = 0.0
+        self.elapsed_before = 0.0
+        self.durations = []
+        self.stop_reason = None
+        self._started = time.perf_counter() if started_at is None else started_at
+
+    def elapsed(self):
+        return self.elapsed_before + time.perf_counter() - self._started
+
+    def expected_duration(self):
+        if not self.durations:
+            return 0.0
+        return sum(self.durations) / len(self.durations)
+
+    def estimate_remaining(self, directory, logging=True, **kwargs):
+        """
+        Estimate the patents left unestimated by an earlier run and add them to the queue,
+        until the deadline.
+
+        Parameters:
+            directory (str): The weekly data directory of the saved patent text files.
+            logging (bool): The boolean to print logs
+            **kwargs: Passed to `build_queue`.
+        """
+
+        if not self.unestimated:
+            return
+        deadline = None
+        if self.deadline_s is not None:
+            deadline = self._started + self.deadline_s - self.elapsed_before
+        queue = build_queue(
+            directory, self.unestimated, self.context.get("model_name", "gpt-3.5-turbo"), logging, deadline, **kwargs
+        )
+        estimated = {item["name"] for item in queue}
+        self.unestimated = [name for name in self.unestimated if name not in estimated]
+        self.pending = sorted(self.pending + queue, key=lambda item: item["priority"], reverse=True)
+
+    def next(self):
+        """
+        Return the next admitted work item, or None if the scheduler must stop.
+        """
+
+        if self.deadline_s is not None and self.elapsed() + self.expected_duration() > self.deadline_s:
+            self.stop_reason = "deadline reached"
+            return None
+        for position, item in enumerate(self.pending):
+            if self.budget_usd is None or self.spent_usd + item["cost"] <= self.budget_usd:
+                return self.pending.pop(position)
+        if self.pending:
+            self.stop_reason = "cost budget reached"
+        else:
+            self.stop_reason = "queue empty" if not self.unestimated else "patents left to estimate"
+        return None
+
+    def complete(self, item, cost, seconds):
+        """
+        Record the actual cost and duration of an analyzed work item.
+        """
+
+        self.spent_usd += cost
+        self.estimated_usd += item["cost"]
+        self.durations.append(seconds)
+        self.done.append(dict(item, actual_cost=cost, seconds=seconds))
+        METRICS.increment("scheduler_admitted")
+        METRICS.increment("scheduler_estimated_cost", item["cost"])
+
+    def run(self, analyze, logging=True):
+        """
+        Analyze admitted work items until the queue is empty or a budget is reached.
+
+        Parameters:
+            analyze (callable): Called with the patent name, returns the actual cost.
+            logging (bool): The boolean to print logs
+
+        Returns:
+            list: The completed work items.
+        """
+
+        try:
+            while True:
+                item = self.next()
+                if item is None:
+                    break
+                start = time.perf_counter()
+                try:
+                    cost = analyze(item["name"])
+                except BaseException:
+                    self.pending.insert(0, item)
+                    raise
+                self.complete(item, cost, time.perf_counter() - start)
+        except KeyboardInterrupt:
+            self.stop_reason = "interrupted"
+            print("Interrupted, saving the queue...")
+        finally:
+            self.save()
+
+        left = len(self.pending) + len(self.unestimated)
+        METRICS.set_gauge("scheduler_pending", left)
+        if logging or left:
+            print(
+                f"Scheduler stopped ({self.stop_reason}): {len(self.done)} patents analyzed for "
+                f"${self.spent_usd:.4f} (estimated ${self.estimated_usd:.4f}) in {self.elapsed():.0f} s, "
+                f"{left} left in {self.state_path}"
+            )
+        return self.done
+
+    def save(self):
+        """
+        Write the queue state atomically to `state_path`.
+        """
+
+        state = {
+            "context": self.context,
+            "budget_usd": self.budget_usd,
+            "deadline_s": self.deadline_s,
+            "spent_usd": self.spent_usd,
+            "estimated_usd": self.estimated_usd,
+            "elapsed_s": self.elapsed(),
+            "durations": self.durations,
+            "stop_reason": self.stop_reason,
+            "pending": self.pending,
+            "unestimated": self.unestimated,
+            "done": self.done,
+        }
+        tmp_path = self.state_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(state, f, indent=4)
+        os.replace(tmp_path, self.state_path)
+
+    @classmethod
+    def load(cls, state_path=DEFAULT_STATE_PATH, budget_usd=None, deadline_s=None):
+        """
+        Restore a scheduler from a saved queue state.
+
+        The cost already spent and the time already used count against the budgets, which
+        are taken from the saved state unless new ones are given. Patents saved as
+        unestimated are added to the queue by `estimate_remaining`.
+        """
+
+        with open(state_path, "r", encoding="utf-8") as f:
+            state = json.load(f)
+        scheduler = cls(
+            state["pending"],
+            budget_usd if budget_usd is not None else state["budget_usd"],
+            deadline_s if deadline_s is not None else state["deadline_s"],
+            state_path,
+            state["context"],
+            unestimated=state.get("unestimated"),
+        )
+        scheduler.done = state["done"]
+        scheduler.spent_usd = state["spent_usd"]
+        scheduler.estimated_usd = state["estimated_usd"]
+        scheduler.elapsed_before = state["elapsed_s"]
+        scheduler.durations = state["durations"]
+        return scheduler
@@ -0,0 +1,206 @@
+import asyncio
+import os
+import re
+import sqlite3
+from typing import List
+from langchain.callbacks.manager import (
+    AsyncCallbackManagerForRetrieverRun,
+    CallbackManagerForRetrieverRun,
+)
+from langchain.schema import BaseRetriever, Document
+
+
+SEARCH_INDEX_NAME = "search_index.sqlite"
+
+_TERM = re.compile(r"\w+")
+
+
+def to_fts_query(text, operator="AND"):
+    """
+    Turn free text into an FTS5 query, quoting every term so that punctuation in the text
+    is never read as query syntax. Text already in double quotes is kept as a phrase.
+
+    Parameters:
+        text (str): The keywords, e.g. 'lithium "solid electrolyte"'.
+        operator (str): "AND" to require every term, "OR" to rank by any term.
+
+    Returns:
+        str: The FTS5 MATCH expression, or an empty string if the text has no terms.
+    """
+
+    parts = []
+    for phrase, word in re.findall(r'"([^"]*)"|(\S+)', text):
+        terms = _TERM.findall(phrase or word)
+        if terms:
+            parts.append('"' + " ".join(terms) + '"')
+    return f" {operator} ".join(parts)
+
+
+class PatentSearchIndex:
+    """
+    Full-text index of the extracted patents in an SQLite FTS5 table.
+
+    Documents are ranked with BM25, and FTS5 stores the postings compressed. The index is
+    filled while the patents of a weekly file are extracted and can be queried with
+    keywords and "quoted phrases" to choose which patents to analyze.
+
+    Parameters:
+        path (str): The path of the SQLite database, or ":memory:".
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS patents "
+            "USING fts5(name UNINDEXED, text, tokenize='porter unicode61')"
+        )
+        # The name column of an FTS5 table cannot be indexed, so the row of every name is
+        # kept in a side table to replace a patent without scanning the whole index
+        has_rows = self.connection.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'patent_rows'"
+        ).fetchone()
+        if not has_rows:
+            self.connection.execute("CREATE TABLE patent_rows (name TEXT PRIMARY KEY, row INTEGER NOT NULL)")
+            self.connection.execute("INSERT OR REPLACE INTO patent_rows SELECT name, rowid FROM patents")
+            self.connection.commit()
+
+    def add(self, name, text):
+        """
+        Add or replace the text of a patent. Call `commit` once a batch is added.
+        """
+
+        row = self.connection.execute("SELECT row FROM patent_rows WHERE name = ?", (name,)).fetchone()
+        if row is not None:
+            self.connection.execute("DELETE FROM patents WHERE rowid = ?", row)
+        cursor = self.connection.execute("INSERT INTO patents (name, text) VALUES (?, ?)", (name, text))
+        self.connection.execute(
+            "INSERT OR REPLACE INTO patent_rows (name, row) VALUES (?, ?)", (name, cursor.lastrowid)
+        )
+
+    def commit(self):
+        self.connection.commit()
+
+    def optimize(self):
+        """
+        Merge the FTS5 b-trees into one, which makes later queries faster.
+        """
+
+        self.connection.execute("INSERT INTO patents(patents) VALUES ('optimize')")
+        self.connection.commit()
+
+    def __len__(self):
+        return self.connection.execute("SELECT count(*) FROM patents").fetchone()[0]
+
+    def search(self, query, limit=10, raw=False):
+        """
+        Return the patents matching a query, best match first.
+
+        Parameters:
+            query (str): Keywords and "quoted phrases", all of which must match.
+            limit (int): The maximum number of results.
+            raw (bool): If True, the query is passed to FTS5 as is (e.g. 'NEAR(a b)').
+
+        Returns:
+            list: A list of (name, score) tuples, where a higher score is a better match.
+        """
+
+        match = query if raw else to_fts_query(query)
+        if not match:
+            return []
+        rows = self.connection.execute(
+            "SELECT name, bm25(patents) AS rank FROM patents WHERE patents MATCH ? "
+            "ORDER BY rank LIMIT ?",
+            (match, limit),
+        ).fetchall()
+        return [(name, -rank) for name, rank in rows]
+
+    def close(self):
+        self.connection.close()
+
+
+def load_search_index(directory):
+    """
+    Open the full-text index saved by `extract_patents` in a weekly data directory.
+
+    Returns:
+        PatentSearchIndex: The index, or None if the directory has none.
+    """
+
+    path = os.path.join(directory, SEARCH_INDEX_NAME)
+    if not os.path.exists(path):
+        return None
+    return PatentSearchIndex(path)
+
+
+def lexical_search(documents, query, k=4):
+    """
+    Rank the chunks of one patent against a query with BM25, using an in-memory FTS5 table.
+
+    Parameters:
+        documents (list): The chunks as langchain Documents.
+        query (str): The query. Any of its terms may match.
+        k (int): The number of chunks to return.
+
+    Returns:
+        list: The best matching Documents.
+    """
+
+    index = PatentSearchIndex(":memory:")
+    index.connection.executemany(
+        "INSERT INTO patents (name, text) VALUES (?, ?)",
+        ((str(i), doc.page_content) for i, doc in enumerate(documents)),
+    )
+    ranked = index.search(to_fts_query(query, operator="OR"), limit=k, raw=True)
+    index.close()
+    return [documents[int(name)] for name, _ in ranked]
+
+
+class HybridRetriever(BaseRetriever):
+    """
+    Retriever that fuses a vector store retriever with BM25 ranking of the same chunks.
+
+    The two rankings are merged with reciprocal rank fusion, so chunks that contain the
+    exact terms of the query (units, substance names) are kept even when their embedding
+    is not among the nearest ones.
+    """
+
+    vector_retriever: BaseRetriever
+    documents: List[Document]
+    k: int = 4
+    rrf_k: int = 60
+
+    class Config:
+        arbitrary_types_allowed = True
+
+    def _fuse(self, vector_docs, lexical_docs):
+        scores = {}
+        by_content = {}
+        for ranking in (vector_docs, lexical_docs):
+            for rank, doc in enumerate(ranking):
+                key = doc.page_content
+                by_content.setdefault(key, doc)
+                scores[key] = scores.get(key, 0.0) + 1.0 / (self.rrf_k + rank + 1)
+        best = sorted(scores, key=scores.get, reverse=True)[: self.k]
+        return [by_content[key] for key in best]
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        vector_docs = self.vector_retriever.get_relevant_documents(query, callbacks=run_manager.get_child())
+        lexical_docs = lexical_search(self.documents, query, self.k)
+        return self._fuse(vector_docs, lexical_docs)
+
+    async def _aget_relevant_documents(
+        self, query: str, *, run_manager: AsyncCallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        # The BM25 ranking is synchronous SQLite work, run in a thread while the vector
+        # retriever awaits its embedding request
+        lexical = asyncio.get_running_loop().run_in_executor(
+            None, lexical_search, self.documents, query, self.k
+        )
+        vector_docs, lexical_docs = await asyncio.gather(
+            self.vector_retriever.aget_relevant_documents(query, callbacks=run_manager.get_child()),
+            lexical,
+        )
+        return self._fuse(vector_docs, lexical_docs)
@@ -0,0 +1,345 @@
+"""
+Long-running analysis service with a persistent job queue and a pool of warm workers.
+
+Jobs are submitted over HTTP, stored in an SQLite queue (`patentgpt.jobs`) and analyzed by
+worker threads that live as long as the service. Module imports, the chat model and HTTP
+clients, the saved patent lists and the near-duplicate indexes of the weekly files are
+loaded once and shared by every job, instead of on every run of `main`.
+
+Usage:
+    python -m patentgpt.service --port 8000 --workers 4
+
+    POST /jobs/patents  {"year": 2023, "month": 1, "day": 5, "num_patents": 3}
+    POST /jobs/range    {"start_date": "2023-01-01", "end_date": "2023-01-31", "num_patents": 2}
+    GET  /jobs/{job_id}          status of a job
+    GET  /jobs/{job_id}/result   measurements by patent once the job is done
+    GET  /health                 number of jobs by status
+    GET  /metrics                metrics in the Prometheus text format
+"""
+
+import argparse
+import json
+import os
+import random
+import threading
+import time
+import traceback
+from collections import OrderedDict
+from datetime import date
+from typing import List, Optional
+from fastapi import FastAPI, HTTPException
+from fastapi.responses import PlainTextResponse
+from pydantic import BaseModel
+from . import dedup
+from . import preprocess_data
+from . import search_index
+from .jobs import DEFAULT_DB_PATH, JobQueue
+from .main import analyze_patent
+from .metrics import METRICS
+from .preprocess_data import weekly_dates
+
+
+MODEL_NAMES = ("gpt-3.5-turbo", "gpt-4", "cascade")
+
+# Number of weekly files whose data is kept in memory
+DEFAULT_WARM_WEEKS = 8
+
+
+class PatentJobRequest(BaseModel):
+    year: int
+    month: int
+    day: int
+    patent_names: Optional[List[str]] = None
+    num_patents: int = 1
+    keywords: Optional[str] = None
+    model_name: str = "gpt-3.5-turbo"
+
+
+class RangeJobRequest(BaseModel):
+    start_date: date
+    end_date: date
+    num_patents: int = 1
+    keywords: Optional[str] = None
+    model_name: str = "gpt-3.5-turbo"
+
+
+class WarmState:
+    """
+    Data of the weekly files kept in memory across jobs.
+
+    The first job of a week downloads and extracts it (other jobs of the same week wait for
+    it), then the saved patent names and the near-duplicate index are reused by later jobs.
+    Only the `max_weeks` most recently used weeks are kept; an evicted week is loaded again
+    from its extracted directory.
+
+    Parameters:
+        max_weeks (int): The number of weeks kept in memory.
+    """
+
+    def __init__(self, max_weeks=DEFAULT_WARM_WEEKS):
+        self.max_weeks = max_weeks
+        self._lock = threading.Lock()
+        self._week_locks = {}
+        self._weeks = OrderedDict()
+
+    def week(self, year, month, day, logging=False):
+        """
+        Return the directory, saved patent names and near-duplicate index of a weekly file.
+        """
+
+        key = (year, month, day)
+        with self._lock:
+            week_lock = self._week_locks.setdefault(key, threading.Lock())
+        with week_lock:
+            with self._lock:
+                week = self._weeks.get(key)
+                if week is not None:
+                    self._weeks.move_to_end(key)
+                    return week
+            saved_patent_names = preprocess_data.parse_and_save_patents(year, month, day, logging)
+            if saved_patent_names is None:
+                raise RuntimeError(f"The weekly file of {year}-{month:02d}-{day:02d} could not be downloaded.")
+            directory = os.path.join(
+                os.getcwd(), "data", "ipa" + str(year)[2:] + f"{month:02d}" + f"{day:02d}"
+            )
+            week = {
+                "directory": directory,
+                "patent_names": saved_patent_names,
+                "minhash_index": dedup.load_index(directory),
+            }
+            with self._lock:
+                self._weeks[key] = week
+                while len(self._weeks) > self.max_weeks:
+                    self._weeks.popitem(last=False)
+            return week
+
+
+def select_patents(week, num_patents, keywords=None):
+    """
+    Select the patents of a week like `main` does: the best full-text matches of the
+    keywords, or a random sample.
+    """
+
+    if keywords:
+        text_index = search_index.load_search_index(week["directory"])
+        if text_index is not None:
+            matches = text_index.search(keywords, limit=num_patents)
+            text_index.close()
+            return [name for name, _ in matches]
+    return random.sample(week["patent_names"], min(num_patents, len(week["patent_names"])))
+
+
+def analyze_week(warm_state, year, month, day, num_patents, keywords, model_name, patent_names=None, logging=False):
+    """
+    Analyze patents of one weekly file and return their outputs.
+
+    Returns:
+        dict: The cost and the parsed output of every patent (None if it was lost).
+    """
+
+    week = warm_state.week(year, month, day, logging)
+    if patent_names is None:
+        patent_names = select_patents(week, num_patents, keywords)
+
+    cost = 0.0
+    outputs = {}
+    for patent_name in patent_names:
+        patent_cost, outputs[patent_name] = analyze_patent(
+            patent_name, year, month, day, model_name, logging, week["minhash_index"]
+        )
+        cost += patent_cost
+    return {"cost": cost, "patents": outputs}
+
+
+def run_job(job, warm_state, logging=False):
+    """
+    Run a job claimed from the queue and return its result.
+    """
+
+    params = job["params"]
+    if job["kind"] == "patents":
+        return analyze_week(
+            warm_state,
+            params["year"],
+            params["month"],
+            params["day"],
+            params["num_patents"],
+            params["keywords"],
+            params["model_name"],
+            params["patent_names"],
+            logging,
+        )
+
+    result = {"cost": 0.0, "weeks": {}}
+    for week_date in weekly_dates(date.fromisoformat(params["start_date"]), date.fromisoformat(params["end_date"])):
+        week_result = analyze_week(
+            warm_state,
+            week_date.year,
+            week_date.month,
+            week_date.day,
+            params["num_patents"],
+            params["keywords"],
+            params["model_name"],
+            logging=logging,
+        )
+        result["cost"] += week_result["cost"]
+        result["weeks"][week_date.isoformat()] = week_result["patents"]
+    return result
+
+
+class WorkerPool:
+    """
+    Threads that claim jobs from the queue and run them with a shared warm state.
+
+    Parameters:
+        queue (JobQueue): The job queue.
+        workers (int): The number of worker threads.
+        poll_interval (float): The time in seconds an idle worker waits before polling again.
+        logging (bool): The boolean to print logs
+        max_weeks (int): The number of weekly files kept in memory, see `WarmState`.
+    """
+
+    def __init__(self, queue, workers=2, poll_interval=0.2, logging=False, max_weeks=DEFAULT_WARM_WEEKS):
+        self.queue = queue
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self.logging = logging
+        self.warm_state = WarmState(max_weeks)
+        self._stop = threading.Event()
+        self._threads = []
+
+    def start(self):
+        recovered = self.queue.recover()
+        if recovered:
+            print(f"Queued again {recovered} jobs interrupted by the last shutdown.")
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._work, name=f"patentgpt-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        return self
+
+    def stop(self, timeout=None):
+        """
+        Stop claiming jobs and wait for the running ones to finish.
+        """
+
+        self._stop.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def _work(self):
+        while not self._stop.is_set():
+            job = self.queue.claim()
+            if job is None:
+                self._stop.wait(self.poll_interval)
+                continue
+
+            start = time.perf_counter()
+            try:
+                result = run_job(job, self.warm_state, self.logging)
+            except Exception as e:
+                METRICS.increment("jobs_failed")
+                print(f"Job {job['id']} failed: {e}")
+                self.queue.fail(job["id"], "".join(traceback.format_exception_only(type(e), e)).strip())
+            else:
+                METRICS.increment("jobs_done")
+                self.queue.complete(job["id"], result)
+            METRICS.observe("job", time.perf_counter() - start)
+
+
+def create_app(db_path=DEFAULT_DB_PATH, workers=2, logging=False, max_weeks=DEFAULT_WARM_WEEKS):
+    """
+    Create the FastAPI application of the service.
+
+    Parameters:
+        db_path (str): The path of the SQLite job queue.
+        workers (int): The number of worker threads.
+        logging (bool): The boolean to print logs of the analysis.
+        max_weeks (int): The number of weekly files kept in memory.
+
+    Returns:
+        FastAPI: The application. The worker pool starts and stops with it.
+    """
+
+    queue = JobQueue(db_path)
+    pool = WorkerPool(queue, workers, logging=logging, max_weeks=max_weeks)
+    app = FastAPI(title="patentGPT")
+
+    @app.on_event("startup")
+    def start_workers():
+        pool.start()
+
+    @app.on_event("shutdown")
+    def stop_workers():
+        pool.stop()
+        queue.close()
+
+    def submit(kind, request):
+        if request.model_name not in MODEL_NAMES:
+            raise HTTPException(status_code=422, detail=f"model_name must be one of {MODEL_NAMES}")
+        job_id = queue.submit(kind, json.loads(request.json()))
+        METRICS.increment("jobs_submitted")
+        return {"job_id": job_id, "status": "queued"}
+
+    @app.post("/jobs/patents", status_code=202)
+    def submit_patents(request: PatentJobRequest):
+        return submit("patents", request)
+
+    @app.post("/jobs/range", status_code=202)
+    def submit_range(request: RangeJobRequest):
+        if request.end_date < request.start_date:
+            raise HTTPException(status_code=422, detail="end_date is before start_date")
+        return submit("range", request)
+
+    def get_job(job_id):
+        job = queue.get(job_id)
+        if job is None:
+            raise HTTPException(status_code=404, detail="Unknown job")
+        return job
+
+    @app.get("/jobs/{job_id}")
+    def job_status(job_id: str):
+        job = get_job(job_id)
+        del job["result"]
+        return job
+
+    @app.get("/jobs/{job_id}/result")
+    def job_result(job_id: str):
+        job = get_job(job_id)
+        if job["status"] == "failed":
+            raise HTTPException(status_code=500, detail=job["error"])
+        if job["status"] != "done":
+            raise HTTPException(status_code=409, detail=f"Job is {job['status']}")
+        return job["result"]
+
+    @app.get("/health")
+    def health():
+        return {"workers": pool.workers, "jobs": queue.counts()}
+
+    @app.get("/metrics", response_class=PlainTextResponse)
+    def metrics():
+        return METRICS.prometheus_text()
+
+    return app
+
+
+def main():
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Run the patent analysis service.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=2, help="number of analysis worker threads")
+    parser.add_argument("--db", default=DEFAULT_DB_PATH, help="path of the SQLite job queue")
+    parser.add_argument(
+        "--max-weeks", type=int, default=DEFAULT_WARM_WEEKS, help="number of weekly files kept in memory"
+    )
+    parser.add_argument("--logging", action="store_true")
+    args = parser.parse_args()
+
+    uvicorn.run(create_app(args.db, args.workers, args.logging, args.max_weeks), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
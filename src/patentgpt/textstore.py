@@ -0,0 +1,242 @@
+import itertools
+import mmap
+import os
+import sys
+import threading
+from contextlib import contextmanager
+from langchain.schema import Document
+from .metrics import METRICS
+
+
+# Characters after which a chunk may end, best first
+_BREAKS = (b"\n\n", b". ", b"\n", b" ")
+
+
+def _char_boundary(data, position):
+    # Move back to the first byte of a UTF-8 character
+    while position > 0 and position < len(data) and (data[position] & 0xC0) == 0x80:
+        position -= 1
+    return position
+
+
+def _chunk_end(data, start, end):
+    """
+    Return the best position to end a chunk in data[start:end], preferring paragraph, then
+    sentence, then word boundaries in the second half of the window.
+    """
+
+    if end >= len(data):
+        return len(data)
+    middle = start + (end - start) // 2
+    for separator in _BREAKS:
+        position = data.rfind(separator, middle, end)
+        if position != -1:
+            return position + len(separator)
+    return _char_boundary(data, end)
+
+
+def iter_chunks(file_path, chunk_size=1000, chunk_overlap=0, transform=None):
+    """
+    Lazily split a stored patent text into chunks without reading the whole file.
+
+    The file is memory-mapped, so only the pages of the current chunk are loaded by the
+    operating system, and every chunk is decoded on its own. Chunks end on a paragraph,
+    sentence or word boundary where possible.
+
+    Parameters:
+        file_path (str): The path of the patent text file.
+        chunk_size (int): The maximum size of a chunk in bytes of UTF-8 text.
+        chunk_overlap (int): The number of bytes repeated at the start of the next chunk.
+        transform (callable, optional): A function applied to the text of every chunk,
+            e.g. `request_builder.compact_text`. Empty chunks are skipped.
+
+    Yields:
+        Document: The chunks, with the source path and byte offset as metadata.
+    """
+
+    if os.path.getsize(file_path) == 0:
+        return
+    with open(file_path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        start = 0
+        size = len(data)
+        while start < size:
+            end = _chunk_end(data, start, start + chunk_size)
+            if end <= start:
+                end = min(size, start + chunk_size)
+            text = data[start:end].decode("utf-8", errors="ignore").strip()
+            if transform is not None:
+                text = transform(text)
+            if text:
+                yield Document(page_content=text, metadata={"source": file_path, "start": start})
+            if end >= size:
+                break
+            start = max(_char_boundary(data, end - chunk_overlap), start + 1) if chunk_overlap else end
+
+
+def batched(iterable, size):
+    """
+    Yield lists of up to `size` items from an iterable, so that only one batch is held.
+    `size` may also be a function, called before each batch.
+    """
+
+    iterator = iter(iterable)
+    while True:
+        batch = list(itertools.islice(iterator, size() if callable(size) else size))
+        if not batch:
+            return
+        yield batch
+
+
+def current_memory():
+    """
+    Return the resident memory of the process in bytes, or None where it is not available.
+
+    It is read from /proc on Linux, or with psutil if it is installed. Reading it does not
+    slow down allocations, unlike tracemalloc.
+    """
+
+    try:
+        with open("/proc/self/statm", "rb") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError, IndexError):
+        pass
+    try:
+        import psutil
+    except ImportError:
+        return None
+    return psutil.Process().memory_info().rss
+
+
+# Guards of the patents being loaded and embedded by the threads of this process
+_memory_condition = threading.Condition()
+_guards_in_memory = set()
+
+
+def _in_flight_bytes(memory):
+    """
+    Return the memory used by the patents in flight: the bytes of the chunks they hold, or
+    the growth of the resident memory since the oldest of them started if that is larger.
+
+    The resident memory is measured from the patents in flight only, so memory that
+    CPython keeps after earlier patents does not count against the bound.
+    """
+
+    guards = list(_guards_in_memory)
+    if not guards:
+        return 0
+    held = sum(guard.held_bytes for guard in guards)
+    starts = [guard.start_memory for guard in guards if guard.start_memory is not None]
+    if memory is None or not starts:
+        return held
+    return max(held, memory - min(starts))
+
+
+class MemoryGuard:
+    """
+    The memory bound of one patent, see `track_memory`.
+
+    The memory of the patent is the larger of the bytes of the chunks it holds and the
+    growth of the resident memory since it started, which also covers the embeddings and
+    the vector store.
+
+    Parameters:
+        limit_bytes (int, optional): The bound on the memory of the patents in flight.
+        batch_size (int): The initial number of chunks embedded at a time.
+    """
+
+    def __init__(self, limit_bytes=None, batch_size=32):
+        self.limit_bytes = limit_bytes
+        self.batch_size = batch_size
+        self.start_memory = current_memory()
+        self.held_bytes = 0
+        self.peak = 0
+        self.peak_rss = self.start_memory or 0
+
+    def hold(self, documents):
+        """
+        Count the chunks the patent keeps in memory and return their size in bytes.
+        """
+
+        size = sum(sys.getsizeof(doc.page_content) for doc in documents)
+        self.held_bytes += size
+        return size
+
+    def release(self, size):
+        """
+        Stop counting chunks that are no longer held, e.g. once they are embedded, given
+        the size returned by `hold`.
+        """
+
+        self.held_bytes = max(0, self.held_bytes - size)
+
+    def usage(self, memory=None):
+        """
+        Return the memory used by this patent in bytes.
+        """
+
+        if memory is None or self.start_memory is None:
+            return self.held_bytes
+        return max(self.held_bytes, memory - self.start_memory)
+
+    def next_batch_size(self):
+        """
+        Sample the memory and return the number of chunks to embed next, halved every time
+        the patents in flight are above the bound.
+        """
+
+        memory = current_memory()
+        if memory is not None:
+            self.peak_rss = max(self.peak_rss, memory)
+        self.peak = max(self.peak, self.usage(memory))
+        if self.limit_bytes is not None and self.batch_size > 1 and _in_flight_bytes(memory) > self.limit_bytes:
+            self.batch_size = max(1, self.batch_size // 2)
+            METRICS.increment("embed_batch_shrunk")
+        return self.batch_size
+
+
+@contextmanager
+def track_memory(limit_bytes=None, batch_size=32, logging=False):
+    """
+    Measure and bound the memory of a patent while it is loaded and embedded.
+
+    The peak memory of every patent is measured on its own (see `MemoryGuard`) and the
+    largest one of the run is recorded as the "max_patent_bytes" gauge, next to the
+    largest resident memory of the process as "max_rss_bytes". With a bound, a patent
+    waits before it starts while the patents already in flight are above it
+    (back-pressure on the worker threads), and the embedding batches are shrunk while they
+    stay above it. Since only the patents in flight count, the workers run in parallel
+    again as soon as the patents that used the memory are done.
+
+    Parameters:
+        limit_bytes (int, optional): The bound in bytes on the memory of the patents in
+            flight. If a patent alone exceeds it, a warning is printed and the
+            "memory_over_limit" counter is incremented.
+        batch_size (int): The initial number of chunks embedded at a time.
+        logging (bool): The boolean to print logs
+
+    Yields:
+        MemoryGuard: The guard to ask for the size of each batch.
+    """
+
+    with _memory_condition:
+        if limit_bytes is not None:
+            while _guards_in_memory and _in_flight_bytes(current_memory()) > limit_bytes:
+                METRICS.increment("memory_waits")
+                _memory_condition.wait(1.0)
+        guard = MemoryGuard(limit_bytes, batch_size)
+        _guards_in_memory.add(guard)
+
+    try:
+        yield guard
+    finally:
+        guard.next_batch_size()
+        with _memory_condition:
+            _guards_in_memory.discard(guard)
+            _memory_condition.notify_all()
+        METRICS.max_gauge("max_patent_bytes", guard.peak)
+        METRICS.max_gauge("max_rss_bytes", guard.peak_rss)
+        if logging:
+            print(f"Memory of this patent: {guard.peak / 1e6:.1f} MB at most")
+        if limit_bytes is not None and guard.peak > limit_bytes:
+            METRICS.increment("memory_over_limit")
+            print(f"Warning: the patent used {guard.peak / 1e6:.1f} MB, more than {limit_bytes / 1e6:.1f} MB.")
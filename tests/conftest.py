@@ -0,0 +1,7 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+# The analysis modules need a key at import; the tests never call the API
+os.environ.setdefault("OPENAI_API_KEY", "sk-test")
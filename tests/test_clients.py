@@ -0,0 +1,27 @@
+import openai
+from openai.api_requestor import MAX_CONNECTION_RETRIES
+
+from patentgpt import clients
+
+
+def test_openai_sessions_keep_the_connection_retries():
+    clients.configure_pools(pool_maxsize=5)
+    try:
+        session = clients.openai_session()
+        adapter = session.get_adapter("https://api.openai.com")
+        assert adapter.max_retries.total == MAX_CONNECTION_RETRIES
+        assert adapter._pool_maxsize == 5
+        assert clients.get_http_session("test").get_adapter("https://example.com").max_retries.total == 0
+    finally:
+        clients.reset_clients()
+        clients.configure_pools()
+
+
+def test_the_openai_session_is_installed_by_configure_pools_only():
+    clients.reset_clients()
+    assert openai.requestssession is None
+    clients.get_chat_model("gpt-3.5-turbo", temperature=0)
+    assert openai.requestssession is None
+    clients.configure_pools()
+    assert openai.requestssession is clients.openai_session
+    clients.reset_clients()
@@ -0,0 +1,75 @@
+import json
+
+from patentgpt.dedup import MinHashIndex, reuse_duplicate_output
+
+
+DESCRIPTION = " ".join(
+    f"the composition of example {i} comprises a polymer layer with a thickness of {i} nm"
+    for i in range(60)
+)
+UNRELATED = " ".join(f"a wireless receiver decodes frame {i} at a rate of {i} Mbps" for i in range(60))
+
+
+def make_index():
+    index = MinHashIndex()
+    index.add("US1-2023.txt", DESCRIPTION)
+    index.add("US2-2023.txt", DESCRIPTION.replace("example 7 ", "sample 7 "))
+    index.add("US3-2023.txt", UNRELATED)
+    return index
+
+
+def test_query_finds_near_duplicates_only():
+    index = make_index()
+
+    matches = index.query("US1-2023.txt")
+
+    assert [key for key, _ in matches] == ["US2-2023.txt"]
+    assert matches[0][1] >= 0.85
+    assert [key for key, _ in index.query(text=UNRELATED + " in a new sentence")] == ["US3-2023.txt"]
+
+
+def test_query_of_unrelated_text_is_empty():
+    index = make_index()
+
+    assert index.query(text="a bicycle brake with a lever and a cable " * 20) == []
+
+
+def write_source_output(tmp_path):
+    (tmp_path / "output").mkdir()
+    source = {"Patent Identifier": "US1", "Content": [{"Measurement_substance": "layer"}]}
+    with open(tmp_path / "output" / "US1-2023.txt_gpt-4.json", "w", encoding="utf-8") as f:
+        json.dump(source, f)
+
+
+def test_reuse_duplicate_output_writes_output_path(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    write_source_output(tmp_path)
+    staging = tmp_path / "US2.tmp"
+
+    output_dict = reuse_duplicate_output(make_index(), "US2-2023.txt", "gpt-4", logging=False, output_path=str(staging))
+
+    assert output_dict["Patent Identifier"] == "US2"
+    assert output_dict["Near Duplicate Of"] == "US1"
+    assert output_dict["Content"] == [{"Measurement_substance": "layer"}]
+    with open(staging, "r", encoding="utf-8") as f:
+        assert json.load(f) == output_dict
+    assert not (tmp_path / "output" / "US2-2023.txt_gpt-4.json").exists()
+
+
+def test_reuse_duplicate_output_defaults_to_the_output_directory(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    write_source_output(tmp_path)
+
+    output_dict = reuse_duplicate_output(make_index(), "US2-2023.txt", "gpt-4", logging=False)
+
+    with open(tmp_path / "output" / "US2-2023.txt_gpt-4.json", "r", encoding="utf-8") as f:
+        assert json.load(f) == output_dict
+
+
+def test_reuse_duplicate_output_without_a_source(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    write_source_output(tmp_path)
+
+    assert reuse_duplicate_output(None, "US2-2023.txt", "gpt-4", logging=False) is None
+    assert reuse_duplicate_output(make_index(), "US2-2023.txt", "gpt-3.5-turbo", logging=False) is None
+    assert reuse_duplicate_output(make_index(), "US3-2023.txt", "gpt-4", logging=False) is None
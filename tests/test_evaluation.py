@@ -0,0 +1,82 @@
+import json
+
+import numpy as np
+import pytest
+
+from patentgpt.evaluation import load_outputs, match_measurements
+
+
+def measurement(substance, value, unit):
+    return {"Measurement_substance": substance, "Measured_value": value, "Measured_unit": unit}
+
+
+def write_outputs(directory, model_name, outputs):
+    directory.mkdir(exist_ok=True)
+    for patent, content in outputs.items():
+        with open(directory / f"{patent}-2023.txt_{model_name}.json", "w", encoding="utf-8") as f:
+            json.dump({"Patent Identifier": patent, "Content": content}, f)
+
+
+@pytest.fixture
+def outputs(tmp_path):
+    write_outputs(
+        tmp_path,
+        "pred",
+        {
+            # Two predictions of the same reference measurement
+            "US1": [measurement("the polymer layer", "5", "nm"), measurement("polymer layer", "5", "nm")],
+            "US2": [
+                measurement("silica particles", "between 10 and 20", "µm"),
+                measurement("silica particles", "30", "µm"),
+                measurement("water", "less than 0.3", "%"),
+            ],
+            "US3": [measurement("coating", "2", "mm"), measurement("substrate", "1", "mm")],
+        },
+    )
+    write_outputs(
+        tmp_path,
+        "ref",
+        {
+            "US1": [measurement("polymer layer", "5", "nm")],
+            "US2": [
+                measurement("silica particles", "10-20", "µm"),
+                measurement("silica particles", "30", "µm"),
+                measurement("water", "<0.3", "%"),
+            ],
+            "US3": [measurement("coating", "2", "mm"), measurement("substrate", "1", "mm")],
+            "US4": [measurement("film", "3", "nm")],
+        },
+    )
+    return load_outputs(str(tmp_path), "pred"), load_outputs(str(tmp_path), "ref")
+
+
+def test_match_measurements_is_one_to_one(outputs):
+    pred, ref = outputs
+
+    matches, n_pred, n_ref = match_measurements(pred, ref, ["US1"])
+
+    assert matches.tolist() == [1]
+    assert n_pred.tolist() == [2]
+    assert n_ref.tolist() == [1]
+
+
+def test_match_measurements_counts_patents_without_predictions(outputs):
+    pred, ref = outputs
+
+    matches, n_pred, n_ref = match_measurements(pred, ref, ["US1", "US2", "US3", "US4"])
+
+    assert matches.tolist() == [1, 3, 2, 0]
+    assert n_pred.tolist() == [2, 3, 2, 0]
+    assert n_ref.tolist() == [1, 3, 2, 1]
+
+
+@pytest.mark.parametrize("max_pairs", [1, 2, 5, 9, 100])
+def test_match_measurements_blocks_give_the_same_matches(outputs, max_pairs):
+    pred, ref = outputs
+    patents = ["US1", "US2", "US3", "US4"]
+
+    expected = match_measurements(pred, ref, patents)
+    result = match_measurements(pred, ref, patents, max_pairs=max_pairs)
+
+    for expected_counts, counts in zip(expected, result):
+        np.testing.assert_array_equal(counts, expected_counts)
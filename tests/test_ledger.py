@@ -0,0 +1,123 @@
+import time
+from datetime import date
+
+import pytest
+
+from patentgpt.ledger import EXTRACT, WorkLedger
+
+
+WEEK = date(2023, 1, 5)
+
+
+@pytest.fixture
+def ledger(tmp_path):
+    ledger = WorkLedger(str(tmp_path / "ledger.sqlite"), max_attempts=2)
+    ledger.add_weeks([WEEK])
+    yield ledger
+    ledger.close()
+
+
+def test_a_leased_unit_is_not_leased_again(ledger):
+    unit = ledger.lease("worker-1")
+    assert (unit["week"], unit["patent"], unit["attempts"]) == ("2023-01-05", EXTRACT, 1)
+    assert ledger.lease("worker-2") is None
+    assert ledger.counts()["leased"] == 1
+
+
+def test_analysis_units_are_leased_before_extractions(ledger):
+    ledger.add_weeks([date(2023, 1, 12)])
+    extract = ledger.lease("worker-1")
+    assert ledger.complete(extract, patents=["US1", "US2"])
+    assert [ledger.lease("worker-1")["patent"] for _ in range(3)] == ["US1", "US2", EXTRACT]
+
+
+def test_an_expired_lease_is_leased_again(ledger):
+    first = ledger.lease("worker-1", lease_seconds=-1)
+    second = ledger.lease("worker-2")
+    assert second["patent"] == first["patent"]
+    assert second["token"] != first["token"]
+    assert second["attempts"] == 2
+    # The first worker lost its lease
+    assert not ledger.heartbeat(first)
+    assert ledger.heartbeat(second)
+
+
+def test_a_stale_complete_does_not_publish(ledger, tmp_path):
+    first = ledger.lease("worker-1", lease_seconds=-1)
+    second = ledger.lease("worker-2")
+    output_path = tmp_path / "output.json"
+    stale_path = tmp_path / "stale.tmp"
+    stale_path.write_text("stale")
+
+    assert not ledger.complete(first, str(stale_path), str(output_path), patents=["US1"])
+    assert not stale_path.exists()
+    assert not output_path.exists()
+    assert ledger.counts() == {"pending": 0, "leased": 1, "done": 0, "failed": 0}
+
+    staged_path = tmp_path / "staged.tmp"
+    staged_path.write_text("fresh")
+    assert ledger.complete(second, str(staged_path), str(output_path), patents=["US1"])
+    assert output_path.read_text() == "fresh"
+    assert ledger.counts() == {"pending": 1, "leased": 0, "done": 1, "failed": 0}
+    # Completing twice does not publish again
+    assert not ledger.complete(second)
+
+
+def test_release_fails_a_unit_after_max_attempts(ledger):
+    unit = ledger.lease("worker-1")
+    ledger.release(unit, "timeout")
+    assert ledger.counts()["pending"] == 1
+
+    unit = ledger.lease("worker-1")
+    assert unit["attempts"] == 2
+    ledger.release(unit, "timeout")
+    assert ledger.counts() == {"pending": 0, "leased": 0, "done": 0, "failed": 1}
+    assert ledger.lease("worker-1") is None
+    error = ledger.connection.execute("SELECT error FROM units").fetchone()[0]
+    assert error == "timeout"
+
+
+def test_expired_leases_fail_after_max_attempts(ledger):
+    ledger.lease("worker-1", lease_seconds=-1)
+    ledger.lease("worker-2", lease_seconds=-1)
+    assert ledger.lease("worker-3") is None
+    assert ledger.counts()["failed"] == 1
+    error = ledger.connection.execute("SELECT error FROM units").fetchone()[0]
+    assert error == "lease expired"
+
+
+def test_worker_passes_the_near_duplicate_index_and_discards_lost_results(tmp_path, monkeypatch):
+    from patentgpt import ledger as ledger_module
+    from patentgpt import main
+
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "output").mkdir()
+    path = str(tmp_path / "ledger.sqlite")
+    work_ledger = WorkLedger(path)
+    work_ledger.add_weeks([WEEK])
+    assert work_ledger.complete(work_ledger.lease("setup"), patents=["US1.txt", "US2.txt"])
+
+    minhash_index = object()
+    monkeypatch.setattr(ledger_module.dedup, "load_index", lambda directory: minhash_index)
+    calls = []
+
+    def analyze_patent(name, year, month, day, model_name, logging, index=None, output_path=None):
+        calls.append((name, index))
+        with open(output_path, "w", encoding="utf-8") as f:
+            f.write("{}")
+        if name == "US2.txt":
+            # Another worker took over the lease in the meantime and completed the unit
+            work_ledger.connection.execute(
+                "UPDATE units SET token = 'other', status = 'done' WHERE patent = ?", (name,)
+            )
+            # Let the heartbeat notice that the lease is lost
+            time.sleep(0.2)
+        return 0.0, {}
+
+    monkeypatch.setattr(main, "analyze_patent", analyze_patent)
+    completed = ledger_module.run_worker(path, "gpt-4", "worker-1", heartbeat_interval=0.01, poll_interval=0)
+
+    assert completed == 1
+    assert calls == [("US1.txt", minhash_index), ("US2.txt", minhash_index)]
+    assert sorted(p.name for p in (tmp_path / "output").iterdir()) == ["US1.txt_gpt-4.json"]
+    work_ledger.close()
@@ -0,0 +1,113 @@
+import json
+import math
+
+import pytest
+
+from patentgpt.measurements import build_index, load_index, normalize_measurement, parse_unit, parse_value
+
+
+@pytest.mark.parametrize(
+    "value, expected",
+    [
+        ("between about 20 and 40", (20.0, 40.0)),
+        ("20-40", (20.0, 40.0)),
+        ("20 to 40", (20.0, 40.0)),
+        ("ca. -60", (-60.0, -60.0)),
+        ("about 1,000", (1000.0, 1000.0)),
+        ("less than 0.3%", (-math.inf, 0.3)),
+        ("at least 5", (5.0, math.inf)),
+        ("5 ± 0.5", (4.5, 5.5)),
+        ("1.2×10^3", (1200.0, 1200.0)),
+        ("1:2", (0.5, 0.5)),
+        ("1:2 to 1:4", (0.25, 0.5)),
+    ],
+)
+def test_parse_value(value, expected):
+    assert parse_value(value) == pytest.approx(expected)
+
+
+@pytest.mark.parametrize("value", ["none reported", "1:2:3", "1:0"])
+def test_parse_value_without_a_single_reading(value):
+    assert parse_value(value) is None
+
+
+def test_parse_unit():
+    assert parse_unit("° C") == (1.0, 273.15, "K")
+    factor, offset, si_unit = parse_unit("Ncm −1")
+    assert (factor, offset, si_unit) == (pytest.approx(100.0), 0.0, "kg·s^-2")
+    assert parse_unit("clusters") is None
+
+
+def test_normalize_measurement_converts_to_si():
+    record = normalize_measurement(
+        {
+            "Measurement_substance": "Copolymer",
+            "Measured_value": "ca. -60",
+            "Measured_unit": "° C",
+            "measurement_type": "Glass transition temperature",
+        }
+    )
+    assert record["type"] == "glass transition temperature"
+    assert record["substance"] == "copolymer"
+    assert record["unit"] == "K"
+    assert record["min"] == record["max"] == pytest.approx(213.15)
+
+
+def test_normalize_measurement_reads_the_unit_after_each_number():
+    record = normalize_measurement({"Measured_value": "1 μm to 1 mm", "Measured_unit": "nm"})
+    assert (record["min"], record["max"], record["unit"]) == (pytest.approx(1e-6), pytest.approx(1e-3), "m")
+
+
+def test_normalize_measurement_keeps_a_ratio_as_one_value():
+    record = normalize_measurement({"Measured_value": "1:2", "Measured_unit": "weight ratio"})
+    assert (record["min"], record["max"], record["unit"]) == (0.5, 0.5, "weight ratio")
+
+
+def write_output(directory, name, patent, measurements):
+    with open(directory / name, "w", encoding="utf-8") as f:
+        json.dump({"Patent Identifier": patent, "Content": measurements}, f)
+
+
+def measurement(value, unit, measurement_type="glass transition temperature", substance="polymer"):
+    return {
+        "Measurement_substance": substance,
+        "Measured_value": value,
+        "Measured_unit": unit,
+        "measurement_type": measurement_type,
+    }
+
+
+def test_range_queries(tmp_path):
+    write_output(
+        tmp_path,
+        "US1-2023-01-03_gpt-4.json",
+        "US1",
+        [measurement("-60", "°C"), measurement("20 to 40", "°C"), measurement("2", "mm", "thickness")],
+    )
+    write_output(
+        tmp_path,
+        "US2-2023-01-03_gpt-4.json",
+        "US2",
+        [measurement("250 K", "", substance="rubber"), measurement("unknown", "°C")],
+    )
+    write_output(tmp_path, "US3-2023-01-03_gpt-3.5-turbo.json", "US3", [measurement("-10", "°C")])
+
+    index = build_index(str(tmp_path), model_name="gpt-4", logging=False)
+    assert len(index) == 4
+
+    rows = index.query("glass transition", low=-80, high=0, unit="°C")
+    assert [(row["patent"], row["value"]) for row in rows] == [("US1", "-60"), ("US2", "250 K")]
+    assert rows[0]["min"] == pytest.approx(213.15)
+
+    # A range only matches if it lies entirely within the bounds
+    assert index.query("glass transition", low=0, high=30, unit="°C") == []
+    assert len(index.query("glass transition", low=0, high=40, unit="°C")) == 1
+
+    assert [row["patent"] for row in index.query(substance="rubber")] == ["US2"]
+    assert [row["value"] for row in index.query("thickness", low=1, high=3, unit="mm")] == ["2"]
+    assert index.query("thickness", unit="°C") == []
+    with pytest.raises(ValueError):
+        index.query(unit="furlong")
+
+    loaded = load_index(str(tmp_path))
+    assert loaded.query("glass transition", low=-80, high=0, unit="°C") == rows
@@ -0,0 +1,87 @@
+import json
+
+import pytest
+
+from patentgpt.output_parser import parse_llm_json, parse_rates, repair_json, strip_code_fences
+
+
+ITEM = {
+    "Measurement_substance": "film",
+    "Measured_value": "20",
+    "Measured_unit": "nm",
+    "measurement_type": "thickness",
+}
+
+
+@pytest.mark.parametrize(
+    "text, expected",
+    [
+        ('{"a": 1,}', {"a": 1}),
+        ('{"a": [1, 2,],}', {"a": [1, 2]}),
+        ('```json\n{"a": [1, 2,]}\n```', {"a": [1, 2]}),
+        ('Here is the JSON:\n{"a": 1}\nLet me know if you need more.', {"a": 1}),
+        ('{"a": 1 // the answer\n}', {"a": 1}),
+        ('{"a": "x, y}", "b": 2,}', {"a": "x, y}", "b": 2}),
+    ],
+)
+def test_repairs_common_mistakes(text, expected):
+    assert json.loads(repair_json(text)) == expected
+
+
+def test_drops_the_incomplete_item_of_a_truncated_output():
+    assert json.loads(repair_json('{"a": [{"b": 1}, {"b": 2')) == {"a": [{"b": 1}]}
+
+
+def test_returns_none_without_json():
+    assert repair_json("The patent has no measurements.") is None
+
+
+def test_strip_code_fences():
+    assert strip_code_fences('```\n{"a": 1}\n```') == '{"a": 1}\n'
+    assert strip_code_fences('{"a": 1}') == '{"a": 1}'
+
+
+def test_parse_statuses():
+    output = json.dumps({"Content": [ITEM]})
+    assert parse_llm_json(output) == ({"Content": [ITEM]}, "ok")
+
+    output_dict, status = parse_llm_json(f"```json\n{output[:-2]},]}}\n```")
+    assert status == "recovered"
+    assert output_dict == {"Content": [ITEM]}
+
+    assert parse_llm_json(json.dumps([ITEM])) == ({"Content": [ITEM]}, "recovered")
+    assert parse_llm_json('{"Content": [{"Measured_unit": "nm"}]}') == (None, "lost")
+    assert parse_llm_json("No measurements found.") == (None, "lost")
+    assert parse_llm_json(None) == (None, "lost")
+
+
+def test_validate_fills_missing_keys_and_converts_numbers():
+    output_dict, status = parse_llm_json('{"Content": [{"Measured_value": 20}]}')
+    assert status == "ok"
+    assert output_dict["Content"] == [
+        {
+            "Measurement_substance": "",
+            "Measured_value": "20",
+            "Measured_unit": "",
+            "measurement_type": "",
+        }
+    ]
+
+
+def test_parse_rates():
+    assert parse_rates({}) == {}
+    rates = parse_rates({"json_ok": 3, "json_recovered": 1})
+    assert rates == {"ok": 0.75, "recovered": 0.25, "retried": 0.0, "lost": 0.0}
+
+
+@pytest.mark.parametrize(
+    "prefix",
+    ["Sure [JSON below]:\n", "Here it is {as requested}: ", "Results (see [1] and [2]): ", "[1] "],
+)
+def test_skips_brackets_in_leading_prose(prefix):
+    output = prefix + json.dumps({"Content": [ITEM]})
+    assert parse_llm_json(output) == ({"Content": [ITEM]}, "recovered")
+
+
+def test_prefers_a_list_of_objects_over_a_citation():
+    assert json.loads(repair_json('As in [1], the values are: [{"a": 1}, {"b"')) == [{"a": 1}]
@@ -0,0 +1,61 @@
+import time
+
+import pytest
+
+from patentgpt.request_builder import compact_text, split_sentences
+
+
+def test_removes_numbering_and_figure_references():
+    text = "[0012] The film (see FIG. 1A) is flat (FIGS. 4 and 5B), as shown in FIGS. 2-3."
+    assert compact_text(text) == "The film is flat , ."
+
+
+def test_keeps_measurements_next_to_a_figure_reference():
+    text = "(FIG. 2 shows a layer of 20 nm thickness)"
+    assert "20 nm thickness" in compact_text(text)
+
+
+def test_keeps_reference_sentence_with_measurements():
+    text = (
+        "The copolymer has a Tg of -60 °C, as in U.S. Pat. No. 5,123,456, which is "
+        "incorporated herein by reference, and contains 5 wt% filler. The end."
+    )
+    assert compact_text(text) == text
+
+
+def test_removes_priority_and_reference_sentences():
+    text = (
+        "This application claims the benefit of U.S. Provisional Appl. No. 62/123,456, "
+        "filed Jan. 1, 2020. The contents of U.S. Ser. No. 12/345,678 are incorporated by "
+        "reference in their entirety. The layer is 2 mm thick."
+    )
+    assert compact_text(text) == "The layer is 2 mm thick."
+
+
+def test_split_sentences_skips_abbreviations():
+    text = "Filed Jan. 1, 2020 as U.S. Ser. No. 5. Next one! Last"
+    assert split_sentences(text) == ["Filed Jan. 1, 2020 as U.S. Ser. No. 5. ", "Next one! ", "Last"]
+
+
+def test_long_text_without_periods_is_fast():
+    text = "12 34 | incorporated by reference " * 2000
+    start = time.perf_counter()
+    compact_text(text)
+    assert time.perf_counter() - start < 1.0
+
+
+@pytest.mark.parametrize(
+    "text, kept",
+    [
+        ("As shown in FIG. 2, 20 nm films were grown.", "20 nm films were grown."),
+        ("Referring to FIG. 3, 150 °C is the optimum.", "150 °C is the optimum."),
+        ("FIG. 1 to 100 MPa pressure", "to 100 MPa pressure"),
+        ("See FIG. 2 and 5 wt% filler.", "and 5 wt% filler."),
+    ],
+)
+def test_keeps_measurements_after_a_figure_reference(text, kept):
+    assert compact_text(text).endswith(kept)
+
+
+def test_removes_figure_lists_before_a_comma():
+    assert compact_text("as shown in FIGS. 2, 3 and 5A, the film is flat.") == ", the film is flat."
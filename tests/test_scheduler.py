@@ -0,0 +1,95 @@
+import pytest
+
+from patentgpt import scheduler
+from patentgpt.scheduler import BudgetScheduler
+
+
+def item(name, cost, priority=1.0):
+    return {"name": name, "cost": cost, "priority": priority, "measurements": 1.0}
+
+
+def test_next_admits_items_that_fit_the_cost_budget():
+    budget_scheduler = BudgetScheduler([item("a", 0.6), item("b", 0.5), item("c", 0.3)], budget_usd=1.0)
+    first = budget_scheduler.next()
+    assert first["name"] == "a"
+    budget_scheduler.complete(first, 0.6, 1.0)
+    # "b" no longer fits, the cheaper "c" is admitted instead
+    assert budget_scheduler.next()["name"] == "c"
+    assert budget_scheduler.next() is None
+    assert budget_scheduler.stop_reason == "cost budget reached"
+    assert [pending["name"] for pending in budget_scheduler.pending] == ["b"]
+
+
+def test_next_stops_when_a_patent_does_not_fit_before_the_deadline():
+    budget_scheduler = BudgetScheduler([item("a", 0.1), item("b", 0.1)], deadline_s=10.0)
+    budget_scheduler.complete(budget_scheduler.next(), 0.1, 20.0)
+    assert budget_scheduler.next() is None
+    assert budget_scheduler.stop_reason == "deadline reached"
+
+
+def test_next_reports_an_empty_queue():
+    budget_scheduler = BudgetScheduler([])
+    assert budget_scheduler.next() is None
+    assert budget_scheduler.stop_reason == "queue empty"
+
+
+def test_save_and_load(tmp_path):
+    state_path = str(tmp_path / "state.json")
+    budget_scheduler = BudgetScheduler(
+        [item("a", 0.6), item("b", 0.5)],
+        budget_usd=1.0,
+        deadline_s=100.0,
+        state_path=state_path,
+        context={"year": 2023, "month": 1, "day": 5, "model_name": "gpt-4"},
+        unestimated=["c"],
+    )
+    done = budget_scheduler.run(lambda name: 0.7, logging=False)
+    assert [item["name"] for item in done] == ["a"]
+
+    loaded = BudgetScheduler.load(state_path, budget_usd=2.0)
+    assert loaded.budget_usd == 2.0
+    assert loaded.deadline_s == 100.0
+    assert loaded.spent_usd == pytest.approx(0.7)
+    assert loaded.estimated_usd == pytest.approx(0.6)
+    assert loaded.elapsed() >= budget_scheduler.elapsed_before
+    assert [pending["name"] for pending in loaded.pending] == ["b"]
+    assert loaded.unestimated == ["c"]
+    assert loaded.context["model_name"] == "gpt-4"
+    assert [item["name"] for item in loaded.done] == ["a"]
+
+
+def test_run_keeps_the_item_of_a_failed_analysis(tmp_path):
+    budget_scheduler = BudgetScheduler([item("a", 0.1)], state_path=str(tmp_path / "state.json"))
+
+    def analyze(name):
+        raise RuntimeError("API error")
+
+    with pytest.raises(RuntimeError):
+        budget_scheduler.run(analyze, logging=False)
+    assert [pending["name"] for pending in BudgetScheduler.load(budget_scheduler.state_path).pending] == ["a"]
+
+
+def test_unestimated_patents_are_estimated_on_resume(tmp_path, monkeypatch):
+    costs = {"a": 0.5, "b": 0.1, "c": 0.2}
+
+    def estimate_patent(file_path, model_name, **kwargs):
+        assert model_name == "cascade"
+        name = file_path.rsplit("/", 1)[-1]
+        return {"cost": costs[name], "measurements": 1.0}
+
+    monkeypatch.setattr(scheduler, "estimate_patent", estimate_patent)
+
+    # The deadline has already passed, so nothing is estimated
+    queue = scheduler.build_queue(str(tmp_path), ["a", "b", "c"], logging=False, deadline=0.0)
+    assert queue == []
+
+    state_path = str(tmp_path / "state.json")
+    BudgetScheduler(
+        [], deadline_s=0.0, state_path=state_path, context={"model_name": "cascade"}, unestimated=["a", "b", "c"]
+    ).run(lambda name: 0.0, logging=False)
+
+    loaded = BudgetScheduler.load(state_path, deadline_s=3600.0)
+    loaded.estimate_remaining(str(tmp_path), logging=False)
+    assert loaded.unestimated == []
+    # Highest expected measurements per dollar first
+    assert [pending["name"] for pending in loaded.pending] == ["b", "c", "a"]
@@ -0,0 +1,37 @@
+import sqlite3
+
+from patentgpt.search_index import PatentSearchIndex, to_fts_query
+
+
+def test_to_fts_query_quotes_terms_and_phrases():
+    assert to_fts_query('lithium "solid-state electrolyte" Li+') == '"lithium" AND "solid state electrolyte" AND "Li"'
+    assert to_fts_query("a b", operator="OR") == '"a" OR "b"'
+    assert to_fts_query("+ -") == ""
+
+
+def test_add_replaces_a_patent(tmp_path):
+    index = PatentSearchIndex(str(tmp_path / "index.sqlite"))
+    index.add("US1.txt", "a lithium electrolyte")
+    index.add("US2.txt", "a zirconia coating")
+    index.add("US1.txt", "a zirconia film")
+    index.commit()
+    assert len(index) == 2
+    assert sorted(name for name, _ in index.search("zirconia")) == ["US1.txt", "US2.txt"]
+    assert index.search("lithium") == []
+    index.close()
+
+
+def test_opens_an_index_without_row_table(tmp_path):
+    path = str(tmp_path / "index.sqlite")
+    connection = sqlite3.connect(path)
+    connection.execute("CREATE VIRTUAL TABLE patents USING fts5(name UNINDEXED, text, tokenize='porter unicode61')")
+    connection.execute("INSERT INTO patents (name, text) VALUES ('US1.txt', 'a lithium electrolyte')")
+    connection.commit()
+    connection.close()
+
+    index = PatentSearchIndex(path)
+    index.add("US1.txt", "a zirconia film")
+    index.commit()
+    assert len(index) == 1
+    assert [name for name, _ in index.search("zirconia")] == ["US1.txt"]
+    index.close()
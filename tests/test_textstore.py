@@ -0,0 +1,71 @@
+import threading
+
+from langchain.schema import Document
+
+from patentgpt import textstore
+from patentgpt.metrics import METRICS
+
+
+def test_iter_chunks_splits_on_boundaries(tmp_path):
+    path = tmp_path / "patent.txt"
+    text = "First paragraph about a film.\n\nSecond paragraph, 20 nm thick. " * 20
+    path.write_text(text, encoding="utf-8")
+    chunks = list(textstore.iter_chunks(str(path), chunk_size=200))
+    assert all(len(doc.page_content.encode("utf-8")) <= 200 for doc in chunks)
+    assert " ".join(doc.page_content for doc in chunks).split() == text.split()
+
+
+def test_batched_with_a_changing_size():
+    sizes = iter([3, 1, 2, 2])
+    assert list(textstore.batched(range(6), lambda: next(sizes))) == [[0, 1, 2], [3], [4, 5]]
+
+
+def test_guard_counts_the_chunks_it_holds():
+    with textstore.track_memory(batch_size=8) as guard:
+        documents = [Document(page_content="x" * 1000) for _ in range(4)]
+        held = guard.hold(documents)
+        assert held >= 4000
+        assert guard.usage() == held
+        guard.release(held)
+        assert guard.held_bytes == 0
+    assert not textstore._guards_in_memory
+
+
+def test_batches_shrink_while_the_patents_in_flight_are_above_the_bound():
+    with textstore.track_memory(limit_bytes=1_000_000, batch_size=8) as guard:
+        guard.hold([Document(page_content="x" * 2_000_000)])
+        assert guard.next_batch_size() == 4
+        assert guard.next_batch_size() == 2
+    assert guard.peak >= 2_000_000
+
+
+def test_a_finished_patent_no_longer_holds_back_the_next_one():
+    METRICS.counters.pop("memory_waits", None)
+    with textstore.track_memory(limit_bytes=1_000_000) as guard:
+        guard.hold([Document(page_content="x" * 2_000_000)])
+    # The memory of the first patent is not counted once it is done
+    with textstore.track_memory(limit_bytes=1_000_000) as guard:
+        assert guard.next_batch_size() == 32
+    assert METRICS.counters.get("memory_waits", 0) == 0
+
+
+def test_a_patent_waits_while_another_is_above_the_bound():
+    started = threading.Event()
+    release = threading.Event()
+    order = []
+
+    def first():
+        with textstore.track_memory(limit_bytes=1_000_000) as guard:
+            guard.hold([Document(page_content="x" * 2_000_000)])
+            started.set()
+            release.wait(5)
+            order.append("first done")
+
+    thread = threading.Thread(target=first)
+    thread.start()
+    started.wait(5)
+    threading.Timer(0.2, release.set).start()
+    with textstore.track_memory(limit_bytes=1_000_000):
+        order.append("second started")
+    thread.join()
+    assert order == ["first done", "second started"]